@@ -0,0 +1,54 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict
+
+import numpy as np
+
+from data_model import Bénévole, Quête
+
+""" Appréciation des quêtes par les bénévoles
+
+Une quête est découpée en blocs de 15 minutes (le dernier pouvant être plus
+court) et chaque bloc rapporte la préférence du bénévole pour l'heure à laquelle
+il commence. L'appréciation de toutes les quêtes par tous les bénévoles est donc
+le produit de deux matrices: les préférences par heure de chaque bénévole et le
+nombre de blocs de chaque quête qui commencent à chaque heure. """
+
+heures_par_jour = 24
+secondes_par_bloc = 15 * 60
+
+
+def préférences(b: Bénévole) -> np.ndarray:
+    """Les préférences de [b] pour chaque heure de la journée."""
+    vecteur = np.zeros(heures_par_jour, dtype=np.int64)
+    # Seule la première préférence donnée pour une heure compte
+    for t, p in reversed(list(b.pref_horaires.items())):
+        vecteur[t.hour] = p
+    return vecteur
+
+
+def blocs_par_heure(q: Quête) -> np.ndarray:
+    """Le nombre de blocs de 15 minutes de [q] qui commencent à chaque heure de
+    la journée."""
+    durée = (q.fin - q.début).total_seconds()
+    nombre_de_blocs = max(int(np.ceil(durée / secondes_par_bloc)), 0)
+    début = q.début.hour * 3600 + q.début.minute * 60 + q.début.second
+    heures = (début + secondes_par_bloc * np.arange(nombre_de_blocs)) // 3600
+    return np.bincount(heures % heures_par_jour, minlength=heures_par_jour)
+
+
+class Appréciations:
+    """La matrice des appréciations des [quêtes] par les [bénévoles]."""
+
+    def __init__(self, bénévoles: List[Bénévole], quêtes: List[Quête]):
+        self.rang_bénévole: Dict[Bénévole, int] = {
+            b: i for i, b in enumerate(bénévoles)
+        }
+        self.rang_quête: Dict[Quête, int] = {q: j for j, q in enumerate(quêtes)}
+        prefs = np.array([préférences(b) for b in bénévoles], dtype=np.int64)
+        blocs = np.array([blocs_par_heure(q) for q in quêtes], dtype=np.int64)
+        self.matrice: np.ndarray = (
+            prefs.reshape(-1, heures_par_jour) @ blocs.reshape(-1, heures_par_jour).T
+        )
+
+    def de(self, b: Bénévole, q: Quête) -> int:
+        return int(self.matrice[self.rang_bénévole[b], self.rang_quête[q]])
@@ -0,0 +1,196 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict
+import argparse, json, os, sys, tempfile, time
+from ortools.sat.python import cp_model
+from data_model import Registre, utiliser
+from planning_model import Contexte, construire
+from portfolio import écrire_modèle, résoudre_proto, paramètres_texte
+import synthetic
+
+""" Banc de performances
+
+Importe chaque jeu de données de référence, construit le modèle et le résout
+avec un budget fixe en temps déterministe (la recherche entrelacée rend alors
+l'objectif reproductible), puis compare les mesures à celles enregistrées dans
+benchmarks/<jeu>.json. Le programme se termine en erreur si une mesure a
+augmenté de plus que sa tolérance. Les temps dépendent de la machine: les
+références s'enregistrent (--enregistrer) sur celle qui les compare.
+
+Les données de démonstration Super Brassac 2025 ne sont pas dans le dépôt, il
+faut un instantané figé des feuilles anonymisées au format de
+`import_gapi_req.get` dans data/super_brassac_2025.json (voir
+benchmarks/README.md). Sans lui ce jeu est ignoré: les instantanés de
+.cache/gapi changent avec la feuille et d'une machine à l'autre. Les jeux
+synthétiques sont écrits dans ce même format avant la mesure: le temps
+d'import est celui de import_gapi, pas celui de leur génération.
+
+    python benchmark.py --enregistrer
+    python benchmark.py petit moyen
+"""
+
+
+def charger_gapi(fichier: str):
+    import import_gapi
+
+    if not os.path.exists(fichier):
+        raise FileNotFoundError(f"{fichier} introuvable, voir benchmarks/README.md")
+    with open(fichier) as f:
+        données = json.load(f)
+
+    import_gapi.load_lieux(données)
+    import_gapi.load_types(données)
+    import_gapi.load_bénévoles(données)
+    import_gapi.load_quêtes(données)
+
+
+def écrire_synthétique(dossier: str, **taille) -> str:
+    registre = Registre()
+    with utiliser(registre):
+        synthetic.générer(**taille)
+    fichier = os.path.join(dossier, "gapi.json")
+    synthetic.écrire_gapi(fichier, registre)
+    return fichier
+
+
+# Le fichier à importer de chaque jeu, écrit au besoin dans un dossier temporaire
+jeux_de_référence = {
+    "super_brassac_2025": lambda dossier: "data/super_brassac_2025.json",
+    "petit": lambda dossier: écrire_synthétique(
+        dossier, bénévoles=30, quêtes=80, jours=3
+    ),
+    "moyen": lambda dossier: écrire_synthétique(
+        dossier, bénévoles=100, quêtes=300, jours=5
+    ),
+    "grand": lambda dossier: écrire_synthétique(
+        dossier, bénévoles=250, quêtes=800, jours=7
+    ),
+}
+
+# Hausse relative tolérée pour chaque mesure, et valeur en dessous de laquelle
+# les variations sont du bruit
+tolérances: Dict[str, (float, float)] = {
+    "import_time": (0.25, 0.1),
+    "build_time": (0.25, 0.1),
+    "variables": (0.0, 1),
+    "constraints": (0.0, 1),
+    "proto_size": (0.02, 1),
+    "time_to_first_solution": (0.5, 0.5),
+    "objective": (0.02, 1),
+}
+
+
+def mesurer(nom: str, temps: float, graine: int) -> Dict:
+    registre = Registre()
+    with tempfile.TemporaryDirectory() as dossier:
+        fichier = jeux_de_référence[nom](dossier)
+        début = time.perf_counter()
+        with utiliser(registre):
+            charger_gapi(fichier)
+        registre.strengthen()
+        mesures = {"import_time": time.perf_counter() - début}
+
+    début = time.perf_counter()
+    ctx = Contexte(registre.bénévoles.values(), registre.index)
+    construire(ctx)
+    mesures["build_time"] = time.perf_counter() - début
+    mesures["variables"] = len(ctx.model.proto.variables)
+    mesures["constraints"] = len(ctx.model.proto.constraints)
+
+    with tempfile.TemporaryDirectory() as dossier:
+        binaire = os.path.join(dossier, "model.pb")
+        ctx.model.export_to_file(binaire)
+        mesures["proto_size"] = os.path.getsize(binaire)
+        fichier = os.path.join(dossier, "model.pb.txt.gz")
+        écrire_modèle(ctx.model, fichier)
+        paramètres = paramètres_texte(
+            cp_model.CpSolver().parameters,
+            num_workers=8,
+            random_seed=graine,
+            interleave_search=True,
+            max_deterministic_time=temps,
+        )
+        résultat = résoudre_proto(fichier, paramètres)
+    progression = résultat["progress"]
+    mesures["time_to_first_solution"] = progression[0][0] if progression else None
+    mesures["objective"] = résultat["objective"]
+    mesures["status"] = résultat["status"]
+    return mesures
+
+
+def comparer(référence: Dict, mesures: Dict, facteur: float) -> (List[str], bool):
+    """Les lignes du diff des [mesures] avec la [référence] et s'il y a une
+    régression."""
+    lignes = []
+    régression = False
+    for clé, (tolérance, plancher) in tolérances.items():
+        avant = référence.get(clé)
+        après = mesures.get(clé)
+        verdict = ""
+        if avant is None or après is None:
+            variation = ""
+            if avant is not None:
+                verdict = "RÉGRESSION (plus de valeur)"
+        else:
+            hausse = (après - avant) / max(abs(avant), plancher)
+            variation = f"({hausse:+.1%})"
+            if hausse > tolérance * facteur:
+                verdict = f"RÉGRESSION (tolérance {tolérance * facteur:.0%})"
+        régression = régression or verdict != ""
+        lignes.append(
+            f"  {clé:<24} {afficher(avant):>12} -> {afficher(après):<12} "
+            f"{variation:<10} {verdict}"
+        )
+    return lignes, régression
+
+
+def afficher(valeur) -> str:
+    if isinstance(valeur, float):
+        return f"{valeur:.3f}"
+    return str(valeur)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de performances")
+    parser.add_argument("jeux", nargs="*", default=list(jeux_de_référence.keys()))
+    parser.add_argument(
+        "--temps", type=float, default=20.0, help="budget en temps déterministe"
+    )
+    parser.add_argument("--graine", type=int, default=1)
+    parser.add_argument("--références", default="benchmarks")
+    parser.add_argument(
+        "--enregistrer", action="store_true", help="remplace les références"
+    )
+    parser.add_argument(
+        "--tolérance", type=float, default=1.0, help="multiplie toutes les tolérances"
+    )
+    args = parser.parse_args()
+
+    os.makedirs(args.références, exist_ok=True)
+    régression = False
+    for nom in args.jeux:
+        try:
+            mesures = mesurer(nom, args.temps, args.graine)
+        except FileNotFoundError as e:
+            print(f"{nom}: ignoré, {e}")
+            continue
+        fichier = os.path.join(args.références, f"{nom}.json")
+        if args.enregistrer:
+            with open(fichier, "w") as f:
+                json.dump(mesures, f, indent=2)
+            print(f"{nom}: référence enregistrée dans {fichier}")
+        elif not os.path.exists(fichier):
+            print(f"{nom}: pas de référence, voir --enregistrer")
+        else:
+            with open(fichier) as f:
+                référence = json.load(f)
+            lignes, r = comparer(référence, mesures, args.tolérance)
+            régression = régression or r
+            print(f"{nom}: {'RÉGRESSION' if r else 'ok'}")
+            print("\n".join(lignes))
+        sys.stdout.flush()
+    if régression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict
+from contextlib import contextmanager
+import json, time, tracemalloc
+from ortools.sat.python import cp_model
+
+""" Profil de construction du modèle
+
+Mesure, pour chaque famille de contraintes, le temps passé à la construire, le
+pic de mémoire allouée pendant sa construction et le nombre de variables et de
+contraintes qu'elle a ajoutées à `model.proto`. """
+
+
+class Profil_de_construction:
+    def __init__(self, model: cp_model.CpModel, mémoire=True):
+        self.model = model
+        # tracemalloc ralentit beaucoup la construction, on peut s'en passer
+        self.mémoire = mémoire
+        self.familles: List[Dict] = []
+        self.durée = 0.0
+        self._arrêter_tracemalloc = False
+
+    def __enter__(self):
+        if self.mémoire and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._arrêter_tracemalloc = True
+        self._début = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.durée = time.perf_counter() - self._début
+        if self._arrêter_tracemalloc:
+            tracemalloc.stop()
+            self._arrêter_tracemalloc = False
+
+    @contextmanager
+    def famille(self, nom: str):
+        proto = self.model.proto
+        variables = len(proto.variables)
+        contraintes = len(proto.constraints)
+        mémoire = tracemalloc.is_tracing()
+        if mémoire:
+            tracemalloc.reset_peak()
+            mémoire_avant, _ = tracemalloc.get_traced_memory()
+        début = time.perf_counter()
+        try:
+            yield
+        finally:
+            durée = time.perf_counter() - début
+            pic = None
+            if mémoire:
+                _, pic = tracemalloc.get_traced_memory()
+                pic -= mémoire_avant
+            self.familles.append(
+                {
+                    "family": nom,
+                    "wall_time_s": durée,
+                    "peak_memory_bytes": pic,
+                    "variables": len(proto.variables) - variables,
+                    "constraints": len(proto.constraints) - contraintes,
+                }
+            )
+
+    def to_json(self) -> Dict:
+        proto = self.model.proto
+        return {
+            "wall_time_s": self.durée,
+            "variables": len(proto.variables),
+            "constraints": len(proto.constraints),
+            "families": self.familles,
+        }
+
+    def écrire(self, fichier: str):
+        with open(fichier, "w") as text_file:
+            json.dump(self.to_json(), text_file, indent=2, ensure_ascii=False)
+
+    def résumé(self) -> str:
+        lignes = [f"Construction du modèle: {self.durée:.2f}s"]
+        for f in sorted(self.familles, key=lambda f: f["wall_time_s"], reverse=True):
+            mémoire = ""
+            if f["peak_memory_bytes"] is not None:
+                mémoire = f", pic {f['peak_memory_bytes'] / 2**20:.1f}Mo"
+            lignes.append(
+                f"- {f['family']}: {f['wall_time_s']:.3f}s{mémoire}, +{f['variables']} variables, +{f['constraints']} contraintes"
+            )
+        return "\n".join(lignes)
@@ -1,6 +1,9 @@
 from __future__ import annotations  # allows class type usage in class decl
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator
 from datetime import date, time, datetime, timedelta
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from contextlib import contextmanager
 import string
 
 """ Paramètres """
@@ -50,53 +53,51 @@ def resolve(src, l):
 
 
 class Spectacle:
-    tous: Dict[str, Spectacle] = {}
+    __slots__ = ("id", "nom", "numéro")
 
-    def __init__(self, id, nom):
+    def __init__(self, id, nom, registre: Optional[Registre] = None):
         self.id: str = id
         self.nom = nom
-        Spectacle.tous[self.id] = self
+        registre = registre or registre_courant()
+        self.numéro: int = len(registre.spectacles)
+        registre.spectacles[self.id] = self
 
     def __str__(self) -> str:
         return f"{self.id}:{self.nom}"
 
-    def __hash__(self):
-        return hash(self.id)
-
-    def __cmp__(self, lautre):
-        return (self.id > lautre.id) - (self.id < lautre.id)
-
-    def __eq__(self, lautre):
-        return self.__cmp__(lautre) == 0
-
 
 class Lieu:
-    tous: Dict[str, Lieu] = {}
+    __slots__ = ("id", "nom", "numéro")
 
-    def __init__(self, id, nom):
+    def __init__(self, id, nom, registre: Optional[Registre] = None):
         self.id: str = id
         self.nom = nom
-        Lieu.tous[self.id] = self
+        registre = registre or registre_courant()
+        self.numéro: int = len(registre.lieux)
+        registre.lieux[self.id] = self
 
     def __str__(self) -> str:
         return f"{self.id}:{self.nom}"
 
-    def __cmp__(self, lautre):
-        return (self.id > lautre.id) - (self.id < lautre.id)
-
-    def __eq__(self, lautre):
-        return self.__cmp__(lautre) == 0
-
 
 class Type_de_quête:
-    tous: Dict[str, Type_de_quête] = {}
+    __slots__ = ("id", "nom", "spécialiste_only", "sécable", "numéro")
 
-    def __init__(self, id, nom, sécable, spécialiste_only=False):
+    def __init__(
+        self,
+        id,
+        nom,
+        sécable,
+        spécialiste_only=False,
+        registre: Optional[Registre] = None,
+    ):
         self.id: str = id
         self.nom = nom
         self.spécialiste_only = spécialiste_only
         self.sécable: bool = sécable
-        Type_de_quête.tous[self.id] = self
+        registre = registre or registre_courant()
+        self.numéro: int = len(registre.types)
+        registre.types[self.id] = self
 
     def __str__(self) -> str:
         return f"{self.id}:{self.nom}"
@@ -104,36 +105,23 @@ class Type_de_quête:
     def détails(self):
         return f"{self} (Découpable: {self.sécable}, spécialistes: {self.spécialiste_only})"
 
-    def __hash__(self):
-        return hash(self.id)
-
-    def __cmp__(self, lautre):
-        return (self.id > lautre.id) - (self.id < lautre.id)
-
-    def __eq__(self, lautre):
-        return self.__cmp__(lautre) == 0
-
 
 class Quête:
-    toutes: List[Quête] = []
-    par_id: Dict[str, Quête] = {}
-    par_jour: Dict[date, List[Quête]] = {}
-
-    groupes: Dict[Quête, Union_find[Quête]] = {}
-
-    def strengthen():
-        # Groupes:
-        for q in Quête.toutes:
-            resolve(Quête.par_id, q.groupe)
-            groupe = set(q.groupe)
-            groupe.add(q)
-            groupe_uf = Union_find(groupe)
-            for g in groupe:
-                ancien_groupe = Quête.groupes.get(g)
-                if ancien_groupe is None:
-                    Quête.groupes[g] = groupe_uf
-                else:
-                    ancien_groupe.union(groupe_uf, lambda x, y: x.union(y))
+    __slots__ = (
+        "id",
+        "nom",
+        "types",
+        "lieu",
+        "spectacle",
+        "nombre_bénévoles",
+        "bénévoles",
+        "début",
+        "fin",
+        "groupe",
+        "jour",
+        "numéro",
+        "registre",
+    )
 
     def __init__(
         self,
@@ -147,6 +135,7 @@ class Quête:
         fin,
         bénévoles=[],
         groupe=[],
+        registre: Optional[Registre] = None,
     ):
         self.id: str = id
         self.nom: str = nom
@@ -158,8 +147,10 @@ class Quête:
         self.début: datetime = début
         self.fin: datetime = fin
         self.groupe: List[str | Quête] = groupe
-        Quête.toutes.append(self)
-        Quête.par_id[self.id] = self
+        self.registre: Registre = registre or registre_courant()
+        self.numéro: int = len(self.registre.quêtes)
+        self.registre.quêtes.append(self)
+        self.registre.quêtes_par_id[self.id] = self
 
         date_début = self.début.date()
         if self.début.time() < time(hour=5):
@@ -167,11 +158,7 @@ class Quête:
             date_début = date_début - timedelta(days=1)
         self.jour: date = date_début
 
-        quêtes_du_jour: List[Quête] = Quête.par_jour.get(date_début, [])
-        if quêtes_du_jour == []:
-            Quête.par_jour[date_début] = [self]
-        else:
-            quêtes_du_jour.append(self)
+        self.registre.quêtes_par_jour.setdefault(date_début, []).append(self)
 
     def __str__(self) -> str:
         return f"{self.nom}, {self.début.strftime('%a %H:%M')} -> {self.fin.strftime('%H:%M')}"
@@ -179,7 +166,7 @@ class Quête:
     def détails(self) -> str:
         types = ", ".join(f"{k}" for k in self.types)
         bénévoles = ", ".join(f"{k}" for k in self.bénévoles)
-        groupe = ", ".join("{}".format(k) for k in Quête.groupes[self].value)
+        groupe = ", ".join("{}".format(k) for k in self.registre.groupes[self].value)
         return f"{self.id}: {self.nom} ({self.nombre_bénévoles} bénévoles)\n{types} à {self.lieu}\nDébut: {self.début} Fin: {self.fin}\nQuêtes groupées: {groupe}\nBénévoles fixés: {bénévoles}"
 
     def __lt__(self, other):
@@ -188,6 +175,11 @@ class Quête:
     def durée_minutes(self) -> int:
         return int((self.fin - self.début).total_seconds() / 60)
 
+    def clé(self) -> (str, datetime):
+        """Retrouve la quête dans un planning (un results.json): l'id ne
+        suffit pas, import_json le donne aussi aux copies des jours suivants."""
+        return self.id, self.début
+
     def chevauche(self, q2: Quête):
         """Les quêtes qui ne n'ont pas lieu dans le même lieu
         doivent être séparées d'au moins {temps_inter_quêtes}."""
@@ -198,30 +190,158 @@ class Quête:
             q2_fin = q2_fin + timedelta(minutes=temps_inter_quêtes)
         return not (self.fin <= q2_début or self.début >= q2_fin)
 
-    def en_même_temps(self) -> filter[Quête]:
+    def en_même_temps(self) -> Iterator[Quête]:
         """Return la liste de toutes les quêtes chevauchant celle-ci. Cette liste
         inclue la quête courante."""
-        return filter(self.chevauche, Quête.toutes)
+        if self.registre.index is None:
+            return filter(self.chevauche, self.registre.quêtes)
+        return self.registre.index.en_même_temps(self)
+
+
+class Index_des_quêtes:
+    """Index des quêtes, construit une seule fois par `strengthen` après la
+    déclaration de toutes les données.
+
+    Les horaires y sont des minutes entières sur une ligne de temps absolue
+    commune à tout l'évènement (l'origine est le début de la première quête).
+    Les quêtes sont triées par début, ce qui permet de trouver les quêtes
+    chevauchant un intervalle par dichotomie plutôt qu'en parcourant toutes les
+    quêtes."""
+
+    def __init__(self, quêtes: List[Quête]):
+        self.toutes: List[Quête] = sorted(quêtes)
+        # Le registre des quêtes, pour les types, les lieux, etc.
+        self.registre: Registre = (
+            self.toutes[0].registre if self.toutes else registre_courant()
+        )
+        self.origine: Optional[datetime] = self.toutes[0].début if self.toutes else None
+        self.rang: Dict[Quête, int] = {q: i for i, q in enumerate(self.toutes)}
+        self.débuts: List[int] = [self.minutes(q.début) for q in self.toutes]
+        self.fins: List[int] = [self.minutes(q.fin) for q in self.toutes]
+        # Le maximum cumulé des fins est croissant, on peut donc y chercher par
+        # dichotomie la première quête susceptible de finir après un instant.
+        self.fins_max: List[int] = list(accumulate(self.fins, max))
+
+        self.par_lieu: Dict[Optional[Lieu], List[Quête]] = {}
+        self.par_type: Dict[Type_de_quête, List[Quête]] = {}
+        self.par_jour: Dict[date, List[Quête]] = {}
+        for q in self.toutes:
+            self.par_lieu.setdefault(q.lieu, []).append(q)
+            for t in q.types:
+                self.par_type.setdefault(t, []).append(q)
+        for q in sorted(self.toutes, key=lambda q: q.jour):
+            self.par_jour.setdefault(q.jour, []).append(q)
+
+    def minutes(self, d: datetime) -> int:
+        return int((d - self.origine).total_seconds() // 60)
+
+    def entre(self, début: int, fin: int) -> Iterator[int]:
+        """Rangs des quêtes ayant lieu, au moins en partie, entre les minutes
+        [début] et [fin]."""
+        premier = bisect_right(self.fins_max, début)
+        dernier = bisect_left(self.débuts, fin)
+        for i in range(premier, dernier):
+            if self.fins[i] > début:
+                yield i
+
+    def chevauchent(self, i: int, j: int) -> bool:
+        """Équivalent de `Quête.chevauche` sur les rangs de deux quêtes."""
+        q, q2 = self.toutes[i], self.toutes[j]
+        tampon = 0
+        if q.lieu and q2.lieu and q2.lieu != q.lieu:
+            tampon = temps_inter_quêtes
+        return not (
+            self.fins[i] <= self.débuts[j] - tampon
+            or self.débuts[i] >= self.fins[j] + tampon
+        )
+
+    def en_même_temps(self, q: Quête) -> Iterator[Quête]:
+        """Toutes les quêtes chevauchant [q], [q] comprise, en tenant compte
+        de {temps_inter_quêtes} entre deux lieux différents."""
+        i = self.rang[q]
+        for j in self.entre(
+            self.débuts[i] - temps_inter_quêtes, self.fins[i] + temps_inter_quêtes
+        ):
+            if self.chevauchent(i, j):
+                yield self.toutes[j]
+
+    def cliques(self) -> List[List[Quête]]:
+        """Cliques maximales du graphe d'intervalles formé par les quêtes, sans
+        tenir compte de {temps_inter_quêtes}. On balaie les débuts et les fins
+        dans l'ordre: l'ensemble des quêtes en cours juste avant une fin qui
+        suit un début est une clique maximale. Les quêtes de durée nulle sont
+        ignorées."""
+        évènements = sorted(
+            [(f, 0, i) for i, f in enumerate(self.fins) if self.débuts[i] < f]
+            + [(d, 1, i) for i, d in enumerate(self.débuts) if d < self.fins[i]]
+        )
+        en_cours: Dict[int, None] = {}
+        cliques: List[List[Quête]] = []
+        nouveau_début = False
+        for _, est_un_début, i in évènements:
+            if est_un_début:
+                en_cours[i] = None
+                nouveau_début = True
+            else:
+                if nouveau_début:
+                    cliques.append([self.toutes[j] for j in en_cours])
+                    nouveau_début = False
+                del en_cours[i]
+        return cliques
+
+    def dans_une_clique(self, i: int, j: int) -> bool:
+        """Les quêtes de rangs [i] et [j] appartiennent à une même clique
+        renvoyée par `cliques`."""
+        return (
+            self.débuts[i] < self.fins[i]
+            and self.débuts[j] < self.fins[j]
+            and self.débuts[i] < self.fins[j]
+            and self.débuts[j] < self.fins[i]
+        )
+
+    def chevauchements_hors_cliques(self) -> Iterator[tuple[Quête, Quête]]:
+        """Paires de quêtes qui se chevauchent sans appartenir à une même
+        clique: celles qui ne se chevauchent qu'à cause de {temps_inter_quêtes}
+        et celles de durée nulle. Chaque paire n'est renvoyée qu'une fois."""
+        for i, q in enumerate(self.toutes):
+            for q2 in self.en_même_temps(q):
+                j = self.rang[q2]
+                if j > i and not self.dans_une_clique(i, j):
+                    yield q, q2
 
 
 class Interval:
+    __slots__ = ("début", "fin")
+
     def __init__(self, début, fin):
         self.début: datetime = début
         self.fin: datetime = fin
 
 
 class Bénévole:
-    """Classe permettant de gérer les bénévoles et maintenant à jour une liste
-    de tous les bénévoles dans `Bénévole.tous`."""
-
-    tous: Dict[str, Bénévole] = {}
-
-    def strengthen():
-        for _key, bénévole in Bénévole.tous.items():
-            resolve(Bénévole.tous, bénévole.binômes_préférés)
-            resolve(Bénévole.tous, bénévole.binômes_interdits)
-            resolve(Type_de_quête.tous, bénévole.types_de_quête_interdits)
-            resolve(Type_de_quête.tous, bénévole.spécialités)
+    """Classe permettant de gérer les bénévoles, inscrits dans les
+    `bénévoles` d'un `Registre`."""
+
+    __slots__ = (
+        "id",
+        "surnom",
+        "prénom",
+        "nom",
+        "heures_théoriques",
+        "score_types_de_quêtes",
+        "binômes_préférés",
+        "binômes_interdits",
+        "lieux_interdits",
+        "types_de_quête_interdits",
+        "spécialités",
+        "indisponibilités",
+        "indispos_ponctuelles",
+        "pref_horaires",
+        "date_arrivée",
+        "date_départ",
+        "quêtes_assignées",
+        "numéro",
+    )
 
     def __init__(
         self,
@@ -239,6 +359,7 @@ class Bénévole:
         spécialités=[],
         date_arrivée=None,
         date_départ=None,
+        registre: Optional[Registre] = None,
     ):
         self.id: str = id
         self.surnom: str = surnom if surnom else prénom
@@ -259,16 +380,9 @@ class Bénévole:
         self.date_arrivée: Optional[datetime] = date_arrivée
         self.date_départ: Optional[datetime] = date_départ
         self.quêtes_assignées: List[Quête] = []
-        Bénévole.tous[self.id] = self
-
-    def __hash__(self):
-        return hash(self.id)
-
-    def __cmp__(self, lautre):
-        return (self.id > lautre.id) - (self.id < lautre.id)
-
-    def __eq__(self, lautre):
-        return self.__cmp__(lautre) == 0
+        registre = registre or registre_courant()
+        self.numéro: int = len(registre.bénévoles)
+        registre.bénévoles[self.id] = self
 
     def __str__(self) -> str:
         return f"{self.surnom}"
@@ -292,7 +406,7 @@ class Bénévole:
 
     def appréciation_du_planning(self, planning):
         for (b, q, n), _ in enumerate(filter(lambda q: q == 1, planning)):
-            if self == Bénévole.tous[b]:
+            if self.id == b:
                 print(q, n)
 
     """ Certains bénévole ont un ensemble de tâches précis à faire et ne doivent
@@ -306,10 +420,89 @@ class Bénévole:
         return temps_assigné >= self.heures_théoriques * 60
 
 
+""" Registre
+
+Toutes les données d'un festival. Les entités s'inscrivent à leur création dans
+le registre qu'on leur donne ou, à défaut, dans le registre courant: les
+imports n'ont donc pas à le connaître. Plusieurs registres peuvent coexister
+dans un même processus, par exemple pour comparer des scénarios. """
+
+
+class Registre:
+    def __init__(self):
+        self.spectacles: Dict[str, Spectacle] = {}
+        self.lieux: Dict[str, Lieu] = {}
+        self.types: Dict[str, Type_de_quête] = {}
+        self.bénévoles: Dict[str, Bénévole] = {}
+        self.quêtes: List[Quête] = []
+        self.quêtes_par_id: Dict[str, Quête] = {}
+        self.quêtes_par_jour: Dict[date, List[Quête]] = {}
+        self.groupes: Dict[Quête, Union_find[Quête]] = {}
+        self.index: Optional[Index_des_quêtes] = None
+
+    def strengthen_quêtes(self):
+        # Groupes:
+        for q in self.quêtes:
+            resolve(self.quêtes_par_id, q.groupe)
+            groupe = set(q.groupe)
+            groupe.add(q)
+            groupe_uf = Union_find(groupe)
+            for g in groupe:
+                ancien_groupe = self.groupes.get(g)
+                if ancien_groupe is None:
+                    self.groupes[g] = groupe_uf
+                else:
+                    ancien_groupe.union(groupe_uf, lambda x, y: x.union(y))
+        # Index:
+        self.index = Index_des_quêtes(self.quêtes)
+
+    def strengthen_bénévoles(self):
+        for _key, bénévole in self.bénévoles.items():
+            resolve(self.bénévoles, bénévole.binômes_préférés)
+            resolve(self.bénévoles, bénévole.binômes_interdits)
+            resolve(self.types, bénévole.types_de_quête_interdits)
+            resolve(self.types, bénévole.spécialités)
+
+    def strengthen(self):
+        """
+        Dereferences all relations by looking in the tables. Must be called
+        AFTER all data has been declared.
+        """
+        self.strengthen_quêtes()
+        self.strengthen_bénévoles()
+
+
+_registre_courant = Registre()
+
+
+def registre_courant() -> Registre:
+    return _registre_courant
+
+
+@contextmanager
+def utiliser(registre: Registre):
+    """Fait de [registre] le registre courant le temps du bloc."""
+    global _registre_courant
+    précédent = _registre_courant
+    _registre_courant = registre
+    try:
+        yield registre
+    finally:
+        _registre_courant = précédent
+
+
 def strengthen():
     """
-    Dereferences all relations by looking in the tables. Must be called AFTER
+    Dereferences all relations of the current registry. Must be called AFTER
     all data has been declared.
     """
-    Quête.strengthen()
-    Bénévole.strengthen()
+    _registre_courant.strengthen()
+
+
+def reset():
+    """
+    Replaces the current registry by an empty one, so that another data set can
+    be loaded in the same process.
+    """
+    global _registre_courant
+    _registre_courant = Registre()
@@ -0,0 +1,111 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from itertools import repeat
+import copy, multiprocessing, os
+from ortools.sat.python import cp_model
+from data_model import Index_des_quêtes, registre_courant
+from planning_model import Contexte, construire
+
+""" Résolution jour par jour
+
+Presque toutes les contraintes ne portent que sur les quêtes d'un même jour.
+On construit et résout donc un sous-modèle par jour, en parallèle dans un pool
+de processus qui se partagent les workers du solveur, sans les familles qui
+lient les jours entre eux. Les plannings de chaque jour sont ensuite assemblés
+et servent d'indices à une courte résolution du modèle complet qui rétablit
+l'équilibre sur la semaine (voir `warm_start.ajouter_indices`).
+
+Les processus du pool sont créés par fork: ils héritent des données déjà
+chargées dans le registre courant de data_model. """
+
+familles_couplant_les_jours = ["un_max_de_monde", "équilibrage_semaine"]
+
+
+def résoudre_un_jour(
+    jour: date, paramètres: str, poids: Dict[str, int], journal: Optional[str]
+) -> Dict:
+    """Construit et résout le sous-modèle de [jour]. Exécuté dans un processus
+    du pool, on ne renvoie donc que des ids, les quêtes par `Quête.clé`."""
+    registre = registre_courant()
+    index = Index_des_quêtes(registre.index.par_jour[jour])
+    ctx = Contexte(registre.bénévoles.values(), index)
+    ctx.poids = dict(poids)
+    construire(ctx, exclues=familles_couplant_les_jours)
+
+    solver = cp_model.CpSolver()
+    solver.parameters.parse_text_format(paramètres)
+    if journal:
+        with open(journal, "w") as text_file:
+            solver.log_callback = lambda str: text_file.write(f"{str}\n")
+            status = solver.solve(ctx.model)
+    else:
+        status = solver.solve(ctx.model)
+
+    assignations: Dict[(str, datetime), List[str]] = {}
+    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+        for q in ctx.quêtes:
+            assignations[q.clé()] = [
+                b.id
+                for b in ctx.bénévoles
+                if (b, q) in ctx.assignations
+                and solver.boolean_value(ctx.assignations[(b, q)])
+            ]
+    return {
+        "jour": jour.isoformat(),
+        "status": status.name,
+        "objective": solver.objective_value if assignations else None,
+        "wall_time": solver.wall_time,
+        "assignations": assignations,
+    }
+
+
+def résoudre_par_jour(
+    ctx: Contexte,
+    paramètres,
+    temps_par_jour: float,
+    dossier: Optional[str] = None,
+) -> (Dict[(str, datetime), List[str]], List[Dict]):
+    """Résout chaque jour de [ctx] séparément, avec au plus [temps_par_jour]
+    secondes chacun. Renvoie les ids des bénévoles de chaque quête, par
+    `Quête.clé` (import_json donne le même id aux copies d'une quête sur
+    plusieurs jours), et le résultat de chaque jour."""
+    jours = list(ctx.index.par_jour.keys())
+    if jours == []:
+        return {}, []
+    workers = paramètres.num_workers or os.cpu_count() or 1
+    paramètres_du_jour = copy.deepcopy(paramètres)
+    paramètres_du_jour.num_workers = max(1, workers // len(jours))
+    paramètres_du_jour.max_time_in_seconds = temps_par_jour
+    journaux = [
+        os.path.join(dossier, f"cp_sat_log_{jour}.txt") if dossier else None
+        for jour in jours
+    ]
+
+    with ProcessPoolExecutor(
+        max_workers=len(jours), mp_context=multiprocessing.get_context("fork")
+    ) as pool:
+        résultats = list(
+            pool.map(
+                résoudre_un_jour,
+                jours,
+                repeat(str(paramètres_du_jour)),
+                repeat(ctx.poids),
+                journaux,
+            )
+        )
+
+    assemblées: Dict[(str, datetime), List[str]] = {}
+    for r in résultats:
+        assemblées.update(r["assignations"])
+    return assemblées, résultats
+
+
+def rapport(résultats: List[Dict]) -> str:
+    lignes = ["Résolution jour par jour:"]
+    for r in résultats:
+        lignes.append(
+            f"- {r['jour']}: {r['status']}, objectif {r['objective']}, {r['wall_time']:.1f}s"
+        )
+    return "\n".join(lignes)
@@ -0,0 +1,210 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor, Future
+import copy, multiprocessing, threading, time
+from ortools.sat.python import cp_model
+from data_model import registre_courant
+from eligibility import Éligibilité
+from planning_model import Contexte, construire, critères
+
+""" Diagnostic des conflits entre familles de contraintes
+
+Les hypothèses (voir explanation.py) empêchent d'optimiser et de résoudre en
+parallèle. Ici, chaque règle d'éligibilité et chaque famille de contraintes
+qui peut être en cause est un bloc que l'on peut lever. Une sonde construit le
+modèle sans objectif et sans les blocs levés, puis le résout brièvement. En
+levant les blocs un à un tant que le modèle reste infaisable, on obtient un
+ensemble minimal de blocs en conflit: lever n'importe lequel d'entre eux rend
+le modèle faisable (ou du moins ne le prouve plus infaisable dans le temps
+imparti).
+
+Les sondes d'un tour (le retrait de chaque bloc restant) sont résolues en
+parallèle dans un pool de processus. Un bloc dont le retrait rend le modèle
+faisable fait partie du conflit pour de bon: lever d'autres blocs ne fait que
+relâcher le modèle. Une dernière sonde, avec des hypothèses détaillées pour les
+blocs du conflit, nomme les bénévoles et les quêtes en cause.
+
+Les processus sont créés par fork au `démarrer`: ils héritent des données
+déjà chargées dans le registre courant de data_model. Le fork doit avoir lieu
+quand aucun thread du solveur principal ne tourne, avant sa résolution
+("pendant") ou après qu'il a prouvé l'infaisabilité ("après", voir lbc24). """
+
+# Le remplissage des quêtes est ce que l'on cherche à obtenir, les symétries
+# n'écartent que des solutions équivalentes: ils ne sont jamais levés. Les
+# blocs sont levés dans cet ordre, les premiers sont donc les moins souvent mis
+# en cause quand plusieurs conflits sont possibles: on préfère accuser les
+# données de chacun (éligibilité, inimitiés) que les règles générales.
+blocs: List[str] = [
+    "pauses_repas",
+    "un_max_de_monde",
+    "non_ubiquité",
+    "assignations_fixées",
+    "inimitiés",
+] + Éligibilité.règles
+
+# Les raisons des hypothèses de chaque bloc, voir `Contexte.hypothèses`
+raisons_des_blocs: Dict[str, List[str]] = {r: [r] for r in Éligibilité.règles} | {
+    "inimitiés": ["inimitié"],
+    "pauses_repas": ["pause_midi", "pause_soir"],
+}
+
+
+def sonder(levés: List[str], paramètres: str, détailler: bool = False) -> Dict:
+    """Construit et résout le modèle sans les blocs [levés]. Avec
+    [détailler], les contraintes des autres blocs sont activées par des
+    hypothèses et celles d'un ensemble suffisant pour l'infaisabilité sont
+    nommées. Exécuté dans un processus du pool."""
+    registre = registre_courant()
+    bénévoles = registre.bénévoles.values()
+    règles_levées = [b for b in levés if b in Éligibilité.règles]
+    éligibilité = Éligibilité(bénévoles, registre.index, règles_levées)
+    regroupement = {"*": "imposée"}
+    if détailler:
+        for b in blocs:
+            if b not in levés:
+                regroupement |= {r: "détail" for r in raisons_des_blocs.get(b, [])}
+    ctx = Contexte(bénévoles, registre.index, détailler, éligibilité, regroupement)
+    familles_levées = [b for b in levés if b not in Éligibilité.règles]
+    construire(ctx, exclues=familles_levées + [nom for nom, _ in critères])
+
+    solver = cp_model.CpSolver()
+    solver.parameters.parse_text_format(paramètres)
+    status = solver.solve(ctx.model)
+    conflit = []
+    if détailler and status == cp_model.INFEASIBLE:
+        conflit = [
+            ctx.model.proto.variables[i].name
+            for i in solver.sufficient_assumptions_for_infeasibility()
+        ]
+    return {
+        "lifted": list(levés),
+        "status": status.name,
+        "wall_time": solver.wall_time,
+        "conflict": conflit,
+    }
+
+
+class Diagnostic:
+    """Recherche, en arrière-plan, un ensemble minimal de blocs en conflit
+    avec [processus] sondes en parallèle d'au plus [temps_par_sonde] secondes
+    chacune."""
+
+    def __init__(self, paramètres, processus: int = 4, temps_par_sonde: float = 5.0):
+        paramètres = copy.deepcopy(paramètres)
+        paramètres.num_workers = 1
+        paramètres.max_time_in_seconds = temps_par_sonde
+        paramètres.log_search_progress = False
+        self.paramètres = str(paramètres)
+        self.processus = processus
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.fil: Optional[threading.Thread] = None
+        self.arrêté = threading.Event()
+        self.sondes: List[Dict] = []
+        self.résultat: Dict = {}
+
+    def sonder(self, levés: List[str], détailler: bool = False) -> Future:
+        return self.pool.submit(sonder, levés, self.paramètres, détailler)
+
+    def démarrer(self):
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.processus, mp_context=multiprocessing.get_context("fork")
+        )
+        # Le premier tour est soumis tout de suite, ce qui crée les processus
+        premier_tour = [self.sonder([])] + [self.sonder([b]) for b in blocs]
+        self.fil = threading.Thread(
+            target=self.chercher, args=(premier_tour,), daemon=True
+        )
+        self.fil.start()
+
+    def résultat_de(self, future: Future) -> Optional[Dict]:
+        if self.arrêté.is_set():
+            return None
+        résultat = future.result()
+        self.sondes.append(résultat)
+        return résultat
+
+    def chercher(self, premier_tour: List[Future]):
+        début = time.perf_counter()
+        try:
+            self.résultat = self.minimiser(premier_tour)
+        except Exception as e:
+            if not self.arrêté.is_set():
+                self.résultat = {"status": "ERROR", "error": repr(e)}
+        self.résultat["probes"] = len(self.sondes)
+        self.résultat["wall_time"] = time.perf_counter() - début
+
+    def minimiser(self, tour: List[Future]) -> Dict:
+        base = self.résultat_de(tour[0])
+        if base is None or base["status"] != "INFEASIBLE":
+            for f in tour[1:]:
+                f.cancel()
+            return {"status": base["status"] if base else "STOPPED"}
+
+        levés: List[str] = []
+        conflit: List[str] = []
+        non_prouvés: List[str] = []
+        candidats = list(blocs)
+        futures = dict(zip(candidats, tour[1:]))
+        while candidats:
+            levables = []
+            for b in candidats:
+                r = self.résultat_de(futures[b])
+                if r is None:
+                    return {"status": "STOPPED"}
+                if r["status"] == "INFEASIBLE":
+                    levables.append(b)
+                else:
+                    conflit.append(b)
+                    if r["status"] != "FEASIBLE" and r["status"] != "OPTIMAL":
+                        non_prouvés.append(b)
+            if levables == []:
+                break
+            # Lever tous les blocs levables d'un coup évite souvent des tours
+            if len(levables) > 1:
+                r = self.résultat_de(self.sonder(levés + levables))
+                if r is None:
+                    return {"status": "STOPPED"}
+                if r["status"] == "INFEASIBLE":
+                    levés += levables
+                    break
+            levés.append(levables[0])
+            candidats = levables[1:]
+            futures = {b: self.sonder(levés + [b]) for b in candidats}
+
+        détail = self.résultat_de(self.sonder(levés, détailler=True))
+        return {
+            "status": "INFEASIBLE",
+            "families": [b for b in blocs if b in conflit],
+            "unproven": non_prouvés,
+            "details": détail["conflict"] if détail else [],
+        }
+
+    def arrêter(self):
+        """Abandonne la recherche, par exemple si le solveur principal a
+        trouvé une solution."""
+        self.arrêté.set()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def attendre(self) -> Dict:
+        if self.fil is not None:
+            self.fil.join()
+        if self.pool is not None:
+            self.pool.shutdown()
+        return self.résultat
+
+
+def rapport(résultat: Dict) -> str:
+    entête = (
+        f"Diagnostic: {résultat.get('probes', 0)} sondes en "
+        f"{résultat.get('wall_time', 0):.1f}s"
+    )
+    if résultat.get("status") != "INFEASIBLE":
+        return f"{entête}, modèle complet {résultat.get('status')}"
+    lignes = [f"{entête}, familles en conflit: {', '.join(résultat['families'])}"]
+    if résultat["unproven"]:
+        lignes.append(
+            f"- sans preuve de faisabilité sans elles: {', '.join(résultat['unproven'])}"
+        )
+    lignes += [f"- {nom}" for nom in résultat["details"]]
+    return "\n".join(lignes)
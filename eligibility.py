@@ -0,0 +1,211 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict
+from datetime import time, datetime, timedelta
+import math
+
+import numpy as np
+
+from data_model import Bénévole, Quête, Index_des_quêtes
+
+""" Éligibilité des bénévoles aux quêtes
+
+Les règles qui interdisent statiquement à un bénévole une quête (arrivée,
+départ, indisponibilités, spécialités...) sont évaluées toutes ensemble sous la
+forme de matrices booléennes avec une ligne par bénévole et une colonne par
+quête. Le modèle ne crée ensuite de variables que pour les couples éligibles.
+
+Comme pour le serveur, une assignation manuelle l'emporte sur toutes les
+règles. """
+
+# Les heures sont comptées depuis minuit le jour (de festival) de la quête. Une
+# journée commence à 5h, les indisponibilités entre minuit et 5h concernent
+# donc la nuit suivante: 48 créneaux d'une heure suffisent.
+créneaux_par_jour = 48
+heure_début_journée = 5
+
+
+def créneau_dune_heure(t: time) -> int:
+    if t.hour < heure_début_journée:
+        return t.hour + 24
+    return t.hour
+
+
+def créneaux_indisponibles(b: Bénévole) -> np.ndarray:
+    """Masque des créneaux horaires pendant lesquels [b] est indisponible."""
+    masque = np.zeros(créneaux_par_jour, dtype=bool)
+    for t in b.indisponibilités:
+        masque[créneau_dune_heure(t)] = True
+    return masque
+
+
+def créneaux_couverts(q: Quête) -> np.ndarray:
+    """Masque des créneaux horaires que [q] occupe, même partiellement."""
+    minuit = datetime.combine(q.jour, time(), q.début.tzinfo)
+    début = math.floor((q.début - minuit) / timedelta(hours=1))
+    fin = math.ceil((q.fin - minuit) / timedelta(hours=1))
+    masque = np.zeros(créneaux_par_jour, dtype=bool)
+    masque[max(début, 0) : min(fin, créneaux_par_jour)] = True
+    return masque
+
+
+def incidence(lignes, colonnes, relation) -> np.ndarray:
+    """Matrice booléenne [lignes] × [colonnes] où la case (l, c) vaut
+    `c in relation(l)`."""
+    rang = {c: i for i, c in enumerate(colonnes)}
+    matrice = np.zeros((len(lignes), len(colonnes)), dtype=bool)
+    for i, l in enumerate(lignes):
+        for c in relation(l):
+            j = rang.get(c)
+            if j is not None:
+                matrice[i, j] = True
+    return matrice
+
+
+def se_rencontrent(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pour deux matrices d'incidence [a] (n × k) et [b] (m × k), la matrice
+    n × m indiquant si les lignes ont au moins une colonne en commun."""
+    return (a.astype(np.int32) @ b.T.astype(np.int32)) > 0
+
+
+class Éligibilité:
+    """Matrice d'éligibilité des [bénévoles] aux quêtes de l'[index]. Les
+    exclusions sont rangées par règle dans [exclusions], celles des règles
+    [levées] sont ignorées (voir diagnosis.py)."""
+
+    règles = [
+        "arrivée",
+        "départ",
+        "indisponibilité",
+        "spécialiste",
+        "lieu_interdit",
+        "type_interdit",
+        "déjà_assigné",
+    ]
+
+    def __init__(
+        self, bénévoles: List[Bénévole], index: Index_des_quêtes, levées: List[str] = []
+    ):
+        self.levées: List[str] = list(levées)
+        self.bénévoles: List[Bénévole] = list(bénévoles)
+        self.index = index
+        self.quêtes: List[Quête] = index.toutes
+        self.rang_bénévole: Dict[Bénévole, int] = {
+            b: i for i, b in enumerate(self.bénévoles)
+        }
+        self.rang_quête: Dict[Quête, int] = index.rang
+
+        bs, qs = self.bénévoles, self.quêtes
+        types = list(index.registre.types.values())
+        lieux = list(index.registre.lieux.values())
+        jours = list(index.par_jour.keys())
+
+        self.fixés = incidence(qs, bs, lambda q: q.bénévoles).T
+
+        # Présence, en secondes depuis le début de la première quête
+        def secondes(d, défaut):
+            if d is None or index.origine is None:
+                return défaut
+            return (d - index.origine).total_seconds()
+
+        arrivées = np.array([secondes(b.date_arrivée, -np.inf) for b in bs])
+        départs = np.array([secondes(b.date_départ, np.inf) for b in bs])
+        débuts = np.array([secondes(q.début, 0) for q in qs])
+        fins = np.array([secondes(q.fin, 0) for q in qs])
+
+        indisponibles = np.array(
+            [créneaux_indisponibles(b) for b in bs], dtype=bool
+        ).reshape(len(bs), créneaux_par_jour)
+        couverts = np.array([créneaux_couverts(q) for q in qs], dtype=bool).reshape(
+            len(qs), créneaux_par_jour
+        )
+
+        types_des_quêtes = incidence(qs, types, lambda q: q.types)
+        types_spécialistes = np.array([t.spécialiste_only for t in types], dtype=bool)
+        spécialités = incidence(bs, types, lambda b: b.spécialités)
+        types_interdits = incidence(bs, types, lambda b: b.types_de_quête_interdits)
+        lieux_des_quêtes = incidence(qs, lieux, lambda q: [q.lieu])
+        lieux_interdits = incidence(bs, lieux, lambda b: b.lieux_interdits)
+
+        # Les bénévoles dont le temps de travail d'un jour est entièrement
+        # assigné manuellement ne font rien d'autre ce jour là.
+        assignés = np.array(
+            [[b.est_assigné(d) for d in jours] for b in bs], dtype=bool
+        ).reshape(len(bs), len(jours))
+        jour_des_quêtes = np.array([jours.index(q.jour) for q in qs], dtype=np.intp)
+
+        exclusions = {
+            "arrivée": arrivées[:, None] > débuts[None, :],
+            "départ": départs[:, None] < fins[None, :],
+            "indisponibilité": se_rencontrent(indisponibles, couverts),
+            "spécialiste": se_rencontrent(
+                ~spécialités & types_spécialistes, types_des_quêtes
+            ),
+            "lieu_interdit": se_rencontrent(lieux_interdits, lieux_des_quêtes),
+            "type_interdit": se_rencontrent(types_interdits, types_des_quêtes),
+            "déjà_assigné": assignés[:, jour_des_quêtes],
+        }
+        self.exclusions: Dict[str, np.ndarray] = {
+            règle: exclusions[règle] & ~self.fixés for règle in Éligibilité.règles
+        }
+        self.éligibles: np.ndarray = ~np.logical_or.reduce(
+            [np.zeros((len(bs), len(qs)), dtype=bool)]
+            + [e for règle, e in self.exclusions.items() if règle not in self.levées]
+        )
+
+    def recalculer(self, bénévoles: List[Bénévole]):
+        """Recalcule les lignes des [bénévoles] après une modification de leurs
+        données ou de leurs quêtes fixées (voir whatif.py)."""
+        lignes = [self.rang_bénévole[b] for b in bénévoles]
+        partielle = Éligibilité(bénévoles, self.index, self.levées)
+        self.fixés[lignes] = partielle.fixés
+        for règle in Éligibilité.règles:
+            self.exclusions[règle][lignes] = partielle.exclusions[règle]
+        self.éligibles[lignes] = partielle.éligibles
+
+    @staticmethod
+    def réunion(parties: List[Éligibilité], index: Index_des_quêtes) -> Éligibilité:
+        """L'éligibilité aux quêtes de l'[index], assemblée à partir des
+        [parties] calculées pour les mêmes bénévoles sur des quêtes disjointes
+        qui le couvrent."""
+        e = Éligibilité.__new__(Éligibilité)
+        e.levées = parties[0].levées
+        e.bénévoles = parties[0].bénévoles
+        e.index = index
+        e.quêtes = index.toutes
+        e.rang_bénévole = parties[0].rang_bénévole
+        e.rang_quête = index.rang
+        colonnes = [index.rang[q] for p in parties for q in p.quêtes]
+
+        def assembler(matrices: List[np.ndarray]) -> np.ndarray:
+            m = np.zeros((len(e.bénévoles), len(e.quêtes)), dtype=bool)
+            m[:, colonnes] = np.hstack(matrices)
+            return m
+
+        e.fixés = assembler([p.fixés for p in parties])
+        e.exclusions = {
+            règle: assembler([p.exclusions[règle] for p in parties])
+            for règle in Éligibilité.règles
+        }
+        e.éligibles = assembler([p.éligibles for p in parties])
+        return e
+
+    def éligible(self, b: Bénévole, q: Quête) -> bool:
+        return bool(self.éligibles[self.rang_bénévole[b], self.rang_quête[q]])
+
+    def couples_éligibles(self):
+        for i, j in zip(*np.nonzero(self.éligibles)):
+            yield self.bénévoles[i], self.quêtes[j]
+
+    def couples_exclus(self, règle: str):
+        for i, j in zip(*np.nonzero(self.exclusions[règle])):
+            yield self.bénévoles[i], self.quêtes[j]
+
+    def rapport(self) -> str:
+        total = self.éligibles.size
+        éligibles = int(self.éligibles.sum())
+        lignes = [
+            f"Éligibilité: {éligibles} couples bénévole/quête éligibles sur {total}"
+        ]
+        for règle, exclus in self.exclusions.items():
+            lignes.append(f"- {règle}: {int(exclus.sum())} couples exclus")
+        return "\n".join(lignes)
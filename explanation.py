@@ -0,0 +1,79 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional
+from ortools.sat.python import cp_model
+from data_model import Bénévole, Index_des_quêtes
+from eligibility import Éligibilité
+from planning_model import Contexte, construire, niveaux_des_hypothèses
+
+""" Explication d'une absence de solution par affinages successifs
+
+Les hypothèses sont d'abord regroupées par raison: le solveur cherche un
+ensemble suffisant parmi quelques dizaines de littéraux (voir "Hypothèses"
+dans planning_model.py). Seules les raisons de cet ensemble sont ensuite
+détaillées par bénévole, toutes les autres contraintes étant imposées, puis
+seuls les couples (raison, bénévole) retenus sont détaillés contrainte par
+contrainte. Chaque étape reste infaisable puisque les contraintes levées par
+la précédente sont toujours levables. """
+
+
+def noyau(ctx: Contexte, paramètres) -> (cp_model.CpSolverStatus, List[tuple]):
+    """Résout le modèle de [ctx] et renvoie son statut et, s'il est
+    infaisable, les clés d'un ensemble d'hypothèses suffisant."""
+    solver = cp_model.CpSolver()
+    solver.parameters.copy_from(paramètres)
+    status = solver.solve(ctx.model)
+    if status != cp_model.INFEASIBLE:
+        return status, []
+    clés = {h.index: clé for clé, h in ctx.hypothèses_créées.items()}
+    return status, [clés[i] for i in solver.sufficient_assumptions_for_infeasibility()]
+
+
+def expliquer(
+    bénévoles: List[Bénévole],
+    index: Index_des_quêtes,
+    paramètres,
+    éligibilité: Optional[Éligibilité] = None,
+    raisons: Optional[List[str]] = None,
+) -> List[Dict]:
+    """Les étapes de l'affinage, jusqu'au détail des contraintes. Si les
+    [raisons] en cause sont déjà connues, la première étape est sautée."""
+    étapes = []
+    if raisons is None:
+        regroupement = {"*": "raison"}
+    else:
+        regroupement = {"*": "imposée"} | {r: "bénévole" for r in raisons}
+    niveau = regroupement["*"] if raisons is None else "bénévole"
+    while True:
+        ctx = Contexte(bénévoles, index, True, éligibilité, regroupement)
+        construire(ctx)
+        éligibilité = ctx.éligibilité
+        status, clés = noyau(ctx, paramètres)
+        étapes.append(
+            {
+                "level": niveau,
+                "assumptions": len(ctx.hypothèses_créées),
+                "status": status.name,
+                "core": [ctx.hypothèses_créées[clé].name for clé in clés],
+            }
+        )
+        if clés == [] or niveau == niveaux_des_hypothèses[-1]:
+            return étapes
+        niveau = niveaux_des_hypothèses[niveaux_des_hypothèses.index(niveau) + 1]
+        regroupement = {"*": "imposée"}
+        for clé in clés:
+            regroupement[clé[0] if len(clé) == 1 else clé[:2]] = niveau
+
+
+def rapport(étapes: List[Dict]) -> str:
+    lignes = []
+    for étape in étapes:
+        lignes.append(
+            f"Par {étape['level']}: {étape['status']} avec "
+            f"{étape['assumptions']} hypothèses"
+        )
+        lignes += [f"- {nom}" for nom in étape["core"]]
+        if étape["status"] == "INFEASIBLE" and étape["core"] == []:
+            lignes.append(
+                "- aucune hypothèse nécessaire, les contraintes imposées suffisent"
+            )
+    return "\n".join(lignes)
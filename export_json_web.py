@@ -1,21 +1,21 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 import json
 from datetime import date, time, datetime, timedelta
 
-from data_model import Bénévole, Lieu, Type_de_quête, Quête
+from data_model import Bénévole, Quête, Registre, registre_courant
 
 
-def types():
-    return [{"id": tdq.id, "name": tdq.nom} for tdq in Type_de_quête.tous.values()]
+def types(registre: Registre):
+    return [{"id": tdq.id, "name": tdq.nom} for tdq in registre.types.values()]
 
 
-def places():
-    return [{"id": p.id, "name": p.nom} for p in Lieu.tous.values()]
+def places(registre: Registre):
+    return [{"id": p.id, "name": p.nom} for p in registre.lieux.values()]
 
 
-def volunteers():
-    return [{"id": b.id, "pseudo": b.surnom} for b in Bénévole.tous.values()]
+def volunteers(registre: Registre):
+    return [{"id": b.id, "pseudo": b.surnom} for b in registre.bénévoles.values()]
 
 
 def quests(result: Dict[Quête, List[Bénévole]]):
@@ -33,12 +33,17 @@ def quests(result: Dict[Quête, List[Bénévole]]):
     return arr
 
 
-def write_json(assignations: Dict[Quête, List[Bénévole]], file="result.json"):
+def write_json(
+    assignations: Dict[Quête, List[Bénévole]],
+    file="result.json",
+    registre: Optional[Registre] = None,
+):
+    registre = registre or registre_courant()
     name = f"{file}.json"
     result = {}
-    result["quest_types"] = types()
-    result["places"] = places()
-    result["volunteers"] = volunteers()
+    result["quest_types"] = types(registre)
+    result["places"] = places(registre)
+    result["volunteers"] = volunteers(registre)
     result["quests"] = quests(assignations)
     with open(name, "w") as text_file:
         text_file.write(json.dumps(result))
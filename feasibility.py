@@ -0,0 +1,256 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional
+from datetime import datetime, timedelta
+import json, time
+
+import numpy as np
+
+from data_model import Bénévole, Index_des_quêtes
+from eligibility import Éligibilité, se_rencontrent
+from workload import Temps_de_travail
+
+""" Analyse de capacité avant la résolution
+
+Vérifie en quelques millisecondes, avant de construire le modèle, des
+conditions nécessaires à l'existence d'un planning:
+
+- chaque quête a au moins autant de candidats éligibles que de places, et pas
+  plus de bénévoles fixés que de places;
+- pour chaque ensemble de quêtes qui ont lieu en même temps (les cliques de
+  `Index_des_quêtes.cliques`), un bénévole ne pouvant en faire qu'une, il faut
+  pouvoir attribuer une place à un bénévole éligible différent (condition de
+  Hall, vérifiée par un couplage). Un échec nomme le sous-ensemble de quêtes
+  qui manque de candidats;
+- chaque jour, le travail requis tient dans le temps pendant lequel les
+  bénévoles peuvent travailler (la réunion des horaires des quêtes auxquelles
+  ils sont éligibles).
+
+Les temps de trajet et les pauses sont ignorés: une erreur signale un planning
+certainement impossible, mais l'absence d'erreur ne garantit rien. Un travail
+requis supérieur au temps théorique des bénévoles présents n'est qu'une alerte,
+l'équilibrage étant un critère de l'objectif.
+
+Le profil de l'offre et de la demande par tranche horaire (les bénévoles
+éligibles à au moins une des quêtes en cours et le nombre de places de ces
+quêtes) est écrit par `écrire`. """
+
+# Nombre de tranches horaires les plus tendues citées dans le rapport
+tranches_dans_le_rapport = 3
+
+
+def ensemble_de_Hall(
+    demandes: List[int], candidats: List[List[int]]
+) -> Optional[List[int]]:
+    """Cherche à attribuer à chaque place des quêtes (la quête j a
+    [demandes][j] places) un candidat différent parmi les [candidats] de la
+    quête. Renvoie None si c'est possible, sinon des quêtes dont les places
+    sont plus nombreuses que leurs candidats réunis."""
+    affectés: Dict[int, int] = {}
+
+    def augmenter(j: int, vus: set[int]) -> bool:
+        # Un candidat libre évite de parcourir les chemins alternés
+        for b in candidats[j]:
+            if b not in affectés:
+                affectés[b] = j
+                return True
+        for b in candidats[j]:
+            if b in vus or affectés.get(b) == j:
+                continue
+            vus.add(b)
+            k = affectés.get(b)
+            if k is None or augmenter(k, vus):
+                affectés[b] = j
+                return True
+        return False
+
+    for j, demande in enumerate(demandes):
+        for _ in range(demande):
+            vus: set[int] = set()
+            if not augmenter(j, vus):
+                # Toutes les quêtes atteintes n'ont que des candidats déjà pris
+                # par l'une d'entre elles
+                return sorted({j} | {affectés[b] for b in vus})
+    return None
+
+
+class Analyse_de_capacité:
+    """Conditions nécessaires à l'existence d'un planning des [bénévoles]
+    pour les quêtes de l'[index]. Les [erreurs] rendent le planning
+    impossible, les [alertes] non."""
+
+    def __init__(
+        self,
+        bénévoles: List[Bénévole],
+        index: Index_des_quêtes,
+        éligibilité: Optional[Éligibilité] = None,
+        temps_de_travail: Optional[Temps_de_travail] = None,
+    ):
+        début = time.perf_counter()
+        self.bénévoles: List[Bénévole] = list(bénévoles)
+        self.index = index
+        self.éligibilité = éligibilité or Éligibilité(self.bénévoles, index)
+        self.temps_de_travail = temps_de_travail or Temps_de_travail(
+            self.bénévoles, index
+        )
+        self.erreurs: List[str] = []
+        self.alertes: List[str] = []
+
+        qs = index.toutes
+        éligibles = self.éligibilité.éligibles
+        self.demandes: np.ndarray = np.array(
+            [q.nombre_bénévoles for q in qs], dtype=int
+        )
+        self.candidats: np.ndarray = éligibles.sum(axis=0)
+
+        self.vérifier_les_quêtes()
+        self.vérifier_les_cliques()
+        self.vérifier_les_jours()
+        # (début, fin, places, bénévoles éligibles) de chaque tranche horaire
+        self.profil: List[(datetime, datetime, int, int)] = self.balayer()
+        self.durée = time.perf_counter() - début
+
+    @property
+    def impossible(self) -> bool:
+        return self.erreurs != []
+
+    def vérifier_les_quêtes(self):
+        for j, q in enumerate(self.index.toutes):
+            if len(q.bénévoles) > q.nombre_bénévoles:
+                self.erreurs.append(
+                    f"{q}: {len(q.bénévoles)} bénévoles fixés pour "
+                    f"{q.nombre_bénévoles} places"
+                )
+            elif self.candidats[j] < self.demandes[j]:
+                self.erreurs.append(
+                    f"{q}: {self.candidats[j]} candidats éligibles pour "
+                    f"{self.demandes[j]} places"
+                )
+
+    def vérifier_les_cliques(self):
+        éligibles = self.éligibilité.éligibles
+        rang = self.index.rang
+        déjà_signalées = {
+            frozenset([j])
+            for j in range(len(self.demandes))
+            if self.candidats[j] < self.demandes[j]
+        }
+        for clique in self.index.cliques():
+            rangs = [rang[q] for q in clique]
+            colonnes = éligibles[:, rangs]
+            ensemble = ensemble_de_Hall(
+                [int(self.demandes[j]) for j in rangs],
+                [np.nonzero(colonnes[:, k])[0].tolist() for k in range(len(rangs))],
+            )
+            if ensemble is None:
+                continue
+            quêtes = frozenset(rangs[k] for k in ensemble)
+            if any(signalées <= quêtes for signalées in déjà_signalées):
+                continue
+            déjà_signalées.add(quêtes)
+            places = int(self.demandes[list(quêtes)].sum())
+            bénévoles = int(éligibles[:, list(quêtes)].any(axis=1).sum())
+            noms = ", ".join(str(self.index.toutes[j]) for j in sorted(quêtes))
+            self.erreurs.append(
+                f"{noms}: {places} places en même temps pour {bénévoles} "
+                "bénévoles éligibles"
+            )
+
+    def vérifier_les_jours(self):
+        éligibles = self.éligibilité.éligibles
+        rang = self.index.rang
+        ttt = self.temps_de_travail
+        for d, qs in self.index.par_jour.items():
+            requis = ttt.requis[ttt.rang_jour[d]]
+            théorique = ttt.théorique_total(d)
+            # Le temps pendant lequel chaque bénévole peut travailler est la
+            # longueur des segments entre débuts et fins consécutifs couverts
+            # par au moins une quête à laquelle il est éligible
+            débuts = [self.index.minutes(q.début) for q in qs]
+            fins = [self.index.minutes(q.fin) for q in qs]
+            instants = np.array(sorted(set(débuts) | set(fins)))
+            couverture = (np.array(débuts)[:, None] <= instants[None, :-1]) & (
+                np.array(fins)[:, None] >= instants[None, 1:]
+            )
+            rangs = [rang[q] for q in qs]
+            couverts = se_rencontrent(éligibles[:, rangs], couverture.T)
+            possible = int((couverts.astype(float) @ np.diff(instants)).sum())
+            if requis > possible:
+                self.erreurs.append(
+                    f"{d}: {durée(requis)} de travail requis, les bénévoles "
+                    f"éligibles ne peuvent travailler que {durée(possible)}"
+                )
+            elif requis > théorique:
+                self.alertes.append(
+                    f"{d}: {durée(requis)} de travail requis pour "
+                    f"{durée(théorique)} de temps théorique"
+                )
+
+    def balayer(self) -> List[(datetime, datetime, int, int)]:
+        index = self.index
+        éligibles = self.éligibilité.éligibles
+        instants = sorted(set(index.débuts) | set(index.fins))
+        profil = []
+        for a, b in zip(instants, instants[1:]):
+            # Entre deux instants consécutifs, les quêtes en cours le sont
+            # pendant toute la tranche
+            rangs = list(index.entre(a, b))
+            if rangs == []:
+                continue
+            profil.append(
+                (
+                    index.origine + timedelta(minutes=a),
+                    index.origine + timedelta(minutes=b),
+                    int(self.demandes[rangs].sum()),
+                    int(éligibles[:, rangs].any(axis=1).sum()),
+                )
+            )
+        return profil
+
+    def tranches_tendues(self, n: int) -> List[(datetime, datetime, int, int)]:
+        return sorted(
+            self.profil, key=lambda t: t[2] / t[3] if t[3] else np.inf, reverse=True
+        )[:n]
+
+    def rapport(self) -> str:
+        lignes = [
+            f"Analyse de capacité en {self.durée * 1000:.0f} ms: "
+            f"{len(self.erreurs)} erreurs, {len(self.alertes)} alertes"
+        ]
+        lignes += [f"- ERREUR {e}" for e in self.erreurs]
+        lignes += [f"- alerte {a}" for a in self.alertes]
+        for début, fin, places, bénévoles in self.tranches_tendues(
+            tranches_dans_le_rapport
+        ):
+            lignes.append(
+                f"- tranche tendue {début:%d/%m %H:%M}-{fin:%H:%M}: {places} "
+                f"places pour {bénévoles} bénévoles éligibles"
+            )
+        return "\n".join(lignes)
+
+    def écrire(self, fichier: str):
+        with open(fichier, "w") as f:
+            json.dump(
+                {
+                    "errors": self.erreurs,
+                    "warnings": self.alertes,
+                    "candidates": {
+                        q.id: int(c) for q, c in zip(self.index.toutes, self.candidats)
+                    },
+                    "profile": [
+                        {
+                            "start": début.isoformat(),
+                            "end": fin.isoformat(),
+                            "demand": places,
+                            "supply": bénévoles,
+                        }
+                        for début, fin, places, bénévoles in self.profil
+                    ],
+                },
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+
+
+def durée(minutes: float) -> str:
+    return f"{int(minutes // 60):0=2d}h{int(minutes % 60):0=2d}"
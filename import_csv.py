@@ -1,129 +1,291 @@
 from __future__ import annotations  # allows class type usage in class decl
-import csv, re, sys
-from datetime import date, time, datetime, timedelta
-
-from data_model import Bénévole, Lieu, Type_de_quête, Quête
-
-
-def update_pref_horaire(heure_début, data, prefs, indisponibilités):
-    heure_fin = heure_début + 1
-    if heure_début == 23:
-        heure_fin = 0
-    pref = data[f"{heure_début:0=2d}H{heure_fin:0=2d}H"]
-    val = 0
-    if pref == "indisponible":
-        indisponibilités.append(time(hour=heure_début))
-        return
-    if pref.startswith("Dispo sous"):
-        val = -1
-    if pref.startswith("Dispo et horaire"):
-        val = 1
-    prefs[time(hour=heure_début)] = val
-
-
-""" Importation des données """
-csv_lieux = sys.argv[1]  # That's not very flexible...
-csv_types_de_quête = sys.argv[2]
-csv_bénévoles = sys.argv[3]
-csv_quêtes = sys.argv[4]
+from typing import List, Dict, Optional
+from functools import cache
+import argparse, csv, re, time as chrono
+from datetime import time, datetime, timedelta
+
+from data_model import Bénévole, Lieu, Type_de_quête, Quête, registre_courant
+
+""" Importation des données
+
+Quatre exports CSV (Notion): lieux, types de quête, bénévoles et quêtes. Les
+lieux et les types sont identifiés par leur nom, les bénévoles par leur pseudo
+("Name") et les quêtes par leur numéro de ligne.
+
+Chaque fichier n'est ouvert qu'une fois. Le dialecte, le même pour tous, est
+deviné sur le début du fichier des bénévoles (celui des lieux n'a qu'une
+colonne), et les positions des colonnes sont lues dans l'entête de chaque
+fichier une fois pour toutes. Les mêmes horaires, préférences et relations
+reviennent des milliers de fois: chaque texte n'est analysé qu'une fois
+(`functools.cache`). Les quêtes sont toutes lues avant d'être créées, pour
+signaler d'un coup toutes celles qui ne peuvent pas l'être.
+
+    python import_csv.py Lieux.csv Types.csv Bénévoles.csv Quetes.csv """
 
 encoding = "utf-8-sig"
-dialect = csv.excel  # Dialecte par default
-with open(csv_bénévoles, newline="", encoding=encoding) as csvfile:
-    # We expect the dialect to be the same for every input csv
-    dialect = csv.Sniffer().sniff(csvfile.read(1024))
-
-with open(csv_lieux, newline="", encoding=encoding) as csvfile:
-    reader = csv.DictReader(csvfile, dialect=dialect)
-    for row in reader:
-        Lieu(row["Name"])
-
-with open(csv_types_de_quête, newline="", encoding=encoding) as csvfile:
-    reader = csv.DictReader(csvfile, dialect=dialect)
-    for row in reader:
-        sécable = row["Découpable ? "] == "oui"
-        Type_de_quête(row["Name"], sécable)
-
-with open(csv_bénévoles, newline="", encoding=encoding) as csvfile:
-    reader = csv.DictReader(csvfile, dialect=dialect)
-    for row in reader:
-        if row["Prénom"]:
-            indisponibilités = []
-            pref_horaires = {}
-            update_pref_horaire(0, row, pref_horaires, indisponibilités)
-            for i in range(9, 23 + 1):
-                update_pref_horaire(i, row, pref_horaires, indisponibilités)
-            Bénévole(
-                row["Name"],
-                row["Prénom"],
-                row["Full Name"],
-                int(row["heures théoriques par jour"]),
-                indisponibilités,
-                pref_horaires,
-            )
+# Les colonnes des préférences horaires: "09H10H"
+colonne_horaire = re.compile(r"^(\d\d)H(\d\d)H$")
+
+
+class ParseException(Exception):
+    pass
+
+
+class Fichier_csv:
+    """Un fichier CSV lu d'un coup, avec le [dialecte] donné ou à défaut
+    deviné sur son début."""
+
+    def __init__(self, chemin: str, dialecte=None):
+        with open(chemin, newline="", encoding=encoding) as f:
+            if dialecte is None:
+                try:
+                    dialecte = csv.Sniffer().sniff(f.read(1024))
+                except csv.Error:
+                    dialecte = csv.excel  # Dialecte par default
+                f.seek(0)
+            self.dialecte = dialecte
+            lignes = csv.reader(f, dialect=dialecte)
+            self.entête: List[str] = next(lignes, [])
+            self.lignes: List[List[str]] = list(lignes)
+        self.chemin = chemin
+        self.positions = {nom: i for i, nom in enumerate(self.entête)}
+
+    def colonne(self, nom: str) -> int:
+        try:
+            return self.positions[nom]
+        except KeyError:
+            raise ParseException("colonne", f"{nom} ({self.chemin})")
+
+
+def valeur(ligne: List[str], colonne: int) -> str:
+    return ligne[colonne] if colonne < len(ligne) else ""
+
+
+@cache
+def préférence(texte: str) -> Optional[int]:
+    """None pour une indisponibilité."""
+    if texte == "indisponible":
+        return None
+    if texte.startswith("Dispo sous"):
+        return -1
+    if texte.startswith("Dispo et horaire"):
+        return 1
+    return 0
+
+
+@cache
+def horodatage(texte: str) -> datetime:
+    return datetime.strptime(texte, "%d/%m/%Y %H:%M")
 
 
+@cache
 def parse_horaires(horaire: str):
     horaire_groups = re.match(r"(.*) \(.*\) → (.*) \(.*\)", horaire)
     if horaire_groups:
-        début = datetime.strptime(horaire_groups.group(1), "%d/%m/%Y %H:%M")
-        fin = datetime.strptime(horaire_groups.group(2), "%d/%m/%Y %H:%M")
+        début = horodatage(horaire_groups.group(1))
+        fin = horodatage(horaire_groups.group(2))
         return début, fin
     else:
         horaire_groups = re.match(r"(.*) \(.*\) → (.*):(.*)", horaire)
-        début = datetime.strptime(horaire_groups.group(1), "%d/%m/%Y %H:%M")
+        début = horodatage(horaire_groups.group(1))
         heure_fin = time(int(horaire_groups.group(2)), int(horaire_groups.group(3)))
         fin = datetime.combine(début, heure_fin)
         return début, fin
 
 
-class ParseException(Exception):
-    pass
+@cache
+def nom_de_relation(texte: str) -> str:
+    # Scène (https://www.notion.so/...) => Scène
+    return re.match(r"(.*) \(http", texte).group(1)
+
+
+def load_lieux(fichier: Fichier_csv) -> int:
+    nom = fichier.colonne("Name")
+    for ligne in fichier.lignes:
+        Lieu(ligne[nom], ligne[nom])
+    return len(fichier.lignes)
+
+
+def load_types(fichier: Fichier_csv) -> int:
+    nom = fichier.colonne("Name")
+    découpable = fichier.colonne("Découpable ? ")
+    for ligne in fichier.lignes:
+        Type_de_quête(ligne[nom], ligne[nom], valeur(ligne, découpable) == "oui")
+    return len(fichier.lignes)
+
 
+def load_bénévoles(fichier: Fichier_csv) -> int:
+    nom = fichier.colonne("Name")
+    prénom = fichier.colonne("Prénom")
+    nom_complet = fichier.colonne("Full Name")
+    heures = fichier.colonne("heures théoriques par jour")
+    horaires = []  # (colonne, heure)
+    for i, colonne in enumerate(fichier.entête):
+        m = colonne_horaire.match(colonne)
+        if m:
+            horaires.append((i, time(hour=int(m.group(1)))))
 
-with open(csv_quêtes, newline="", encoding=encoding) as csvfile:
-    reader = csv.DictReader(csvfile, dialect=dialect)
-    for row in reader:
+    for ligne in fichier.lignes:
+        if not valeur(ligne, prénom):
+            continue
+        indisponibilités = []
+        pref_horaires = {}
+        for i, heure in horaires:
+            pref = préférence(valeur(ligne, i))
+            if pref is None:
+                indisponibilités.append(heure)
+            else:
+                pref_horaires[heure] = pref
+        Bénévole(
+            ligne[nom],
+            ligne[nom],
+            ligne[prénom],
+            valeur(ligne, nom_complet).removeprefix(ligne[prénom]).strip(),
+            int(valeur(ligne, heures) or 0),
+            indisponibilités,
+            [],
+            pref_horaires,
+            [],
+            [],
+            [],
+            [],
+        )
+    return len(fichier.lignes)
+
+
+def load_quêtes(fichier: Fichier_csv) -> int:
+    nom = fichier.colonne("Name")
+    lieu = fichier.colonne("Place")
+    types = fichier.colonne("Type de Quete")
+    horaire = fichier.colonne("Horaire")
+    nombre = fichier.colonne("Needed")
+    registre = registre_courant()
+
+    # Les relations déjà résolues dans ce registre, par texte
+    lieux: Dict[str, Lieu] = {}
+    types_par_texte: Dict[str, (List[Type_de_quête], bool)] = {}
+
+    def résoudre_lieu(texte: str) -> Lieu:
         try:
+            return registre.lieux[nom_de_relation(texte)]
+        except AttributeError:
+            raise ParseException("place", texte)
+        except KeyError as e:
+            raise ParseException("relation", e.args[0])
+
+    def résoudre_types(texte: str) -> (List[Type_de_quête], bool):
+        try:
+            noms = [nom_de_relation(t) for t in texte.split(", ")]
+        except AttributeError:
+            raise ParseException("type", texte)
+        try:
+            types_de_quête = [registre.types[t] for t in noms]
+        except KeyError as e:
+            raise ParseException("relation", e.args[0])
+        return types_de_quête, all(t.sécable for t in types_de_quête)
+
+    quêtes = []
+    for numéro, ligne in enumerate(fichier.lignes, start=2):
+        try:
+            texte = valeur(ligne, lieu)
+            place = lieux.get(texte)
+            if place is None:
+                place = lieux[texte] = résoudre_lieu(texte)
+            texte = valeur(ligne, types)
+            types_de_quête = types_par_texte.get(texte)
+            if types_de_quête is None:
+                types_de_quête = types_par_texte[texte] = résoudre_types(texte)
+            texte = valeur(ligne, horaire)
             try:
-                place = re.match(r"(.*) \(http", row["Place"]).group(1)
-            except:
-                raise ParseException("place", row["Place"])
-            try:
-                types_de_quête = row["Type de Quete"].split(", ")
-                types_de_quête = list(
-                    map(lambda t: re.match(r"(.*) \(http", t).group(1), types_de_quête)
-                )
-            except:
-                raise ParseException("type", row["Type de Quete"])
-            try:
-                début, fin = parse_horaires(row["Horaire"])
-            except ValueError as e:
-                raise ParseException(f"horaire ({e.args[0]})", row["Horaire"])
-            type_de_quête = list(map(lambda t: Type_de_quête.tous[t], types_de_quête))
-            if all(t.sécable for t in type_de_quête):
-                fin_acc = début
-                while fin_acc < fin:
-                    début_acc = fin_acc
-                    # fin_acc = min(fin_acc + timedelta(minutes=15), fin)
-                    fin_acc = min(fin_acc + timedelta(minutes=120), fin)
-                    Quête(
-                        row["Name"],
-                        type_de_quête,
-                        Lieu.tous[place],
-                        int(row["Needed"]),
-                        début_acc,
-                        fin_acc,
-                    )
-            else:
-                Quête(
-                    row["Name"],
-                    type_de_quête,
-                    Lieu.tous[place],
-                    int(row["Needed"]),
+                début, fin = parse_horaires(texte)
+            except (AttributeError, ValueError) as e:
+                raise ParseException(f"horaire ({e.args[0]})", texte)
+            quêtes.append(
+                (
+                    str(numéro),
+                    ligne[nom],
+                    types_de_quête,
+                    place,
+                    int(valeur(ligne, nombre) or 0),
                     début,
                     fin,
                 )
-
+            )
         except ParseException as e:
             print(f"Cannot parse {e.args[0]}: '{e.args[1]}'")
+
+    for id, nom_quête, (types_de_quête, sécable), place, needed, début, fin in quêtes:
+        if sécable:
+            fin_acc = début
+            i = 0
+            while fin_acc < fin:
+                début_acc = fin_acc
+                fin_acc = min(fin_acc + timedelta(minutes=120), fin)
+                i = i + 1
+                Quête(
+                    f"{id} #{i}",
+                    f"{nom_quête} #{i}",
+                    types_de_quête,
+                    place,
+                    None,
+                    needed,
+                    début_acc,
+                    fin_acc,
+                    [],
+                    [],
+                )
+        else:
+            Quête(
+                id,
+                nom_quête,
+                types_de_quête,
+                place,
+                None,
+                needed,
+                début,
+                fin,
+                [],
+                [],
+            )
+    return len(fichier.lignes)
+
+
+def charger(
+    csv_lieux: str, csv_types_de_quête: str, csv_bénévoles: str, csv_quêtes: str
+) -> Dict:
+    """Charge les quatre fichiers dans le registre courant. Renvoie le nombre
+    de lignes lues de chaque fichier, la durée et le débit en lignes/s."""
+    début = chrono.perf_counter()
+    bénévoles = Fichier_csv(csv_bénévoles)
+    lignes = {
+        "lieux": load_lieux(Fichier_csv(csv_lieux, bénévoles.dialecte)),
+        "types": load_types(Fichier_csv(csv_types_de_quête, bénévoles.dialecte)),
+        "bénévoles": load_bénévoles(bénévoles),
+        "quêtes": load_quêtes(Fichier_csv(csv_quêtes, bénévoles.dialecte)),
+    }
+    durée = chrono.perf_counter() - début
+    return {
+        "rows": lignes,
+        "seconds": durée,
+        "rows_per_second": sum(lignes.values()) / durée,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import des exports CSV")
+    parser.add_argument("lieux")
+    parser.add_argument("types")
+    parser.add_argument("bénévoles")
+    parser.add_argument("quêtes")
+    args = parser.parse_args()
+    débit = charger(args.lieux, args.types, args.bénévoles, args.quêtes)
+    print(
+        f"{sum(débit['rows'].values())} lignes en {débit['seconds']:.3f}s: "
+        f"{débit['rows_per_second']:.0f} lignes/s "
+        f"({len(registre_courant().bénévoles)} bénévoles, "
+        f"{len(registre_courant().quêtes)} quêtes)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
 from functools import reduce
 from import_gapi_req import get
-from data_model import Bénévole, Spectacle, Lieu, Type_de_quête, Quête
+from data_model import Bénévole, Spectacle, Lieu, Type_de_quête, Quête, registre_courant
 
-from xlrd import xldate_as_datetime
+import argparse
 from datetime import date, time, datetime, timedelta
 
 
@@ -31,9 +31,14 @@ def load_types(data):
         Type_de_quête(id, nom, sécable, spécialiste_only)
 
 
+# Les dates des feuilles sont des nombres de jours depuis cette date, arrondis
+# à la milliseconde comme xlrd.xldate_as_datetime(date, 0) après février 1900
+époque_des_feuilles = datetime(1899, 12, 30)
+
+
 def to_datetime(date):
     if date:
-        return xldate_as_datetime(date, 0)
+        return époque_des_feuilles + timedelta(milliseconds=round(date * 86400000))
     return None
 
 
@@ -124,14 +129,16 @@ def load_quêtes(data):
         id = str(q["id"])
         if id:
             nom = str(q["nom"])
-            types = list(map(Type_de_quête.tous.get, split(q["types"])))
-            lieu = Lieu.tous[str(q["lieu"])]
+            types = list(map(registre_courant().types.get, split(q["types"])))
+            lieu = registre_courant().lieux[str(q["lieu"])]
             spectacle = None
             nombre_bénévoles = with_default(q["nombre_bénévoles"], int, 2)
             début = to_datetime(q["début"])
             fin = to_datetime(q["fin"])
             sécable = to_bool(q["découpable"])
-            bénévoles_fixés = list(map(Bénévole.tous.get, split(q["fixés"])))
+            bénévoles_fixés = list(
+                map(registre_courant().bénévoles.get, split(q["fixés"]))
+            )
 
             def new_quête(id, nom, début: date, fin):
                 if début and fin:
@@ -164,15 +171,21 @@ def load_quêtes(data):
                 new_quête(id, nom, début, fin)
 
 
-def main():
-    data = get()
+def main(hors_ligne: bool = False, api=None):
+    """Charge les feuilles dans le registre courant, depuis le dernier
+    instantané s'il est à jour ou [hors_ligne] (voir import_gapi_req)."""
+    data = get(hors_ligne, api)
     if not (data is None):
         load_lieux(data)
         load_types(data)
         load_bénévoles(data)
         load_quêtes(data)
-    Bénévole.strengthen()
+    registre_courant().strengthen_bénévoles()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Import des feuilles Google")
+    parser.add_argument(
+        "--hors-ligne", action="store_true", help="réutiliser le dernier instantané"
+    )
+    main(parser.parse_args().hors_ligne)
@@ -1,80 +1,215 @@
-import os.path
-
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import gzip, json, os.path
+from datetime import datetime, timezone
 
 from itertools import zip_longest
 
-# If modifying these scopes, delete the file token.json.
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
+try:
+    from googleapiclient.errors import HttpError
+    from google.auth.exceptions import TransportError
+    from httplib2 import HttpLib2Error
+
+    erreurs_google = (HttpError, TransportError, HttpLib2Error)
+except ImportError:
+    # Without the Google client, only snapshots and `API_locale` can be used
+    erreurs_google = ()
+
+# Les échecs des requêtes après lesquels on se rabat sur le dernier instantané:
+# une erreur de l'API ou le réseau (socket.timeout est un TimeoutError)
+échecs_des_requêtes = erreurs_google + (ConnectionError, TimeoutError)
+
+# If modifying these scopes, delete the file token.json. The Drive scope only
+# gives the modification date of the spreadsheet, see `API_Google.modification`.
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets.readonly",
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
+]
 
 # The ID and range of a sample spreadsheet.
 spreadsheetId = "1aCffWf1nRSQfPcIThGdxyyYvUwL5Bx19IegZLVe0O2k"
+ranges = ["stypes", "slieux", "sbénévoles", "squêtes"]
+# Les clés du résultat de `get`, dans l'ordre des [ranges]
+clés = ["types_de_quêtes", "lieux", "bénévoles", "quêtes"]
 
+""" Instantanés
 
-def dict_of_list(l: list):
-    """
-    Build a list of dicts from a list of list where the first list contains
-    the keys and the following lists are the values.
-    """
-    keys = l.pop(0)
-    return list(map(lambda row: dict(zip_longest(keys, row, fillvalue=None)), l))
+Chaque lecture des feuilles est enregistrée, compressée, dans
+.cache/gapi/<spreadsheetId>/<date>.json.gz avec la date de modification de la
+feuille. Avant de relire les feuilles, on ne demande que cette date (une
+requête de métadonnées à l'API Drive): si elle n'a pas changé, le dernier
+instantané est réutilisé. Hors ligne, le dernier instantané est réutilisé sans
+rien demander, de même quand une requête échoue (erreur de l'API, réseau
+coupé, délai dépassé) après avoir signalé l'échec.
+
+L'accès aux feuilles passe par un objet qui a les méthodes `modification` et
+`valeurs` de `API_Google`. `API_locale` le remplace par des données en
+mémoire, pour les tests et les bancs de performances. """
+
+dossier_des_instantanés = ".cache/gapi"
+# Nombre d'instantanés gardés par feuille
+instantanés_gardés = 20
+
+
+def dossier(id: str) -> str:
+    return os.path.join(dossier_des_instantanés, id)
+
+
+def instantanés(id: str) -> list:
+    """Les fichiers des instantanés de la feuille [id], du plus ancien au plus
+    récent."""
+    if not os.path.isdir(dossier(id)):
+        return []
+    noms = sorted(n for n in os.listdir(dossier(id)) if n.endswith(".json.gz"))
+    return [os.path.join(dossier(id), n) for n in noms]
+
+
+def lire_instantané(fichier: str) -> dict:
+    with gzip.open(fichier, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def dernier_instantané(id: str = spreadsheetId):
+    fichiers = instantanés(id)
+    return lire_instantané(fichiers[-1]) if fichiers else None
+
+
+def enregistrer_instantané(id: str, modification, valueRanges: list) -> str:
+    os.makedirs(dossier(id), exist_ok=True)
+    maintenant = datetime.now(timezone.utc)
+    nom = maintenant.strftime("%Y%m%dT%H%M%S%f") + ".json.gz"
+    fichier = os.path.join(dossier(id), nom)
+    instantané = {
+        "spreadsheetId": id,
+        "fetchedAt": maintenant.isoformat(),
+        "modifiedTime": modification,
+        "valueRanges": valueRanges,
+    }
+    # compresslevel 1: les feuilles se compressent déjà très bien
+    with gzip.open(fichier, "wt", encoding="utf-8", compresslevel=1) as f:
+        json.dump(instantané, f, ensure_ascii=False)
+    for ancien in instantanés(id)[:-instantanés_gardés]:
+        os.remove(ancien)
+    return fichier
 
 
-def get():
-    creds = None
-    # The file token.json stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first
-    # time.
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-        # Save the credentials for the next run
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
-
-    try:
-        service = build("sheets", "v4", credentials=creds)
+class API_Google:
+    """Les feuilles Google, lues avec les identifiants de token.json."""
 
+    def __init__(self):
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from googleapiclient.discovery import build
+
+        creds = None
+        # The file token.json stores the user's access and refresh tokens, and is
+        # created automatically when the authorization flow completes for the first
+        # time.
+        if os.path.exists("token.json"):
+            creds = Credentials.from_authorized_user_file("token.json")
+            # A token from before a change of scopes asks to log in again
+            if not creds.has_scopes(SCOPES):
+                creds = None
+        # If there are no (valid) credentials available, let the user log in.
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    "credentials.json", SCOPES
+                )
+                creds = flow.run_local_server(port=0)
+            # Save the credentials for the next run
+            with open("token.json", "w") as token:
+                token.write(creds.to_json())
+
+        self.sheets = build("sheets", "v4", credentials=creds)
+        self.drive = build("drive", "v3", credentials=creds)
+
+    def modification(self, id: str):
+        """La date de dernière modification de la feuille [id]."""
+        fichier = self.drive.files().get(fileId=id, fields="modifiedTime").execute()
+        return fichier["modifiedTime"]
+
+    def valeurs(self, id: str, ranges: list) -> list:
         # Call the Sheets API
-        sheet = service.spreadsheets()
         result = (
-            sheet.values()
+            self.sheets.spreadsheets()
+            .values()
             .batchGet(
-                spreadsheetId=spreadsheetId,
+                spreadsheetId=id,
                 dateTimeRenderOption="SERIAL_NUMBER",
                 valueRenderOption="UNFORMATTED_VALUE",
-                ranges=["stypes", "slieux", "sbénévoles", "squêtes"],
+                ranges=ranges,
             )
             .execute()
         )
-        values = result.get("valueRanges", [])
+        return result.get("valueRanges", [])
+
+
+class API_locale:
+    """Remplace `API_Google` par des [données] au format renvoyé par `get`
+    (voir `synthetic.vers_gapi`). [modification] tient lieu de date de
+    modification: la changer simule une modification de la feuille."""
+
+    def __init__(self, données: dict, modification="local"):
+        self.modification_ = modification
+        self.requêtes = 0
+        self.valueRanges = [
+            {"range": nom, "values": list_of_dict(données[clé])}
+            for nom, clé in zip(ranges, clés)
+        ]
+
+    def modification(self, id: str):
+        return self.modification_
+
+    def valeurs(self, id: str, ranges: list) -> list:
+        self.requêtes += 1
+        return [v for v in self.valueRanges if v["range"] in ranges]
+
+
+def dict_of_list(l: list):
+    """
+    Build a list of dicts from a list of list where the first list contains
+    the keys and the following lists are the values.
+    """
+    keys = l.pop(0)
+    return list(map(lambda row: dict(zip_longest(keys, row, fillvalue=None)), l))
+
+
+def list_of_dict(l: list):
+    """The inverse of `dict_of_list`."""
+    keys = list(dict.fromkeys(k for d in l for k in d))
+    return [keys] + [[d.get(k, "") for k in keys] for d in l]
 
-        if not values:
-            print("No data found.")
+
+def get(hors_ligne: bool = False, api=None, id: str = spreadsheetId):
+    """Les données des feuilles, depuis le dernier instantané s'il est à jour,
+    [hors_ligne] ou si une requête échoue (voir `échecs_des_requêtes`). [api]
+    est créée à la demande, `API_Google` par défaut."""
+    dernier = dernier_instantané(id)
+    if hors_ligne:
+        if dernier is None:
+            print(f"Pas d'instantané de {id} dans {dossier_des_instantanés}.")
             return None
+        values = dernier["valueRanges"]
+    else:
+        try:
+            api = api or API_Google()
+            modification = api.modification(id)
+            if dernier is not None and dernier["modifiedTime"] == modification:
+                values = dernier["valueRanges"]
+            else:
+                values = api.valeurs(id, ranges)
+                enregistrer_instantané(id, modification, values)
+        except échecs_des_requêtes as err:
+            print(f"Échec de la lecture des feuilles ({type(err).__name__}): {err}")
+            if dernier is None:
+                return None
+            print(f"Utilisation du dernier instantané ({dernier['fetchedAt']})")
+            values = dernier["valueRanges"]
 
-        stypes = values.pop(0)["values"]
-        slieux = values.pop(0)["values"]
-        sbénévoles = values.pop(0)["values"]
-        squêtes = values.pop(0)["values"]
-
-        result = {
-            "types_de_quêtes": dict_of_list(stypes),
-            "lieux": dict_of_list(slieux),
-            "bénévoles": dict_of_list(sbénévoles),
-            "quêtes": dict_of_list(squêtes),
-        }
-        return result
-    except HttpError as err:
-        print(err)
+    if not values:
+        print("No data found.")
         return None
+
+    return {clé: dict_of_list(list(v["values"])) for clé, v in zip(clés, values)}
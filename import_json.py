@@ -1,32 +1,51 @@
-import json
+import argparse, json, os, resource, time as chrono
 from datetime import date, time, datetime, timedelta
+from typing import Dict, Iterator, Tuple
 
-from data_model import Bénévole, Spectacle, Lieu, Type_de_quête, Quête
+from data_model import (
+    Bénévole,
+    Spectacle,
+    Lieu,
+    Type_de_quête,
+    Quête,
+    Registre,
+    registre_courant,
+    utiliser,
+)
+
+
+def load_spectacle(s):
+    id = s["id"]
+    props = s["properties"]
+    Spectacle(id, props["Nom"]["title"][0]["plain_text"])
 
 
 def load_spectacles(obj):
-    spectacles = obj["shows"]
-    for s in spectacles["pages"]:
-        id = s["id"]
-        props = s["properties"]
-        Spectacle(id, props["Nom"]["title"][0]["plain_text"])
+    for s in obj["shows"]["pages"]:
+        load_spectacle(s)
+
+
+def load_lieu(p):
+    id = p["id"]
+    props = p["properties"]
+    Lieu(id, props["Name"]["title"][0]["plain_text"])
 
 
 def load_lieux(obj):
-    places = obj["places"]
-    for p in places["pages"]:
-        id = p["id"]
-        props = p["properties"]
-        Lieu(id, props["Name"]["title"][0]["plain_text"])
+    for p in obj["places"]["pages"]:
+        load_lieu(p)
+
+
+def load_type_de_quête(p):
+    id = p["id"]
+    name = p["properties"]["Name"]["title"][0]["plain_text"]
+    sécable = p["properties"]["D\u00e9coupable ?"]["checkbox"]
+    Type_de_quête(id, name, sécable)
 
 
 def load_types_de_quête(obj):
-    quest_types = obj["questsTypes"]
-    for p in quest_types["pages"]:
-        id = p["id"]
-        name = p["properties"]["Name"]["title"][0]["plain_text"]
-        sécable = p["properties"]["D\u00e9coupable ?"]["checkbox"]
-        Type_de_quête(id, name, sécable)
+    for p in obj["questsTypes"]["pages"]:
+        load_type_de_quête(p)
 
 
 def update_pref_horaire(heure_début, data, prefs, indisponibilités):
@@ -53,42 +72,46 @@ def update_pref_horaire(heure_début, data, prefs, indisponibilités):
     prefs[time(hour=heure_début)] = val
 
 
-def load_bénévoles(obj):
-    volunteers = obj["volunteers"]
-    for p in volunteers["pages"]:
-        props = p["properties"]
-        id = p["id"]
-        sérénité = props["Team S\u00e9r\u00e9nit\u00e9"]["checkbox"]
-        heures_théoriques = float(props["heures th\u00e9oriques par jour"]["number"])
-        date_départ = None
-        if props["Date d\u00e9part"]["date"]:
-            date_départ = datetime.fromisoformat(
-                props["Date d\u00e9part"]["date"]["start"]
-            )
-        types_de_quête_interdits = list(
-            map(
-                lambda tdq: Type_de_quête.tous[tdq["id"]],
-                props["type de Quete interdit"]["relation"],
-            )
+def load_bénévole(p):
+    props = p["properties"]
+    id = p["id"]
+    heures_théoriques = float(props["heures th\u00e9oriques par jour"]["number"])
+    date_départ = None
+    if props["Date d\u00e9part"]["date"]:
+        date_départ = datetime.fromisoformat(props["Date d\u00e9part"]["date"]["start"])
+    types_de_quête_interdits = list(
+        map(
+            lambda tdq: registre_courant().types[tdq["id"]],
+            props["type de Quete interdit"]["relation"],
+        )
+    )
+    if heures_théoriques > 0:
+        indisponibilités = []
+        pref_horaires = {}
+        update_pref_horaire(0, props, pref_horaires, indisponibilités)
+        for i in range(9, 23 + 1):
+            update_pref_horaire(i, props, pref_horaires, indisponibilités)
+        Bénévole(
+            id,
+            props["Pseudo"]["title"][0]["plain_text"],
+            props["Pr\u00e9nom"]["rich_text"][0]["plain_text"],
+            props["Nom"]["rich_text"][0]["plain_text"],
+            heures_théoriques,
+            indisponibilités,
+            [],
+            pref_horaires,
+            [],
+            [],
+            types_de_quête_interdits,
+            [],
+            None,
+            date_départ,
         )
-        if heures_théoriques > 0:
-            indisponibilités = []
-            pref_horaires = {}
-            update_pref_horaire(0, props, pref_horaires, indisponibilités)
-            for i in range(9, 23 + 1):
-                update_pref_horaire(i, props, pref_horaires, indisponibilités)
-            Bénévole(
-                id,
-                props["Pseudo"]["title"][0]["plain_text"],
-                props["Pr\u00e9nom"]["rich_text"][0]["plain_text"],
-                props["Nom"]["rich_text"][0]["plain_text"],
-                heures_théoriques,
-                indisponibilités,
-                pref_horaires,
-                sérénité,
-                types_de_quête_interdits,
-                date_départ,
-            )
+
+
+def load_bénévoles(obj):
+    for p in obj["volunteers"]["pages"]:
+        load_bénévole(p)
 
 
 def parse_horaires(horaire: str):
@@ -105,100 +128,105 @@ def parse_horaires(horaire: str):
         return début, fin
 
 
-def load_quêtes(obj):
-    quests = obj["quests"]
-    for p in quests["pages"]:
-        props = p["properties"]
-        id = p["id"]
-        name = props["Name"]["title"][0]["plain_text"]
-        needed = props["Needed"]["number"]
-        places = props["Place"]["relation"]
-        place = None
-        if len(places) > 0:
-            place = Lieu.tous[places[0]["id"]]
-        types_de_quête = list(
-            map(
-                lambda tdq: Type_de_quête.tous[tdq["id"]],
-                props["Type de Quete"]["relation"],
-            )
+def load_quête(p):
+    props = p["properties"]
+    id = p["id"]
+    name = props["Name"]["title"][0]["plain_text"]
+    needed = props["Needed"]["number"]
+    places = props["Place"]["relation"]
+    place = None
+    if len(places) > 0:
+        place = registre_courant().lieux[places[0]["id"]]
+    types_de_quête = list(
+        map(
+            lambda tdq: registre_courant().types[tdq["id"]],
+            props["Type de Quete"]["relation"],
         )
-        début = datetime.fromisoformat(props["Horaire"]["date"]["start"])
-        fin = datetime.fromisoformat(props["Horaire"]["date"]["end"])
-        bénévoles = list(
-            map(
-                lambda b: Bénévole.tous[b["id"]],
-                props["B\u00e9n\u00e9voles v\u00e9rouill\u00e9s"]["relation"],
-            )
+    )
+    début = datetime.fromisoformat(props["Horaire"]["date"]["start"])
+    fin = datetime.fromisoformat(props["Horaire"]["date"]["end"])
+    bénévoles = list(
+        map(
+            lambda b: registre_courant().bénévoles[b["id"]],
+            props["B\u00e9n\u00e9voles v\u00e9rouill\u00e9s"]["relation"],
         )
-        spectacle = None
-        if len(props["Spectacle"]["relation"]) > 0:
-            spectacle = Spectacle.tous[props["Spectacle"]["relation"][0]["id"]]
-
-        def new_quête(id, name, début: date, fin):
-            q = Quête(
-                id,
-                name,
-                types_de_quête,
-                place,
-                spectacle,
-                needed,
-                début,
-                fin,
-                bénévoles,
-            )
+    )
+    spectacle = None
+    if len(props["Spectacle"]["relation"]) > 0:
+        spectacle = registre_courant().spectacles[
+            props["Spectacle"]["relation"][0]["id"]
+        ]
 
-            for b in bénévoles:
-                b.quêtes_assignées.append(q)
+    def new_quête(id, name, début: date, fin):
+        q = Quête(
+            id,
+            name,
+            types_de_quête,
+            place,
+            spectacle,
+            needed,
+            début,
+            fin,
+            bénévoles,
+        )
+
+        for b in bénévoles:
+            b.quêtes_assignées.append(q)
 
-        def new_quêtes(name, début: date, fin):
-            dup = False
-            for t in types_de_quête:
-                if not ("Affichage" in t.nom):
-                    dup = True
+    def new_quêtes(name, début: date, fin):
+        dup = False
+        for t in types_de_quête:
+            if not ("Affichage" in t.nom):
+                dup = True
+        new_quête(
+            id,
+            name,
+            début,
+            fin,
+        )
+        if dup:
             new_quête(
-                id,
-                name,
-                début,
-                fin,
+                f"{id}",
+                f"{name}",
+                début + timedelta(days=1),
+                fin + timedelta(days=1),
             )
-            if dup:
-                new_quête(
-                    f"{id}",
-                    f"{name}",
-                    début + timedelta(days=1),
-                    fin + timedelta(days=1),
-                )
-                new_quête(
-                    f"{id}",
-                    f"{name}",
-                    début + timedelta(days=2),
-                    fin + timedelta(days=2),
-                )
-                new_quête(
-                    f"{id}",
-                    f"{name}",
-                    début + timedelta(days=3),
-                    fin + timedelta(days=3),
-                )
-
-        if all(t.sécable for t in types_de_quête):
-            fin_acc = début
-            i = 0
-            while fin_acc < fin:
-                début_acc = fin_acc
-                fin_acc = min(fin_acc + timedelta(minutes=120), fin)
-                i = i + 1
-                new_quêtes(
-                    f"{name} #{i}",
-                    début_acc,
-                    fin_acc,
-                )
-        else:
+            new_quête(
+                f"{id}",
+                f"{name}",
+                début + timedelta(days=2),
+                fin + timedelta(days=2),
+            )
+            new_quête(
+                f"{id}",
+                f"{name}",
+                début + timedelta(days=3),
+                fin + timedelta(days=3),
+            )
+
+    if all(t.sécable for t in types_de_quête):
+        fin_acc = début
+        i = 0
+        while fin_acc < fin:
+            début_acc = fin_acc
+            fin_acc = min(fin_acc + timedelta(minutes=120), fin)
+            i = i + 1
             new_quêtes(
-                name,
-                début,
-                fin,
+                f"{name} #{i}",
+                début_acc,
+                fin_acc,
             )
+    else:
+        new_quêtes(
+            name,
+            début,
+            fin,
+        )
+
+
+def load_quêtes(obj):
+    for p in obj["quests"]["pages"]:
+        load_quête(p)
 
 
 def load_assignations(obj):
@@ -210,7 +238,7 @@ def load_assignations(obj):
         id_quête = props["Qu\u00eate"]["relation"][0]["id"]
         bénévoles = []
         for id_b in props["B\u00e9n\u00e9voles"]["relation"]:
-            bénévoles.append(Bénévole.tous[id_b["id"]])
+            bénévoles.append(registre_courant().bénévoles[id_b["id"]])
         sécable = p["properties"]["D\u00e9coupable ?"]["checkbox"]
         Type_de_quête(id, name, sécable)
 
@@ -223,3 +251,237 @@ def from_file(src):
         load_types_de_quête(obj)
         load_bénévoles(obj)
         load_quêtes(obj)
+
+
+""" Lecture en flux
+
+`json.load` garde tout l'export en mémoire, plus les dictionnaires de chaque
+page: plusieurs fois la taille du fichier. `pages` lit le fichier par blocs et
+ne décode qu'une page à la fois (avec le décodeur C de json, via
+`raw_decode`), en ne suivant que la structure de l'export:
+{"<collection>": {"pages": [<page>, ...], ...}, ...}. Les autres valeurs sont
+décodées puis oubliées. `from_stream` crée les entités au fil des pages. Les
+pages d'une collection lue avant celles dont elle dépend (les quêtes avant les
+bénévoles par exemple) sont gardées jusqu'à ce qu'elles puissent l'être. """
+
+chargements = {
+    "shows": load_spectacle,
+    "places": load_lieu,
+    "questsTypes": load_type_de_quête,
+    "volunteers": load_bénévole,
+    "quests": load_quête,
+}
+# Les collections auxquelles les pages de chaque collection font référence
+dépendances = {
+    "volunteers": ["questsTypes"],
+    "quests": ["shows", "places", "questsTypes", "volunteers"],
+}
+
+
+class Lecteur:
+    """Les valeurs JSON successives d'un [fichier] texte lu par blocs de
+    [taille] caractères."""
+
+    espaces = " \t\n\r"
+
+    def __init__(self, fichier, taille: int = 1 << 20):
+        self.fichier = fichier
+        self.taille = taille
+        self.tampon = ""
+        self.position = 0
+        self.fin = False
+        self.décodeur = json.JSONDecoder()
+
+    def remplir(self, taille: int) -> bool:
+        if self.fin:
+            return False
+        bloc = self.fichier.read(taille)
+        self.fin = len(bloc) < taille
+        self.tampon = self.tampon[self.position :] + bloc
+        self.position = 0
+        return bloc != ""
+
+    def suivant(self) -> str:
+        """Le prochain caractère qui n'est pas un espace, sans le lire."""
+        while True:
+            while (
+                self.position < len(self.tampon)
+                and self.tampon[self.position] in self.espaces
+            ):
+                self.position += 1
+            if self.position < len(self.tampon):
+                return self.tampon[self.position]
+            if not self.remplir(self.taille):
+                raise ValueError("fin inattendue de l'export JSON")
+
+    def attendre(self, caractère: str):
+        if self.suivant() != caractère:
+            raise ValueError(
+                f"{caractère!r} attendu, {self.tampon[self.position:][:20]!r} trouvé"
+            )
+        self.position += 1
+
+    def virgule(self):
+        if self.suivant() == ",":
+            self.position += 1
+
+    def valeur(self):
+        self.suivant()
+        taille = self.taille
+        while True:
+            try:
+                valeur, fin = self.décodeur.raw_decode(self.tampon, self.position)
+                # Un nombre au bord du tampon peut continuer dans le bloc suivant
+                if fin < len(self.tampon) or self.fin:
+                    self.position = fin
+                    return valeur
+            except json.JSONDecodeError:
+                if self.fin:
+                    raise
+            # Des blocs de plus en plus grands, pour les valeurs très longues
+            self.remplir(taille)
+            taille *= 2
+
+
+def pages(fichier, taille: int = 1 << 20) -> Iterator[Tuple[str, Dict]]:
+    """Les couples (collection, page) d'un export Notion, dans l'ordre du
+    [fichier]."""
+    lecteur = Lecteur(fichier, taille)
+    lecteur.attendre("{")
+    while lecteur.suivant() != "}":
+        collection = lecteur.valeur()
+        lecteur.attendre(":")
+        if lecteur.suivant() != "{":
+            lecteur.valeur()
+        else:
+            lecteur.attendre("{")
+            while lecteur.suivant() != "}":
+                clé = lecteur.valeur()
+                lecteur.attendre(":")
+                if clé != "pages" or lecteur.suivant() != "[":
+                    lecteur.valeur()
+                else:
+                    lecteur.attendre("[")
+                    while lecteur.suivant() != "]":
+                        yield collection, lecteur.valeur()
+                        lecteur.virgule()
+                    lecteur.attendre("]")
+                lecteur.virgule()
+            lecteur.attendre("}")
+        lecteur.virgule()
+
+
+def from_stream(src, taille: int = 1 << 20) -> Dict:
+    """Comme `from_file`, sans charger tout l'export. Renvoie le débit de la
+    lecture: octets, pages par collection, secondes, Mo/s et pages/s."""
+    chargées = set()  # les collections entièrement lues
+    en_attente: Dict[str, list] = {c: [] for c in chargements}
+    compte: Dict[str, int] = {}
+
+    def prête(collection: str) -> bool:
+        return all(c in chargées for c in dépendances.get(collection, []))
+
+    def terminer(collection: str):
+        chargées.add(collection)
+        for c in chargements:
+            if en_attente[c] and prête(c):
+                for page in en_attente[c]:
+                    chargements[c](page)
+                en_attente[c] = []
+
+    début = chrono.perf_counter()
+    with open(src, "r") as fichier:
+        précédente = None
+        for collection, page in pages(fichier, taille):
+            if collection != précédente and précédente is not None:
+                terminer(précédente)
+            précédente = collection
+            compte[collection] = compte.get(collection, 0) + 1
+            if collection not in chargements:
+                continue
+            if prête(collection):
+                chargements[collection](page)
+            else:
+                en_attente[collection].append(page)
+    for collection in chargements:
+        if collection not in chargées:
+            terminer(collection)
+    durée = chrono.perf_counter() - début
+    octets = os.path.getsize(src)
+    return {
+        "bytes": octets,
+        "pages": compte,
+        "seconds": durée,
+        "mb_per_second": octets / 1e6 / durée,
+        "pages_per_second": sum(compte.values()) / durée,
+    }
+
+
+def mesurer(src: str, chargeur) -> Dict:
+    """Charge [src] avec [chargeur] dans un processus à part, pour en mesurer
+    le pic de mémoire (ru_maxrss, en Ko sous Linux). Une erreur du chargeur
+    est relevée ici, le processus fils se termine quoi qu'il arrive."""
+    lecture, écriture = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.close(lecture)
+            début = chrono.perf_counter()
+            with utiliser(Registre()):
+                chargeur(src)
+            durée = chrono.perf_counter() - début
+            pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            réponse = {"seconds": durée, "peak_rss_mb": pic}
+            code = 0
+        except BaseException as e:
+            réponse = {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            # Ne jamais revenir dans le code de l'appelant, qui continuerait
+            # en double
+            try:
+                os.write(écriture, json.dumps(réponse).encode())
+            finally:
+                os._exit(code)
+    os.close(écriture)
+    with os.fdopen(lecture) as f:
+        contenu = f.read()
+    _, statut = os.waitpid(pid, 0)
+    if not contenu:
+        raise RuntimeError(f"mesure de {src} interrompue (statut {statut})")
+    réponse = json.loads(contenu)
+    if "error" in réponse:
+        raise RuntimeError(f"mesure de {src}: {réponse['error']}")
+    return réponse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import d'un export Notion")
+    parser.add_argument("fichier")
+    parser.add_argument(
+        "--comparer",
+        action="store_true",
+        help="compare le temps et le pic de mémoire de from_file et from_stream",
+    )
+    args = parser.parse_args()
+    if args.comparer:
+        taille = os.path.getsize(args.fichier) / 1e6
+        # Le pic de mémoire d'un processus qui n'a rien chargé
+        base = mesurer(args.fichier, lambda src: None)["peak_rss_mb"]
+        print(f"{args.fichier}: {taille:.1f} Mo, {base:.0f} Mo avant chargement")
+        for chargeur in (from_file, from_stream):
+            m = mesurer(args.fichier, chargeur)
+            print(
+                f"- {chargeur.__name__}: {m['seconds']:.2f}s, "
+                f"{taille / m['seconds']:.1f} Mo/s, pic {m['peak_rss_mb']:.0f} Mo"
+            )
+    else:
+        débit = from_stream(args.fichier)
+        print(
+            f"{sum(débit['pages'].values())} pages en {débit['seconds']:.2f}s: "
+            f"{débit['mb_per_second']:.1f} Mo/s, {débit['pages_per_second']:.0f} pages/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
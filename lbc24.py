@@ -1,10 +1,36 @@
 from __future__ import annotations  # allows class type usage in class decl
 from typing import List, Dict
 from datetime import date, time, datetime, timedelta
-from operator import contains
-import os, sys, math, random
+import os, sys, random
 from ortools.sat.python import cp_model
-from data_model import Bénévole, Type_de_quête, Quête, Spectacle, strengthen
+from data_model import Bénévole, Quête, Spectacle, strengthen, registre_courant
+from planning_model import (
+    Contexte,
+    construire,
+    temps_quotidien_bénévole,
+    temps_total_quêtes,
+)
+from eligibility import Éligibilité
+from feasibility import Analyse_de_capacité
+from explanation import expliquer, rapport as rapport_explication
+from diagnosis import Diagnostic, rapport as rapport_diagnostic
+from build_profile import Profil_de_construction
+from model_cache import Cache_de_modèles, empreinte
+from warm_start import ajouter_indices, charger_assignations, dernier_résultat
+from decomposition import résoudre_par_jour, rapport as rapport_décomposition
+from portfolio import (
+    écrire_modèle,
+    résoudre_en_portefeuille,
+    rapport as rapport_portefeuille,
+)
+from solution_callback import (
+    Cadence,
+    Rapporteur_de_solutions,
+    Vue_des_solutions,
+    Écrivain_de_solutions,
+    smile_of_appréciation,
+)
+from telemetry import Télémétrie, analyser_journal, écrire_statistiques
 from export_json_web import write_json
 import csv
 
@@ -26,66 +52,47 @@ def print(str="\n"):
 # open log file
 
 """ Data import """
+# Les exports CSV donnés par run.sh: lieux, types, bénévoles et quêtes
+if len(sys.argv) == 5:
+    from import_csv import charger
+
+    débit = charger(*sys.argv[1:])
+    print(
+        f"Import CSV: {sum(débit['rows'].values())} lignes en "
+        f"{débit['seconds']:.3f}s ({débit['rows_per_second']:.0f} lignes/s)"
+    )
 # from import_json import from_file
 
 # from_file("data/db.json")
 # from import_gapi import main
 
-# main()
+# main()  # main(hors_ligne=True) réutilise le dernier instantané des feuilles
 
 # Once all the data is loaded, resolve references:
 strengthen()
+registre = registre_courant()
 
 print("Liste des types quêtes:\n")
-for q in Type_de_quête.tous.values():
+for q in registre.types.values():
     print(q.détails())
 
 print("Liste des bénévoles:\n")
-for b in Bénévole.tous.values():
+for b in registre.bénévoles.values():
     print(b.détails())
     print()
 
 print("Liste des quêtes:\n")
-for q in Quête.toutes:
+for q in registre.quêtes:
     print(q.détails())
     print()
 
-quêtes = sorted(Quête.toutes)
-bénévoles = Bénévole.tous.values()
+index = registre.index
+quêtes = index.toutes
+bénévoles = registre.bénévoles.values()
 
 """ Outils """
 
 
-def member_f(l, f):
-    for e in l:
-        if f(e):
-            return True
-    return False
-
-
-def member(l, x):
-    for e in l:
-        if e == x:
-            return True
-    return False
-
-
-def quêtes_dun_lieu(lieu):
-    return filter(lambda q: q.lieu == lieu, quêtes)
-
-
-def quêtes_dun_type(t):
-    return filter(lambda q: member(q.types, t), quêtes)
-
-
-def time_to_minutes(t: time):
-    return t.hour * 60 + t.minute
-
-
-def diff_minutes(t1: time, t2: time):
-    return time_to_minutes(t2) - time_to_minutes(t1)
-
-
 def print_duration(minutes):
     return f"{int(minutes // 60):0=2d}h{int(minutes % 60):0=2d}"
 
@@ -104,577 +111,94 @@ def print_signed_duration(minutes):
 
 """Préparation du modèle et des contraintes"""
 
-model = cp_model.CpModel()
 enable_assumptions = False
-
-
-# Enable or disable assumptions.
-# This prevents the solver from running in parallel
-def add_assumption(var):
-    if enable_assumptions:
-        model.add_assumption(var)
-    else:
-        model.add(var == 1)
-
-
-""" On créé une variable par bénévole pour chaque "slot" de chaque quête."""
-assignations: Dict[(Bénévole, Quête), cp_model.BoolVarT] = {}
-""" Ainsi qu'un intervalle correspondant aux horaires de la quête en minutes """
-intervalles: Dict[(Bénévole, Quête), cp_model.IntervalVar] = {}
-
-for b in bénévoles:
-    for q in quêtes:
-        assignations[(b, q)] = model.new_bool_var(f"shift_b{b}_q{q}")
-        d: int = time_to_minutes(q.début.time())
-        f: int = time_to_minutes(q.fin.time())
-        if f < d:
-            # Fin après minuit
-            # Several days long tasks are not handled
-            f = 24 * 60 + f
-        intervalles[(b, q)] = model.new_optional_interval_var(
-            d, f - d, f, assignations[(b, q)], f"interval_quête_{b}_{q}"
-        )
-
-""" Tous les slots de toutes les quêtes doivent être peuplés """
-for q in quêtes:
-    model.add(
-        sum(assignations[(b, q)] for b in bénévoles) == q.nombre_bénévoles
-    ).with_name(f"tout_est_rempli_{b}_{q}")
-
-
-""" Un même bénévole ne peut pas remplir plusieurs quêtes en même temps """
-
-for q in quêtes:
-    en_même_temps = list(q.en_même_temps())
-    for q2 in en_même_temps:
-        for b in bénévoles:
-            if q != q2:
-                model.add_at_most_one(
-                    [assignations[(b, q)], assignations[(b, q2)]]
-                ).with_name(f"en_meme_temps_{b}_{q}_{q2}")
-
-""" Certaines quêtes sont déjà assignées """
-for q in quêtes:
-    for b in q.bénévoles:
-        model.add(assignations[(b, q)] == 1).with_name(f"fixé_{b}_{q}")
-
-""" Et certains bénévoles ne devrait rien faire d'autre """
-for d, quêtes_du_jour in Quête.par_jour.items():
-    for b in bénévoles:
-        if b.est_assigné(d):
-            for q in quêtes_du_jour:
-                if not (member(q.bénévoles, b)):
-                    model.add(assignations[(b, q)] == 0).with_name(
-                        f"assigné_peut_pas_faire_{b}_{q}"
-                    )
-
-""" On aimerait que tout le monde participe à certaines tâches """
-
-
-def tout_le_monde_fait(t: Type_de_quête):
-    for b in bénévoles:
-        assigné = True
-        for d in Quête.par_jour.keys():
-            assigné = assigné and b.est_assigné(d)
-        if not (assigné) and not (member(b.types_de_quête_interdits, t)):
-            # Todo there are more checks to do here such has place interdiction
-            # print(f"{b} fait du clean")
-            model.add_at_least_one(
-                assignations[(b, q)] for q in quêtes_dun_type(t)
-            ).with_name(f"un_seul_{b}_{t}")
-
-
-# tout_le_monde_fait(Type_de_quête.tous[id_tdg_suivi])
-
-
-""" On aimerait certaines tâches soient faites par un maximum de personnes différentes """
-
-
-def un_max_de_monde_fait(t: Type_de_quête):
-    for b in bénévoles:
-        assigné = True
-        for d in Quête.par_jour.keys():
-            assigné = assigné and b.est_assigné(d)
-        if not (assigné) and not (member(b.types_de_quête_interdits, t)):
-            # Todo there are more checks to do here such has place interdiction
-            model.add_at_most_one(
-                assignations[(b, q)] for q in quêtes_dun_type(t)
-            ).with_name(f"au_plus_un_{b}_{t}")
-
-
-un_max_de_monde_fait(Type_de_quête.tous["4"])
-# TODO make it configurable
-
-""" Un même bénévole ne fait pas plusieurs fois le suivi du même spectacle """
-
-# quêtes_suivi_des_spectacles: Dict[str, List[Quête]] = {}
-# for q in quêtes:
-#     if member_f(q.types, lambda t: t.id == id_tdg_suivi):
-#         quêtes_spe = quêtes_suivi_des_spectacles.get(q.spectacle.id, [])
-#         if quêtes_spe == []:
-#             quêtes_suivi_des_spectacles[q.spectacle.id] = [q]
-#         else:
-#             quêtes_spe.append(q)
-
-# for b in bénévoles:
-#     for quêtes_spe in quêtes_suivi_des_spectacles.values():
-#         model.add_at_most_one(assignations[(b, q)] for q in quêtes_spe).with_name(
-#             f"no_double_show_{b}_{quêtes_spe[0]}"
-#         )
-
-""" Les tâches consécutives d'une scène sont faites par les mêmes bénévoles """
-
-# quêtes_liées_des_spectacles: List[List[Quête]] = []
-# for date, quêtes_du_jour in Quête.par_jour.items():
-#     quêtes_des_spectacles: Dict[str, List[Quête]] = {}
-#     for q in quêtes_du_jour:
-#         if q.spectacle and not (member_f(q.types, lambda t: t.id == id_tdq_gradinage)):
-#             quêtes_du_spectacle = quêtes_des_spectacles.get(q.spectacle.id, [])
-#             if quêtes_du_spectacle == []:
-#                 quêtes_des_spectacles[q.spectacle.id] = [q]
-#             else:
-#                 quêtes_du_spectacle.append(q)
-#     for l in quêtes_des_spectacles.values():
-#         quêtes_liées_des_spectacles.append(l)
-
-
-# def suivi_quêtes_dun_spectacles(quêtes: List[Quête]):
-#     min_nb = 99
-#     min_quête = None
-#     for q in quêtes:
-#         if q.nombre_bénévoles < min_nb:
-#             min_nb = q.nombre_bénévoles
-#             min_quête = q
-
-#     # On s'assure que les quêtes groupées ne se chevauchent pas, cela évite des
-#     # erreurs incompréhensibles:
-#     for q in quêtes:
-#         for q2 in q.en_même_temps():
-#             for q3 in quêtes:
-#                 if q != q3 and q2 == q3:
-#                     print("Arg, des quêtes groupées se chevauchent:")
-#                     print(f"{q} chevauche {q3}")
-#                     exit()
-
-#     for b in bénévoles:
-#         # Tout bénévole participant à la quête qui requiert le moins de bénévoles
-#         # dans le groupe de quêtes doit participer aux autres quêtes du groupe.
-#         model.add_bool_and(assignations[(b, q)] for q in quêtes).only_enforce_if(
-#             assignations[(b, min_quête)]
-#         ).with_name(f"suivi_{b}_{quêtes[0]}")
-
-
-# for quêtes_dun_spectacle in quêtes_liées_des_spectacles:
-#     suivi_quêtes_dun_spectacles(quêtes_dun_spectacle)
-
-""" Certains bénévoles ne sont pas là pendant la totalité de l'évènement """
-for b in bénévoles:
-    for q in quêtes:
-        if b.date_arrivée:
-            # On vérifie que ce n'est pas une quête forcée:
-            if not (contains(q.bénévoles, b)):
-                if q.début < b.date_arrivée:
-                    explain_var = model.new_bool_var(f"{b} pas encore arrivé pour {q}")
-                    add_assumption(explain_var)
-                    model.add(assignations[(b, q)] == 0).with_name(
-                        f"before_arrival_{b}_{q}"
-                    ).only_enforce_if(explain_var)
-        if b.date_départ:
-            # On vérifie que ce n'est pas une quête forcée:
-            if not (contains(q.bénévoles, b)):
-                if q.fin > b.date_départ:
-                    explain_var = model.new_bool_var(f"{b} déjà parti pour {q}")
-                    add_assumption(explain_var)
-                    model.add(assignations[(b, q)] == 0).with_name(
-                        f"after_leave_{b}_{q}"
-                    ).only_enforce_if(explain_var)
-
-""" Certains bénévoles sont indisponibles à certains horaires """
-for b in bénévoles:
-    for date, quêtes_du_jour in Quête.par_jour.items():
-        for q in quêtes_du_jour:
-            # On vérifie que ce n'est pas une quête forcée:
-            if not (contains(q.bénévoles, b)):
-                for début_indispo in b.indisponibilités:
-                    # On compare des datetime pour éviter les erreurs bêtes:
-                    début_indispo = datetime.combine(
-                        date, début_indispo, q.début.tzinfo
-                    )
-                    if début_indispo.hour < 5:  # TODO: check ? configurable ?
-                        début_indispo += timedelta(days=1)
-                    fin_indispo = début_indispo + timedelta(hours=1)
-
-                    if not (fin_indispo <= q.début or début_indispo >= q.fin):
-                        explain_var = model.new_bool_var(f"{b} indisponible pour {q})")
-                        add_assumption(explain_var)
-                        model.add(assignations[(b, q)] == 0).with_name(
-                            f"indispo_{b}_{q}"
-                        ).only_enforce_if(explain_var)
-                        break
-
-""" Certaines quêtes sont réservées aux spécialistes """
-for q in quêtes:
-    spécialités_requises = set(filter(lambda tdq: tdq.spécialiste_only, q.types))
-    for b in bénévoles:
-        if not (spécialités_requises.issubset(b.spécialités)):
-            explain_var = model.new_bool_var(
-                f"{b} ne peut pas assumer {q} (un(e) spécialiste est requis)"
-            )
-            add_assumption(explain_var)
-            model.add(assignations[(b, q)] == 0).with_name(
-                f"pas_spécialiste_{b}_{q}"
-            ).only_enforce_if(explain_var)
-
-
-""" Les lieux interdits sont interdits """
-for b in bénévoles:
-    for lieu in b.lieux_interdits:
-        for q in quêtes_dun_lieu(lieu):
-            explain_var = model.new_bool_var(
-                f"{b} ne peut pas assumer {q} (lieu interdit: {lieu})"
-            )
-            add_assumption(explain_var)
-            model.add(assignations[(b, q)] == 0).with_name(
-                f"lieu_interdit_{b}_{q}"
-            ).only_enforce_if(explain_var)
-
-""" Les quêtes interdites sont interdites """
-for b in bénévoles:
-    for t in b.types_de_quête_interdits:
-        for q in quêtes_dun_type(t):
-            # On vérifie que ce n'est pas une quête forcée:
-            if not (contains(q.bénévoles, b)):
-                explain_var = model.new_bool_var(
-                    f"{b} ne peut pas assumer {q} (type de quête interdit: {t})"
-                )
-                add_assumption(explain_var)
-                model.add(assignations[(b, q)] == 0).with_name(
-                    f"tdq_interdit_{b}_{q}"
-                ).only_enforce_if(explain_var)
-
-
-""" Ils se détestent, séparez-les ! """
-inimitiés: Dict[Bénévole, set[Bénévole]] = {}
-for b in bénévoles:
-    inimitiés[b] = set(b.binômes_interdits)
-    for e in b.binômes_interdits:
-        if b not in inimitiés.get(e, set()):
-            for q in quêtes:
-                explain_var = model.new_bool_var(
-                    f"{b} ne peut pas travailler avec {e} lors de {q}"
-                )
-                add_assumption(explain_var)
-                model.add(assignations[(b, q)] + assignations[(e, q)] <= 1).with_name(
-                    f"blaire_pas_{b}_{e}_{q}"
-                ).only_enforce_if(explain_var)
-
-
-""" [pause] s'assure que le bénévole [b], chaque jour, a une pause de durée [durée]
-    entre l'heure [début] et l'heure [fin].
-    Début et fin ne doivent pas être séparés de plus de 24h """
-
-
-def pause(nom, début, fin, durée: timedelta, b: Bénévole):
-    début_m = time_to_minutes(début)
-    fin_m = time_to_minutes(fin)
-    durée_m = round(durée.total_seconds() / 60)
-
-    if fin_m < début_m:
-        # Fin après minuit
-        fin_m = 24 * 60 + fin_m
-
-    for date, quêtes in Quête.par_jour.items():
-        id = f"{nom}_{b}_{date}"
-        début_pause = model.new_int_var(
-            début_m,
-            fin_m - durée_m,
-            f"début_pause_{id}",
-        )
-        fin_pause = model.new_int_var(
-            début_m + durée_m,
-            fin_m,
-            f"fin_pause_{id}",
-        )
-        size = model.new_int_var(durée_m, 24 * 60, f"size_pause_{id}")
-        interval_pause = model.new_interval_var(
-            début_pause,
-            size,
-            fin_pause,
-            f"interval_pause_{id}",
-        )
-        explain_var = model.new_bool_var(
-            f"{b} doit avoir une pause {nom} de {durée_m / 60}h le {date}"
-        )
-        add_assumption(explain_var)
-
-        # La pause est suffisamment longue:
-        model.add(size >= durée_m).with_name(
-            f"pause_{nom}_{size}_>=_{durée_m}"
-        ).only_enforce_if(explain_var)
-
-        # Le bénévole n'a aucune quête pendant sa pause:
-        overlaps = [interval_pause]
-        for q in quêtes:
-            overlaps.append(intervalles[(b, q)])
-
-        model.add_no_overlap(overlaps).with_name(
-            f"noverlap_pause_{id}"
-        )  # "only_enforce_if" doesn't work with that constraint
-
-
-""" Les bénévoles ont du temps libre pendant les repas de midi et du soir. """
-début_service_midi = time(hour=11, minute=30)
-fin_service_midi = time(hour=14, minute=30)
-
-début_service_soir = time(hour=17, minute=30)
-fin_service_soir = time(hour=20)
-
-durée_repas = timedelta(minutes=30)
-
-for b in bénévoles:
-    pause("midi", début_service_midi, fin_service_midi, durée_repas, b)
-    pause("soir", début_service_soir, fin_service_soir, durée_repas, b)
-
-
-""" Chacun a un trou dans son emploi du temps """
-début_période_pause = time(hour=9)
-fin_période_pause = time(hour=23)
-durée_pause_min = timedelta(hours=5)
-
-# for b in bénévoles:
-#    pause("pause", début_période_pause, fin_période_pause, durée_pause_min, b)
-
-
-""" Calcul de la qualité d'une réponse """
-
-""" Contrôle du temps de travail """
-
-
-def temps_total_quêtes(quêtes: List[Quête]):
-    return sum(q.durée_minutes() * q.nombre_bénévoles for q in quêtes)
-
-
-# Temps de travail d'un bénévole sur un ensemble de quêtes
-def temps_bev(b, quêtes, assignations):
-    # assignations[(b, q)] pour un bénévole b et une quête q vaut 0 ou 1 et
-    # indique si le bénévole a été assigné à cette quête.
-    return sum(q.durée_minutes() * assignations[(b, q)] for q in quêtes)
-
-
-# Temps de travail, par jour, d'un bénévole
-def temps_quotidien_bénévole(b, assignations):
-    # On renvoie un dictionnaire date -> temps de travail
-    return {
-        date: temps_bev(b, quêtes, assignations)
-        for date, quêtes in Quête.par_jour.items()
-    }
-
-
-def temps_travail_théorique(date, b: Bénévole):
-    if (not (b.date_arrivée) or date >= b.date_arrivée.date()) and (
-        not (b.date_départ) or date <= b.date_départ.date()  # TODO ça dépend de l'heure
-    ):
-        # On pourrait vouloir être plus fin ici et faire un pro rata ou autre
-        # pour les journées incomplètes
-        return b.heures_théoriques * 60
+# Vérifie avant de construire le modèle que le planning n'est pas évidemment
+# impossible, et s'arrête sinon (sauf pour l'expliquer avec enable_assumptions),
+# voir feasibility.py
+analyse_de_capacité = True
+# Mesure la construction de chaque famille de contraintes, voir build_profile.py
+profilage_construction = True
+# Recharge le modèle s'il a déjà été construit avec les mêmes données, le même
+# code et les mêmes paramètres, voir model_cache.py
+cache_des_modèles = True
+# Exporte directement la meilleure solution déjà trouvée dans ces conditions
+réutiliser_solution = False
+# Part des assignations d'une exécution précédente, voir warm_start.py. Sans
+# fichier donné, le results.json le plus récent de runs/ est utilisé.
+démarrage_à_chaud = False
+résultats_précédents = None
+# Résout chaque jour séparément et en parallèle, puis polit le planning complet
+# pendant temps_de_polissage secondes, voir decomposition.py
+décomposition_par_jour = False
+temps_par_jour = 60.0
+temps_de_polissage = 30.0
+# Nombre de solveurs indépendants lancés en parallèle avec des graines et des
+# paramètres différents (0 pour un seul solveur), voir portfolio.py
+portefeuille = 0
+# Écrit le modèle construit dans le dossier du run, pour tuning.py
+exporter_modèle = False
+# Cherche les familles de contraintes en conflit dans des processus à part, voir
+# diagnosis.py: "pendant" la résolution, "après" une absence de solution, ou None
+diagnostic_des_conflits = "après"
+
+# Les paramètres du solveur font partie de l'empreinte du cache
+solver = cp_model.CpSolver()
+solver.parameters.log_search_progress = True
+solver.parameters.num_workers = 10
+solver.parameters.log_to_stdout = False
+if décomposition_par_jour:
+    solver.parameters.max_time_in_seconds = temps_de_polissage
+
+éligibilité = None
+if analyse_de_capacité:
+    éligibilité = Éligibilité(bénévoles, index)
+    analyse = Analyse_de_capacité(bénévoles, index, éligibilité)
+    print(analyse.rapport())
+    analyse.écrire(f"{log_folder}/capacity.json")
+    if analyse.impossible and not enable_assumptions:
+        print("Planning impossible, voir enable_assumptions pour plus de détails")
+        exit()
+
+ctx = Contexte(bénévoles, index, enable_assumptions, éligibilité)
+cache = Cache_de_modèles()
+clé = empreinte(ctx, solver.parameters)
+if cache_des_modèles and cache.charger_modèle(clé, ctx):
+    print(f"Modèle {clé[:12]} chargé depuis le cache")
+else:
+    profil = Profil_de_construction(ctx.model, mémoire=profilage_construction)
+    with profil:
+        construire(ctx, profil)
+    profil.écrire(f"{log_folder}/build_profile.json")
+    if cache_des_modèles:
+        cache.enregistrer_modèle(clé, ctx)
+
+    print(ctx.éligibilité.rapport())
+    for rapport in ctx.rapports:
+        print(rapport)
+    print(profil.résumé())
+
+if exporter_modèle:
+    écrire_modèle(ctx.model, f"{log_folder}/model.pb.txt.gz")
+
+# Les indices ne font pas partie du modèle en cache
+if démarrage_à_chaud:
+    if résultats_précédents is None:
+        résultats_précédents = dernier_résultat(sauf=log_folder)
+    if résultats_précédents is None:
+        print("Démarrage à chaud: aucun résultat précédent")
     else:
-        return 0
-
-
-def temps_travail_théorique_total(bénévoles, date):
-    return sum(temps_travail_théorique(date, b) for b in bénévoles)
-
-
-def fraction_temps_travail_théorique(bénévoles, date, b):
-    return temps_travail_théorique(date, b) / temps_travail_théorique_total(
-        bénévoles, date
-    )
-
-
-def temps_de_travail_requis(date):
-    return sum(q.durée_minutes() * q.nombre_bénévoles for q in Quête.par_jour.get(date))
-
-
-def temps_travail_ajusté(bénévoles, date, b):
-    return fraction_temps_travail_théorique(
-        bénévoles, date, b
-    ) * temps_de_travail_requis(date)
-
-
-def temps_ajusté_quotidien_bénévole(bénévoles, b):
-    # On renvoie un dictionnaire date -> temps de travail
-    return {
-        date: (int)(round(temps_travail_ajusté(bénévoles, date, b)))
-        for date, _quêtes in Quête.par_jour.items()
-    }
-
-
-temps_quotidiens_ajustés: Dict[Bénévole, Dict[date, int]] = {
-    b: temps_ajusté_quotidien_bénévole(bénévoles, b) for b in bénévoles
-}
-
-
-# Écart de l'écart du temps de travail d'un bénévole par rapport à la moyenne
-# Renvoie un dictionnaire indexé par les jours
-def diff_temps(b, assignations):
-    return {
-        date: (tdt - (temps_quotidiens_ajustés.get(b).get(date)))
-        for date, tdt in temps_quotidien_bénévole(b, assignations).items()
-    }
-
-
-""" Équilibrage du temps de travail """
-
-max_tdt = 60 * max([b.heures_théoriques for b in Bénévole.tous.values()])
-
-
-def borne_un_jour(bénévoles, jour):
-    borne_inf_jour = model.new_int_var(
-        -2 * max_tdt, 2 * max_tdt, f"borne_inf_des_diffs_jour_{jour}"
-    )
-    borne_sup_jour = model.new_int_var(
-        -2 * max_tdt, 2 * max_tdt, f"borne_sup_des_diffs_jour_{jour}"
-    )
-
-    # Somme des différences pour chaque bénévole ce jour
-    for b in bénévoles:
-        diff_du_jour = diff_temps(b, assignations).get(jour)
-        model.add(diff_du_jour <= borne_sup_jour).with_name(f"sup_{b}_{jour}")
-        model.add(diff_du_jour >= borne_inf_jour).with_name(f"inf_{b}_{jour}")
-
-    return borne_sup_jour - borne_inf_jour
-
-
-# \text{minimise}\left( \sum_{j \in \mathcal{J}}^{}\left(\sup_{b\in\mathcal{B}} \text{ecart(b, j)}-\inf_{b\in\mathcal{B}} \text{ecart(b, j)}\right)\right)
-def bornage_des_excès(bénévoles):
-    return sum(borne_un_jour(bénévoles, jour) for jour in Quête.par_jour.keys())
-
-
-def bornage_des_excès_sur_la_semaine(bénévoles):
-    """The goal is to minimize work excess differences on the whole event by allowing some day-to-day differences below the threshold."""
-    max_tdt = 60 * max([b.heures_théoriques for b in Bénévole.tous.values()])
-    borne_inf = model.new_int_var(-2 * max_tdt, 2 * max_tdt, "borne_inf_des_diffs")
-    borne_sup = model.new_int_var(-2 * max_tdt, 2 * max_tdt, "borne_sup_des_diffs")
-    for b in bénévoles:
-        diff_par_jour = diff_temps(b, assignations)
-        diff = sum(diff for _, diff in diff_par_jour.items())
-        model.add(diff <= borne_sup).with_name(f"sup_{b}")
-        model.add(diff >= borne_inf).with_name(f"inf_{b}")
-    return borne_sup - borne_inf
-
-
-""" Pondération des préférences des bénévoles """
-
-
-def appréciation_dune_quête(bénévole: Bénévole, quête: Quête):
-    # On découpe la quête par blocs de 15 minutes
-    acc = quête.début
-    somme_prefs = 0
-    while acc < quête.fin:
-        time = acc.time()
-        for pref_t, p in bénévole.pref_horaires.items():
-            if time.hour == pref_t.hour:
-                somme_prefs += p
-                break
-        acc = min(acc + timedelta(minutes=15), quête.fin)
-    return somme_prefs
-
-
-def appréciation_du_planning(bénévole: Bénévole, quêtes: List[Quête]):
-    return sum(
-        assignations[(bénévole, q)] * (appréciation_dune_quête(bénévole, q))
-        for q in quêtes
-    )
-
-
-# This might not always be satisfiable
-# for b in bénévoles:
-#     for q in quêtes:
-#         model.add(appréciation_dune_quête(b, q) >= 0).with_name(f"appréciation_{b}_{q}")
-
-""" Mon pote """
-
-
-max_bénévoles_par_quête = max(
-    Quête.toutes, key=(lambda q: q.nombre_bénévoles)
-).nombre_bénévoles
-
-
-def bonus_amis_par_bénévole(q: Quête, b: Bénévole, amitiés):
-    amitiés[b] = set(b.binômes_préférés)
-    amis_non_considérés = list(
-        filter(lambda ami: b not in amitiés.get(ami, set()), b.binômes_préférés)
-    )
-    var = model.new_int_var(0, max_bénévoles_par_quête, f"amis_de_{b}_font_{q}")
-    model.add_max_equality(
-        var, [0, sum(assignations[(b, q)] for b in amis_non_considérés) - 1]
-    )
-    return var
-
-
-def bonus_amis_par_quête(q: Quête, bénévoles):
-    amitiés: Dict[Bénévole, set[Bénévole]] = {}
-    return sum(bonus_amis_par_bénévole(q, b, amitiés) for b in bénévoles)
-
-
-def bonus_amis(bénévoles, quêtes):
-    return sum(bonus_amis_par_quête(q, bénévoles) for q in quêtes)
-
-
-""" Distance entre la première et la dernière quête """
-
-
-def amplitude_horaire(b: Bénévole, quêtes: List[Quête]):
-    # The end upper bound is more than 24h because that's how we handle quests
-    # that end after midnight.
-    début = model.new_int_var(0, 60 * 24, f"début_journée_{b}")
-    fin = model.new_int_var(0, 2 * 60 * 24, f"fin_journée_{b}")
-    model.add_min_equality(
-        début, map(lambda q: intervalles[(b, q)].start_expr(), quêtes)
-    ).with_name(f"amp_min_{b}")
-    model.add_max_equality(
-        fin, map(lambda q: intervalles[(b, q)].end_expr(), quêtes)
-    ).with_name(f"amp_max_{b}")
-    return fin - début
+        print(f"Démarrage à chaud depuis {résultats_précédents}")
+        indices = ajouter_indices(ctx, charger_assignations(résultats_précédents))
+        print(indices.rapport())
 
-
-def amplitudes(b: Bénévole):
-    return sum(
-        amplitude_horaire(b, quêtes) - (b.heures_théoriques * 60)
-        for quêtes in Quête.par_jour.values()
-    )
-
-
-""" Formule finale """
-
-if not enable_assumptions:
-    # Minimizing is not compatible with assumptions
-    model.minimize(
-        10
-        * (
-            2 * bornage_des_excès(bénévoles)
-            + bornage_des_excès_sur_la_semaine(bénévoles)
-        )
-        + sum(amplitudes(b) for b in bénévoles)
-        + bonus_amis(bénévoles, quêtes)
-        - sum(appréciation_du_planning(b, quêtes) for b in bénévoles)
-    )
+model = ctx.model
+assignations = ctx.assignations
+temps_quotidiens_ajustés = ctx.temps_quotidiens_ajustés
 
 
 """ Solution printer """
 
 
-def smile_of_appréciation(app):
-    smile = "🙂"
-    if app >= 1:
-        smile = "🤗"
-    if app < 0:
-        smile = "😰"
-    if app < -1:
-        smile = "😭"
-    return smile
-
-
 def dumb_dump(file, assignations):
     with open(file, "w") as text_file:
         max_diff = 0
@@ -682,10 +206,10 @@ def dumb_dump(file, assignations):
         total_diff = 0
         all = []
         for b in bénévoles:
-            tdt = sum(temps_quotidien_bénévole(b, assignations).values())
+            tdt = sum(temps_quotidien_bénévole(index, b, assignations).values())
             tdt_ajusté = sum(temps_quotidiens_ajustés.get(b).values())
             tdt_théorique = sum(
-                temps_travail_théorique(d, b) for d in Quête.par_jour.keys()
+                ctx.temps_de_travail.théorique(b, d) for d in index.par_jour.keys()
             )
             diff = tdt - tdt_ajusté
             diff_théorie = tdt - tdt_théorique
@@ -695,7 +219,7 @@ def dumb_dump(file, assignations):
                 max_diff_abs = abs(diff)
 
             jours_tdt = ""
-            for d, tdt_ in temps_quotidien_bénévole(b, assignations).items():
+            for d, tdt_ in temps_quotidien_bénévole(index, b, assignations).items():
                 diff_ = tdt_ - temps_quotidiens_ajustés.get(b).get(d)
                 if jours_tdt == "":
                     jours_tdt = f"{jours_tdt} {print_duration(tdt_)}({print_signed_duration(diff_)})"
@@ -715,108 +239,131 @@ def dumb_dump(file, assignations):
             text_file.write(f"{l["s"]}")
 
 
-class VarArraySolutionPrinter(cp_model.CpSolverSolutionCallback):
-    """Print intermediate solutions."""
-
-    def __init__(self, assignations):
-        cp_model.CpSolverSolutionCallback.__init__(self)
-        self._assignations = assignations
-        self._solution_count = 0
-
-    def on_solution_callback(self) -> None:
-        self._solution_count += 1
-
-        assignations_val = {
-            key: self.value(val) for key, val in self._assignations.items()
-        }
-
-        smiles = {}
-        for q in quêtes:
-            for b in bénévoles:
-                if assignations_val[(b, q)] == 1:
-                    app = appréciation_dune_quête(b, q)
-                    smile = smile_of_appréciation(app)
-                    smile_count = smiles.get(smile, 0)
-                    smiles[smile] = smile_count + 1
-        total_smiles = sum(smiles.values())
-        smile_kinds = sorted(smiles.keys())
-        # x / total_smile = y / 10
-        smile_line = ""
-        for smile in smile_kinds:
-            n = smiles[smile]
-            n100 = (n * 100) / total_smiles
-            smile_line = f"{smile_line}[{smile}{n100:=04.1f}%]"
-        smile_line = f"{smile_line}"
-
-        écarts_line = "["
-        écarts = {}
-        nombre_bénévoles = len(bénévoles)
-        for b in bénévoles:
-            diff_par_jour_ = diff_temps(b, assignations_val)
-            for d, écart in diff_par_jour_.items():
-                (min_, somme, max_) = écarts.get(d, (0, 0, 0))
-                écarts[d] = (
-                    min(min_, écart),
-                    (somme + abs(écart)),
-                    max(max_, écart),
-                )
-
-        for _, (min_, écart_total, max_) in écarts.items():
-            écart_type = math.sqrt(écart_total / nombre_bénévoles)
-            écarts_line = f"{écarts_line} {écart_type:=.1f} [{min_};{max_}]"
-        écarts_line = f"{écarts_line}]"
-
-        if not os.path.exists(f"{log_folder}/solutions/{self._solution_count:0=3d}"):
-            os.makedirs(f"{log_folder}/solutions/{self._solution_count:0=3d}")
-
-        print(f"Solution {self._solution_count:0=3d}:\n\t{écarts_line}\n\t{smile_line}")
-        dumb_dump(
-            f"{log_folder}/solutions/{self._solution_count:0=3d}/results.md",
-            assignations_val,
-        )
+# Au plus un rapport complet toutes les 10 secondes, ou à chaque amélioration
+# de 5% de l'objectif, voir solution_callback.py
+cadence_des_rapports = Cadence(intervalle=10.0, amélioration=0.05)
+# L'objectif, la borne et l'écart sont notés dans telemetry.jsonl à chaque
+# solution et toutes les période_télémétrie secondes, voir telemetry.py
+période_télémétrie = 5.0
 
-        result: Dict[Quête, List[Bénévole]] = {}
-        for q in quêtes:
-            participants = []
-            for b in bénévoles:
-                if assignations_val[(b, q)]:
-                    participants.append(b)
-            result[q] = participants
-        write_json(
-            result, file=f"{log_folder}/solutions/{self._solution_count:0=3d}/results"
-        )
 
-    @property
-    def solution_count(self) -> int:
-        return self.__solution_count
+def rapporter_solution(numéro, valeurs):
+    dossier = f"{log_folder}/solutions/{numéro:0=3d}"
+    os.makedirs(dossier, exist_ok=True)
 
+    print(
+        f"Solution {numéro:0=3d}:\n\t{vue.ligne_des_écarts(valeurs)}\n\t{vue.ligne_des_smiles(valeurs)}"
+    )
+    dumb_dump(f"{dossier}/results.md", vue.assignations(valeurs))
+    write_json(vue.participants(valeurs), file=f"{dossier}/results")
 
-# Enumerate all solutions.
-solver = cp_model.CpSolver()
-solution_printer = VarArraySolutionPrinter(assignations)
-solver.parameters.log_search_progress = True
-solver.parameters.num_workers = 10
-solver.parameters.log_to_stdout = False
 
-with open(f"{log_folder}/cp_sat_log.txt", "w") as text_file:
-    solver.log_callback = lambda str: text_file.write(f"{str}\n")
-    status = solver.solve(model, solution_printer)
+solution = None
+diagnostic = None
+# Les statistiques et les explications viennent du solveur s'il a été utilisé
+solveur_utilisé = False
+if cache_des_modèles and réutiliser_solution:
+    solution = cache.charger_solution(clé, ctx)
+
+if solution is not None:
+    print(f"Solution {clé[:12]} reprise depuis le cache")
+    status, objective_value, assignations_values = solution
+else:
+    # Les processus du diagnostic sont créés avant les threads du solveur
+    if diagnostic_des_conflits == "pendant" and not enable_assumptions:
+        diagnostic = Diagnostic(solver.parameters)
+        diagnostic.démarrer()
+
+    if décomposition_par_jour:
+        assemblées, résultats_des_jours = résoudre_par_jour(
+            ctx, solver.parameters, temps_par_jour, log_folder
+        )
+        print(rapport_décomposition(résultats_des_jours))
+        # Le planning assemblé remplace les indices d'un démarrage à chaud
+        model.clear_hints()
+        print(ajouter_indices(ctx, assemblées).rapport())
+
+    if portefeuille > 0:
+        meilleur, résultats_du_portefeuille = résoudre_en_portefeuille(
+            model, solver.parameters, portefeuille, log_folder
+        )
+        print(rapport_portefeuille(meilleur, résultats_du_portefeuille))
+        # Faute de solution, on garde le statut du premier solveur
+        if meilleur is None:
+            meilleur = résultats_du_portefeuille[0]
+        status = getattr(cp_model, meilleur["status"])
+    else:
+        # Enumerate all solutions.
+        vue = Vue_des_solutions(ctx)
+        # Les fichiers des solutions sont écrits en arrière-plan, la dernière
+        # solution l'est forcément avant les exports
+        with (
+            Écrivain_de_solutions(rapporter_solution) as écrivain,
+            Télémétrie(
+                f"{log_folder}/telemetry.jsonl", période_télémétrie
+            ) as télémétrie,
+        ):
+            solution_printer = Rapporteur_de_solutions(
+                vue, écrivain.déposer, cadence_des_rapports, télémétrie
+            )
+            with open(f"{log_folder}/cp_sat_log.txt", "w") as text_file:
+
+                def journal(ligne):
+                    text_file.write(f"{ligne}\n")
+                    télémétrie.ligne_du_journal(ligne)
+
+                solver.log_callback = journal
+                status = solver.solve(model, solution_printer)
+            solution_printer.finir()
+        print(solution_printer.résumé())
+        print(écrivain.résumé())
+        statistiques = analyser_journal(télémétrie.lignes_du_journal)
+        écrire_statistiques(statistiques, f"{log_folder}/solver_stats.json")
+        print(télémétrie.résumé(statistiques))
+        solveur_utilisé = True
+
+    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+        if portefeuille > 0:
+            objective_value = meilleur["objective"]
+            assignations_values = {
+                k: meilleur["solution"][v.index] for k, v in assignations.items()
+            }
+        else:
+            objective_value = solver.objective_value
+            assignations_values = {k: solver.value(v) for k, v in assignations.items()}
+        if cache_des_modèles:
+            cache.enregistrer_solution(
+                clé, ctx, status.name, objective_value, assignations_values
+            )
 
 
 # Best solution:
 if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+    if diagnostic is not None:
+        diagnostic.arrêter()
     if status == cp_model.OPTIMAL:
         print("Optimal solution:")
     else:
         print("Non-optimal solution:")
 
     """ Dumb result dump"""
-    assignations_values = {k: solver.value(v) for k, v in assignations.items()}
     dumb_dump(f"{log_folder}/results.md", assignations_values)
 
     print(
-        f"Objective value = {solver.objective_value}",
+        f"Objective value = {objective_value}",
     )
+elif status != cp_model.INFEASIBLE:
+    # Sans preuve d'infaisabilité, il n'y a ni hypothèses en cause à lire ni
+    # conflit à diagnostiquer
+    if diagnostic is not None:
+        diagnostic.arrêter()
+    if status == cp_model.UNKNOWN:
+        print(
+            "Aucune solution trouvée dans le temps imparti: le modèle n'est pas "
+            "prouvé infaisable, il faut plus de temps"
+        )
+    else:
+        print(f"Aucune solution trouvée: {status.name}")
 else:
     print("Aucune solution trouvée. Raisons possibles:")
     # https://github.com/google/or-tools/issues/973#issuecomment-718220753
@@ -825,26 +372,49 @@ else:
     # détestent, séparez-les !" constraint.
     # Aucune solution trouvée. Raisons possibles:
     # Ulysse ne peut pas travailler avec La punaise
-    for index in solver.sufficient_assumptions_for_infeasibility():
-        print(f"- {model.proto.variables[index].name}")
+    # Les hypothèses sont regroupées par raison, les raisons en cause sont
+    # ensuite détaillées par bénévole puis contrainte par contrainte, voir
+    # explanation.py
+    if solveur_utilisé and enable_assumptions:
+        raisons = [
+            model.proto.variables[i].name
+            for i in solver.sufficient_assumptions_for_infeasibility()
+        ]
+        for raison in raisons:
+            print(f"- {raison}")
+        if raisons == []:
+            print("- aucune hypothèse nécessaire, les contraintes imposées suffisent")
+        else:
+            étapes = expliquer(
+                bénévoles, index, solver.parameters, ctx.éligibilité, raisons
+            )
+            print(rapport_explication(étapes))
+
+    # Le solveur a rendu la main et ses threads sont terminés: le diagnostic
+    # "après" peut créer ses processus
+    if diagnostic_des_conflits is not None and not enable_assumptions:
+        if diagnostic is None:
+            diagnostic = Diagnostic(solver.parameters)
+            diagnostic.démarrer()
+        print(rapport_diagnostic(diagnostic.attendre()))
 
 
 """ Quelques données sur les quêtes """
 
 
 def total_temps_dispo_par_jour(date, bénévoles):
-    return temps_travail_théorique_total(bénévoles, date)
+    return ctx.temps_de_travail.théorique_total(date)
 
 
 def total_temps_dispo(bénévoles):
-    return sum(total_temps_dispo_par_jour(d, bénévoles) for d in Quête.par_jour.keys())
+    return sum(total_temps_dispo_par_jour(d, bénévoles) for d in index.par_jour.keys())
 
 
 temps_total = temps_total_quêtes(quêtes)
 temps_dispo = total_temps_dispo(bénévoles)
 print()
 
-for d, qs in Quête.par_jour.items():
+for d, qs in index.par_jour.items():
     temps = temps_total_quêtes(qs)
     dispo = total_temps_dispo_par_jour(d, bénévoles)
     print(
@@ -855,20 +425,21 @@ print(
 )
 
 # Statistics.
-print("\nStatistics")
-print(f"- conflicts: {solver.num_conflicts}")
-print(f"- branches : {solver.num_branches}")
-print(f"- wall time: {solver.wall_time}s")
+if solveur_utilisé:
+    print("\nStatistics")
+    print(f"- conflicts: {solver.num_conflicts}")
+    print(f"- branches : {solver.num_branches}")
+    print(f"- wall time: {solver.wall_time}s")
 
 
-if status == cp_model.INFEASIBLE:
+if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
     exit()
 
 result: Dict[Quête, List[Bénévole]] = {}
 for q in quêtes:
     participants = []
     for b in bénévoles:
-        if solver.value(assignations[(b, q)]):
+        if assignations_values.get((b, q), 0):
             participants.append(b)
     result[q] = participants
 
@@ -913,8 +484,8 @@ cal.add("version", "2.0")
 for q in quêtes:
     result = ""
     for b in bénévoles:
-        if solver.value(assignations[(b, q)]) == 1:
-            app = appréciation_dune_quête(b, q)
+        if assignations_values.get((b, q), 0) == 1:
+            app = ctx.appréciations.de(b, q)
             smile = smile_of_appréciation(app)
             if result == "":
                 result = f"{b} {smile}"
@@ -0,0 +1,200 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Optional
+import gzip, hashlib, json, os, shutil
+import ortools
+from ortools.sat.python import cp_model
+import data_model, eligibility, planning_model, workload, appreciation, symmetry
+
+""" Cache des modèles construits et des solutions
+
+Les entrées sont rangées dans un dossier par empreinte: un hachage des données
+chargées, des poids de l'objectif, des paramètres du solveur et du code qui
+construit le modèle. Tant qu'aucun de ces éléments ne change, on peut recharger
+le modèle sans le reconstruire, voire reprendre la meilleure solution déjà
+trouvée avec les mêmes paramètres (donc la même limite de temps).
+
+Le modèle est stocké au format texte compressé: c'est le seul format que le
+module python d'ortools sait relire rapidement. """
+
+# Les modules dont le code définit le modèle
+modules_du_modèle = [
+    data_model,
+    eligibility,
+    workload,
+    appreciation,
+    symmetry,
+    planning_model,
+]
+
+
+def ids(l) -> List[str]:
+    return [e if isinstance(e, str) else e.id for e in l if e is not None]
+
+
+def id_de(e) -> Optional[str]:
+    return None if e is None else e.id
+
+
+def données(ctx: planning_model.Contexte):
+    """Représentation canonique de tout ce qui a été chargé dans le registre
+    des données de [ctx]."""
+    registre = ctx.index.registre
+    return {
+        "spectacles": [[s.id, s.nom] for s in registre.spectacles.values()],
+        "lieux": [[l.id, l.nom] for l in registre.lieux.values()],
+        "types": [
+            [t.id, t.nom, t.sécable, t.spécialiste_only]
+            for t in registre.types.values()
+        ],
+        "bénévoles": [
+            [
+                b.id,
+                b.surnom,
+                b.heures_théoriques,
+                sorted(t.isoformat() for t in b.indisponibilités),
+                [[i.début, i.fin] for i in b.indispos_ponctuelles],
+                sorted((t.isoformat(), p) for t, p in b.pref_horaires.items()),
+                ids(b.binômes_préférés),
+                ids(b.binômes_interdits),
+                ids(b.lieux_interdits),
+                ids(b.types_de_quête_interdits),
+                ids(b.spécialités),
+                b.date_arrivée,
+                b.date_départ,
+                [ctx.index.rang.get(q) for q in b.quêtes_assignées],
+            ]
+            for b in ctx.bénévoles
+        ],
+        "quêtes": [
+            [
+                q.id,
+                q.nom,
+                ids(q.types),
+                id_de(q.lieu),
+                id_de(q.spectacle),
+                q.nombre_bénévoles,
+                q.début,
+                q.fin,
+                ids(q.bénévoles),
+                ids(q.groupe),
+            ]
+            for q in ctx.quêtes
+        ],
+    }
+
+
+def empreinte(ctx: planning_model.Contexte, paramètres) -> str:
+    h = hashlib.sha256()
+    h.update(ortools.__version__.encode())
+    for module in modules_du_modèle:
+        with open(module.__file__, "rb") as source:
+            h.update(source.read())
+    options = {
+        "enable_assumptions": ctx.enable_assumptions,
+        "regroupement": sorted(map(str, ctx.regroupement.items())),
+        "poids": ctx.poids,
+        "types_un_max_de_monde": ctx.types_un_max_de_monde,
+        "paramètres": str(paramètres),
+    }
+    h.update(json.dumps(options, sort_keys=True).encode())
+    h.update(json.dumps(données(ctx), default=str, ensure_ascii=False).encode())
+    return h.hexdigest()
+
+
+class Cache_de_modèles:
+    def __init__(self, dossier=".cache/modèles", taille_max=2 * 2**30):
+        self.dossier = dossier
+        # En octets, les entrées les moins récemment utilisées sont évincées
+        self.taille_max = taille_max
+
+    def chemin(self, clé: str, fichier: str) -> str:
+        return os.path.join(self.dossier, clé, fichier)
+
+    def utilisé(self, clé: str):
+        os.utime(os.path.join(self.dossier, clé))
+
+    def charger_modèle(self, clé: str, ctx: planning_model.Contexte) -> bool:
+        """Remplit le modèle et les assignations de [ctx] depuis le cache.
+        Renvoie False si le modèle n'y est pas."""
+        chemin_modèle = self.chemin(clé, "model.pb.txt.gz")
+        chemin_variables = self.chemin(clé, "assignations.json")
+        if not (os.path.exists(chemin_modèle) and os.path.exists(chemin_variables)):
+            return False
+        with gzip.open(chemin_modèle, "rt", encoding="utf-8") as f:
+            ctx.model.proto.parse_text_format(f.read())
+        with open(chemin_variables) as f:
+            variables = json.load(f)
+        bénévoles = {b.id: b for b in ctx.bénévoles}
+        for id_b, rang_q, i in variables:
+            b, q = bénévoles[id_b], ctx.quêtes[rang_q]
+            ctx.assignations[(b, q)] = ctx.model.get_bool_var_from_proto_index(i)
+        self.utilisé(clé)
+        return True
+
+    def enregistrer_modèle(self, clé: str, ctx: planning_model.Contexte):
+        os.makedirs(os.path.join(self.dossier, clé), exist_ok=True)
+        with gzip.open(
+            self.chemin(clé, "model.pb.txt.gz"), "wt", encoding="utf-8"
+        ) as f:
+            f.write(str(ctx.model.proto))
+        variables = [
+            [b.id, ctx.index.rang[q], v.index] for (b, q), v in ctx.assignations.items()
+        ]
+        with open(self.chemin(clé, "assignations.json"), "w") as f:
+            json.dump(variables, f)
+        self.évincer()
+
+    def charger_solution(self, clé: str, ctx: planning_model.Contexte):
+        """Renvoie le statut, la valeur de l'objectif et les valeurs des
+        assignations de la solution en cache, ou None."""
+        chemin_solution = self.chemin(clé, "solution.json")
+        if not os.path.exists(chemin_solution):
+            return None
+        with open(chemin_solution) as f:
+            solution = json.load(f)
+        assignées = set(solution["assignations"])
+        valeurs = {
+            k: (1 if v.index in assignées else 0) for k, v in ctx.assignations.items()
+        }
+        self.utilisé(clé)
+        status = getattr(cp_model, solution["status"])
+        return status, solution["objective"], valeurs
+
+    def enregistrer_solution(
+        self, clé: str, ctx: planning_model.Contexte, status, objectif, valeurs
+    ) -> bool:
+        """Enregistre la solution si elle est optimale ou meilleure que celle
+        en cache: une résolution courte après une longue ne remplace pas le
+        meilleur planning connu. Renvoie si elle a été enregistrée."""
+        chemin_solution = self.chemin(clé, "solution.json")
+        if status != "OPTIMAL" and os.path.exists(chemin_solution):
+            with open(chemin_solution) as f:
+                if objectif >= json.load(f)["objective"]:
+                    return False
+        os.makedirs(os.path.join(self.dossier, clé), exist_ok=True)
+        solution = {
+            "status": status,
+            "objective": objectif,
+            "assignations": [
+                ctx.assignations[k].index for k, v in valeurs.items() if v
+            ],
+        }
+        with open(chemin_solution, "w") as f:
+            json.dump(solution, f)
+        self.évincer()
+        return True
+
+    def évincer(self):
+        entrées = []
+        for clé in os.listdir(self.dossier):
+            chemin = os.path.join(self.dossier, clé)
+            taille = sum(
+                os.path.getsize(os.path.join(chemin, f)) for f in os.listdir(chemin)
+            )
+            entrées.append((os.path.getmtime(chemin), taille, chemin))
+        total = sum(taille for _, taille, _ in entrées)
+        for _, taille, chemin in sorted(entrées):
+            if total <= self.taille_max:
+                break
+            shutil.rmtree(chemin)
+            total -= taille
@@ -0,0 +1,657 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional
+from datetime import date, time, datetime, timedelta
+from contextlib import nullcontext
+import math
+import numpy as np
+from ortools.sat.python import cp_model
+from data_model import Bénévole, Type_de_quête, Quête, Index_des_quêtes
+from eligibility import Éligibilité
+from workload import Temps_de_travail
+from appreciation import Appréciations
+from symmetry import symétries
+
+""" Modèle CP-SAT du planning
+
+Chaque famille de contraintes est une fonction qui reçoit le `Contexte` du
+modèle en cours de construction. `construire` les applique dans l'ordre. """
+
+""" Outils """
+
+
+def member_f(l, f):
+    for e in l:
+        if f(e):
+            return True
+    return False
+
+
+def member(l, x):
+    for e in l:
+        if e == x:
+            return True
+    return False
+
+
+def time_to_minutes(t: time):
+    return t.hour * 60 + t.minute
+
+
+def diff_minutes(t1: time, t2: time):
+    return time_to_minutes(t2) - time_to_minutes(t1)
+
+
+""" Pondération des critères de l'objectif """
+poids: Dict[str, int] = {
+    "équilibrage_quotidien": 20,
+    "équilibrage_semaine": 10,
+    "amplitudes": 1,
+    "amitiés": 1,
+    "appréciations": 1,
+}
+
+""" On aimerait certaines tâches soient faites par un maximum de personnes
+différentes """
+# TODO make it configurable
+types_un_max_de_monde: List[str] = ["4"]
+
+""" Hypothèses
+
+Pour expliquer une absence de solution, les contraintes qui peuvent en être la
+cause ne sont imposées que si un littéral, supposé vrai, l'est (une hypothèse).
+Le solveur donne alors un ensemble d'hypothèses suffisant pour l'infaisabilité.
+Avec une hypothèse par contrainte, il y en a des dizaines de milliers: le calcul
+est lent et la même raison est listée pour tout le monde. Le [regroupement]
+d'un contexte associe un niveau à une raison ("arrivée", "inimitié",
+"pause_midi"...), à un couple (raison, id du bénévole) ou à "*" pour toutes les
+autres:
+- "imposée": pas d'hypothèse, la contrainte est imposée
+- "raison": une seule hypothèse pour toutes les contraintes de la raison
+- "bénévole": une hypothèse par raison et par bénévole
+- "détail": une hypothèse par contrainte
+Par défaut, une hypothèse par raison. Voir explanation.py pour l'affinage. """
+niveaux_des_hypothèses: List[str] = ["imposée", "raison", "bénévole", "détail"]
+
+
+class Contexte:
+    """Tout ce dont les familles de contraintes ont besoin: le modèle, les
+    données et les variables déjà créées."""
+
+    def __init__(
+        self,
+        bénévoles: List[Bénévole],
+        index: Index_des_quêtes,
+        enable_assumptions=False,
+        éligibilité: Optional[Éligibilité] = None,
+        regroupement: Optional[Dict] = None,
+    ):
+        self.model = cp_model.CpModel()
+        self.bénévoles: List[Bénévole] = list(bénévoles)
+        self.index = index
+        self.quêtes: List[Quête] = index.toutes
+        # Enable or disable assumptions.
+        # This prevents the solver from running in parallel
+        self.enable_assumptions = enable_assumptions
+        self.éligibilité = éligibilité
+        self.regroupement: Dict = dict(regroupement or {})
+        # Les hypothèses déjà créées, par clé de regroupement
+        self.hypothèses_créées: Dict[tuple, cp_model.BoolVarT] = {}
+        self.poids = dict(poids)
+        self.types_un_max_de_monde = list(types_un_max_de_monde)
+
+        """ On créé une variable par bénévole pour chaque "slot" de chaque quête
+        qu'il peut assumer."""
+        self.assignations: Dict[(Bénévole, Quête), cp_model.BoolVarT] = {}
+        """ Ainsi qu'un intervalle correspondant aux horaires de la quête en
+        minutes """
+        self.intervalles: Dict[(Bénévole, Quête), cp_model.IntervalVar] = {}
+
+        # Calculés une fois pour toutes, voir workload.py
+        self.temps_de_travail = Temps_de_travail(self.bénévoles, index)
+        # Voir appreciation.py
+        self.appréciations = Appréciations(self.bénévoles, self.quêtes)
+        self.temps_quotidiens_ajustés: Dict[Bénévole, Dict[date, int]] = (
+            self.temps_de_travail.visés_par_bénévole()
+        )
+        self.max_bénévoles_par_quête: int = max(
+            (q.nombre_bénévoles for q in self.quêtes), default=0
+        )
+        self.objectif: List[cp_model.LinearExprT] = []
+        self.rapports: List[str] = []
+
+    def niveau(self, raison: str, b: Optional[Bénévole]) -> str:
+        if b is not None and (raison, b.id) in self.regroupement:
+            return self.regroupement[(raison, b.id)]
+        return self.regroupement.get(raison, self.regroupement.get("*", "raison"))
+
+    def hypothèses(
+        self, raison: str, b: Optional[Bénévole], détail: str
+    ) -> List[cp_model.BoolVarT]:
+        """Les littéraux qui activent une contrainte de [raison] concernant
+        [b], décrite par [détail]: une hypothèse partagée selon le
+        regroupement, ou rien si la contrainte est imposée."""
+        if not self.enable_assumptions:
+            return []
+        niveau = self.niveau(raison, b)
+        if niveau == "imposée":
+            return []
+        if niveau == "raison":
+            clé, nom = (raison,), raison
+        elif niveau == "bénévole":
+            clé, nom = (raison, b.id if b else None), f"{raison}: {b}"
+        else:
+            clé, nom = (raison, b.id if b else None, détail), détail
+        hypothèse = self.hypothèses_créées.get(clé)
+        if hypothèse is None:
+            hypothèse = self.model.new_bool_var(nom)
+            self.model.add_assumption(hypothèse)
+            self.hypothèses_créées[clé] = hypothèse
+        return [hypothèse]
+
+    def assignations_de(self, q: Quête):
+        return [
+            self.assignations[(b, q)]
+            for b in self.bénévoles
+            if (b, q) in self.assignations
+        ]
+
+    def assignations_parmi(self, b: Bénévole, quêtes: List[Quête]):
+        return [
+            self.assignations[(b, q)] for q in quêtes if (b, q) in self.assignations
+        ]
+
+    def quêtes_dun_lieu(self, lieu):
+        return self.index.par_lieu.get(lieu, [])
+
+    def quêtes_dun_type(self, t):
+        return self.index.par_type.get(t, [])
+
+
+""" Variables """
+
+
+def variables(ctx: Contexte):
+    """Pour pouvoir expliquer une absence de solution, les hypothèses
+    nécessitent de créer les variables de tous les couples, même exclus."""
+    couples = (
+        ((b, q) for b in ctx.bénévoles for q in ctx.quêtes)
+        if ctx.enable_assumptions
+        else ctx.éligibilité.couples_éligibles()
+    )
+    for b, q in couples:
+        ctx.assignations[(b, q)] = ctx.model.new_bool_var(f"shift_b{b}_q{q}")
+        d: int = time_to_minutes(q.début.time())
+        f: int = time_to_minutes(q.fin.time())
+        if f < d:
+            # Fin après minuit
+            # Several days long tasks are not handled
+            f = 24 * 60 + f
+        ctx.intervalles[(b, q)] = ctx.model.new_optional_interval_var(
+            d, f - d, f, ctx.assignations[(b, q)], f"interval_quête_{b}_{q}"
+        )
+
+
+""" Les couples exclus ne sont contraints que pour expliquer une absence de
+solution """
+raisons_des_exclusions = {
+    "arrivée": ("before_arrival", "{b} pas encore arrivé pour {q}"),
+    "départ": ("after_leave", "{b} déjà parti pour {q}"),
+    "indisponibilité": ("indispo", "{b} indisponible pour {q}"),
+    "spécialiste": (
+        "pas_spécialiste",
+        "{b} ne peut pas assumer {q} (un(e) spécialiste est requis)",
+    ),
+    "lieu_interdit": ("lieu_interdit", "{b} ne peut pas assumer {q} (lieu interdit)"),
+    "type_interdit": (
+        "tdq_interdit",
+        "{b} ne peut pas assumer {q} (type de quête interdit)",
+    ),
+    "déjà_assigné": (
+        "assigné_peut_pas_faire",
+        "{b} est assigné manuellement toute la journée de {q}",
+    ),
+}
+
+
+def exclusions(ctx: Contexte):
+    if not ctx.enable_assumptions:
+        return
+    for règle, (nom, raison) in raisons_des_exclusions.items():
+        if règle in ctx.éligibilité.levées:
+            continue
+        for b, q in ctx.éligibilité.couples_exclus(règle):
+            ctx.model.add(ctx.assignations[(b, q)] == 0).with_name(
+                f"{nom}_{b}_{q}"
+            ).only_enforce_if(ctx.hypothèses(règle, b, raison.format(b=b, q=q)))
+
+
+""" Tous les slots de toutes les quêtes doivent être peuplés """
+
+
+def remplissage(ctx: Contexte):
+    for q in ctx.quêtes:
+        ctx.model.add(
+            cp_model.LinearExpr.sum(ctx.assignations_de(q)) == q.nombre_bénévoles
+        ).with_name(f"tout_est_rempli_{q}")
+
+
+""" Un même bénévole ne peut pas remplir plusieurs quêtes en même temps """
+
+
+def non_ubiquité(ctx: Contexte):
+    # Les chevauchements de quêtes forment un graphe d'intervalles: une seule
+    # contrainte par clique maximale remplace toutes les contraintes deux à deux
+    # qu'elle contient. Les paires qui ne se chevauchent qu'à cause du temps de
+    # trajet entre deux lieux restent contraintes deux à deux.
+    cliques = [c for c in ctx.index.cliques() if len(c) > 1]
+    paires_hors_cliques = list(ctx.index.chevauchements_hors_cliques())
+    nb_contraintes_cliques = 0
+    for b in ctx.bénévoles:
+        for c in cliques:
+            vars = ctx.assignations_parmi(b, c)
+            if len(vars) > 1:
+                ctx.model.add_at_most_one(vars).with_name(
+                    f"en_meme_temps_{b}_{c[0]}_{len(c)}"
+                )
+                nb_contraintes_cliques += 1
+        for q, q2 in paires_hors_cliques:
+            vars = ctx.assignations_parmi(b, [q, q2])
+            if len(vars) > 1:
+                ctx.model.add_at_most_one(vars).with_name(f"en_meme_temps_{b}_{q}_{q2}")
+                nb_contraintes_cliques += 1
+
+    # Les contraintes deux à deux remplacées: une par bénévole et par paire non
+    # ordonnée de quêtes qui se chevauchent, si les deux couples sont éligibles
+    rang = ctx.index.rang
+    paires = np.array(
+        [
+            (rang[q], rang[q2])
+            for q in ctx.quêtes
+            for q2 in ctx.index.en_même_temps(q)
+            if rang[q2] > rang[q]
+        ],
+        dtype=np.intp,
+    ).reshape(-1, 2)
+    éligibles = np.zeros((len(ctx.bénévoles), len(ctx.quêtes)), dtype=bool)
+    rang_bénévole = {b: i for i, b in enumerate(ctx.bénévoles)}
+    for b, q in ctx.assignations:
+        éligibles[rang_bénévole[b], rang[q]] = True
+    nb_contraintes_deux_à_deux = int(
+        (éligibles[:, paires[:, 0]] & éligibles[:, paires[:, 1]]).sum()
+    )
+    ctx.rapports.append(
+        f"Non-ubiquité: {nb_contraintes_cliques} contraintes au lieu de "
+        f"{nb_contraintes_deux_à_deux} ({len(cliques)} cliques, "
+        f"{len(paires_hors_cliques)} paires hors cliques)"
+    )
+
+
+""" Certaines quêtes sont déjà assignées """
+
+
+def assignations_fixées(ctx: Contexte):
+    for q in ctx.quêtes:
+        for b in q.bénévoles:
+            ctx.model.add(ctx.assignations[(b, q)] == 1).with_name(f"fixé_{b}_{q}")
+
+
+""" Et certains bénévoles ne devrait rien faire d'autre (voir la règle
+"déjà_assigné" de l'éligibilité) """
+
+""" On aimerait que tout le monde participe à certaines tâches """
+
+
+def tout_le_monde_fait(ctx: Contexte, t: Type_de_quête):
+    for b in ctx.bénévoles:
+        assigné = True
+        for d in ctx.index.par_jour.keys():
+            assigné = assigné and b.est_assigné(d)
+        if not (assigné) and not (member(b.types_de_quête_interdits, t)):
+            # Todo there are more checks to do here such has place interdiction
+            # print(f"{b} fait du clean")
+            ctx.model.add_at_least_one(
+                ctx.assignations_parmi(b, ctx.quêtes_dun_type(t))
+            ).with_name(f"un_seul_{b}_{t}")
+
+
+def un_max_de_monde_fait(ctx: Contexte, t: Type_de_quête):
+    for b in ctx.bénévoles:
+        assigné = True
+        for d in ctx.index.par_jour.keys():
+            assigné = assigné and b.est_assigné(d)
+        if not (assigné) and not (member(b.types_de_quête_interdits, t)):
+            # Todo there are more checks to do here such has place interdiction
+            ctx.model.add_at_most_one(
+                ctx.assignations_parmi(b, ctx.quêtes_dun_type(t))
+            ).with_name(f"au_plus_un_{b}_{t}")
+
+
+def un_max_de_monde(ctx: Contexte):
+    for id in ctx.types_un_max_de_monde:
+        t = ctx.index.registre.types.get(id)
+        if t is not None:
+            un_max_de_monde_fait(ctx, t)
+
+
+""" Ils se détestent, séparez-les ! """
+
+
+def inimitiés(ctx: Contexte):
+    inimitiés: Dict[Bénévole, set[Bénévole]] = {}
+    for b in ctx.bénévoles:
+        inimitiés[b] = set(b.binômes_interdits)
+        for e in b.binômes_interdits:
+            if b not in inimitiés.get(e, set()):
+                for q in ctx.quêtes:
+                    if not ((b, q) in ctx.assignations and (e, q) in ctx.assignations):
+                        continue
+                    hypothèses = ctx.hypothèses(
+                        "inimitié",
+                        b,
+                        f"{b} ne peut pas travailler avec {e} lors de {q}",
+                    )
+                    ctx.model.add(
+                        ctx.assignations[(b, q)] + ctx.assignations[(e, q)] <= 1
+                    ).with_name(f"blaire_pas_{b}_{e}_{q}").only_enforce_if(hypothèses)
+
+
+""" [pause] s'assure que le bénévole [b], chaque jour, a une pause de durée [durée]
+    entre l'heure [début] et l'heure [fin].
+    Début et fin ne doivent pas être séparés de plus de 24h """
+
+
+def pause(ctx: Contexte, nom, début, fin, durée: timedelta, b: Bénévole):
+    model = ctx.model
+    début_m = time_to_minutes(début)
+    fin_m = time_to_minutes(fin)
+    durée_m = round(durée.total_seconds() / 60)
+
+    if fin_m < début_m:
+        # Fin après minuit
+        fin_m = 24 * 60 + fin_m
+
+    for date, quêtes in ctx.index.par_jour.items():
+        id = f"{nom}_{b}_{date}"
+        début_pause = model.new_int_var(
+            début_m,
+            fin_m - durée_m,
+            f"début_pause_{id}",
+        )
+        fin_pause = model.new_int_var(
+            début_m + durée_m,
+            fin_m,
+            f"fin_pause_{id}",
+        )
+        size = model.new_int_var(durée_m, 24 * 60, f"size_pause_{id}")
+        # Une pause qui peut être levée pour expliquer une absence de solution
+        # est un intervalle optionnel, "only_enforce_if" ne fonctionnant pas
+        # avec la contrainte de non-chevauchement
+        hypothèses = ctx.hypothèses(
+            f"pause_{nom}",
+            b,
+            f"{b} doit avoir une pause {nom} de {durée_m / 60}h le {date}",
+        )
+        if hypothèses:
+            interval_pause = model.new_optional_interval_var(
+                début_pause,
+                size,
+                fin_pause,
+                hypothèses[0],
+                f"interval_pause_{id}",
+            )
+        else:
+            interval_pause = model.new_interval_var(
+                début_pause,
+                size,
+                fin_pause,
+                f"interval_pause_{id}",
+            )
+
+        # Le bénévole n'a aucune quête pendant sa pause:
+        overlaps = [interval_pause]
+        for q in quêtes:
+            if (b, q) in ctx.intervalles:
+                overlaps.append(ctx.intervalles[(b, q)])
+
+        model.add_no_overlap(overlaps).with_name(f"noverlap_pause_{id}")
+
+
+""" Les bénévoles ont du temps libre pendant les repas de midi et du soir. """
+début_service_midi = time(hour=11, minute=30)
+fin_service_midi = time(hour=14, minute=30)
+
+début_service_soir = time(hour=17, minute=30)
+fin_service_soir = time(hour=20)
+
+durée_repas = timedelta(minutes=30)
+
+
+def pauses_repas(ctx: Contexte):
+    for b in ctx.bénévoles:
+        pause(ctx, "midi", début_service_midi, fin_service_midi, durée_repas, b)
+        pause(ctx, "soir", début_service_soir, fin_service_soir, durée_repas, b)
+
+
+""" Chacun a un trou dans son emploi du temps """
+début_période_pause = time(hour=9)
+fin_période_pause = time(hour=23)
+durée_pause_min = timedelta(hours=5)
+
+# for b in bénévoles:
+#    pause("pause", début_période_pause, fin_période_pause, durée_pause_min, b)
+
+
+""" Calcul de la qualité d'une réponse """
+
+""" Contrôle du temps de travail """
+
+
+def temps_total_quêtes(quêtes: List[Quête]):
+    return sum(q.durée_minutes() * q.nombre_bénévoles for q in quêtes)
+
+
+# Temps de travail d'un bénévole sur un ensemble de quêtes
+def temps_bev(b, quêtes, assignations):
+    # assignations[(b, q)] pour un bénévole b et une quête q vaut 0 ou 1 et
+    # indique si le bénévole a été assigné à cette quête.
+    return sum(q.durée_minutes() * assignations.get((b, q), 0) for q in quêtes)
+
+
+# Temps de travail, par jour, d'un bénévole
+def temps_quotidien_bénévole(index: Index_des_quêtes, b, assignations):
+    # On renvoie un dictionnaire date -> temps de travail
+    return {
+        date: temps_bev(b, quêtes, assignations)
+        for date, quêtes in index.par_jour.items()
+    }
+
+
+# Écart de l'écart du temps de travail d'un bénévole par rapport à la moyenne
+# Renvoie un dictionnaire indexé par les jours
+def diff_temps(ctx: Contexte, b, assignations):
+    return {
+        date: (tdt - (ctx.temps_quotidiens_ajustés.get(b).get(date)))
+        for date, tdt in temps_quotidien_bénévole(ctx.index, b, assignations).items()
+    }
+
+
+""" Équilibrage du temps de travail """
+
+
+def max_tdt(ctx: Contexte) -> int:
+    # Les heures théoriques peuvent être décimales (import_json)
+    return math.ceil(60 * max([b.heures_théoriques for b in ctx.bénévoles], default=0))
+
+
+def borne_un_jour(ctx: Contexte, jour):
+    model = ctx.model
+    borne_inf_jour = model.new_int_var(
+        -2 * max_tdt(ctx), 2 * max_tdt(ctx), f"borne_inf_des_diffs_jour_{jour}"
+    )
+    borne_sup_jour = model.new_int_var(
+        -2 * max_tdt(ctx), 2 * max_tdt(ctx), f"borne_sup_des_diffs_jour_{jour}"
+    )
+
+    # Somme des différences pour chaque bénévole ce jour
+    for b in ctx.bénévoles:
+        diff_du_jour = diff_temps(ctx, b, ctx.assignations).get(jour)
+        model.add(diff_du_jour <= borne_sup_jour).with_name(f"sup_{b}_{jour}")
+        model.add(diff_du_jour >= borne_inf_jour).with_name(f"inf_{b}_{jour}")
+
+    return borne_sup_jour - borne_inf_jour
+
+
+# \text{minimise}\left( \sum_{j \in \mathcal{J}}^{}\left(\sup_{b\in\mathcal{B}} \text{ecart(b, j)}-\inf_{b\in\mathcal{B}} \text{ecart(b, j)}\right)\right)
+def bornage_des_excès(ctx: Contexte):
+    return sum(borne_un_jour(ctx, jour) for jour in ctx.index.par_jour.keys())
+
+
+def bornage_des_excès_sur_la_semaine(ctx: Contexte):
+    """The goal is to minimize work excess differences on the whole event by allowing some day-to-day differences below the threshold."""
+    model = ctx.model
+    borne_inf = model.new_int_var(
+        -2 * max_tdt(ctx), 2 * max_tdt(ctx), "borne_inf_des_diffs"
+    )
+    borne_sup = model.new_int_var(
+        -2 * max_tdt(ctx), 2 * max_tdt(ctx), "borne_sup_des_diffs"
+    )
+    for b in ctx.bénévoles:
+        diff_par_jour = diff_temps(ctx, b, ctx.assignations)
+        diff = sum(diff for _, diff in diff_par_jour.items())
+        model.add(diff <= borne_sup).with_name(f"sup_{b}")
+        model.add(diff >= borne_inf).with_name(f"inf_{b}")
+    return borne_sup - borne_inf
+
+
+""" Pondération des préférences des bénévoles """
+
+
+# Voir appreciation.py
+def appréciation_du_planning(ctx: Contexte, bénévole: Bénévole):
+    return sum(
+        ctx.assignations[(bénévole, q)] * ctx.appréciations.de(bénévole, q)
+        for q in ctx.quêtes
+        if (bénévole, q) in ctx.assignations
+    )
+
+
+# This might not always be satisfiable
+# for b in bénévoles:
+#     for q in quêtes:
+#         model.add(ctx.appréciations.de(b, q) >= 0).with_name(f"appréciation_{b}_{q}")
+
+
+def appréciations(ctx: Contexte):
+    termes = [(v, ctx.appréciations.de(b, q)) for (b, q), v in ctx.assignations.items()]
+    termes = [(v, a) for v, a in termes if a != 0]
+    return -cp_model.LinearExpr.weighted_sum(
+        [v for v, _ in termes], [a for _, a in termes]
+    )
+
+
+""" Mon pote """
+
+
+def bonus_amis_par_bénévole(ctx: Contexte, q: Quête, b: Bénévole, amitiés):
+    amitiés[b] = set(b.binômes_préférés)
+    amis_non_considérés = list(
+        filter(lambda ami: b not in amitiés.get(ami, set()), b.binômes_préférés)
+    )
+    var = ctx.model.new_int_var(0, ctx.max_bénévoles_par_quête, f"amis_de_{b}_font_{q}")
+    ctx.model.add_max_equality(
+        var,
+        [0, sum(ctx.assignations.get((b, q), 0) for b in amis_non_considérés) - 1],
+    )
+    return var
+
+
+def bonus_amis_par_quête(ctx: Contexte, q: Quête):
+    amitiés: Dict[Bénévole, set[Bénévole]] = {}
+    return sum(bonus_amis_par_bénévole(ctx, q, b, amitiés) for b in ctx.bénévoles)
+
+
+def bonus_amis(ctx: Contexte):
+    return sum(bonus_amis_par_quête(ctx, q) for q in ctx.quêtes)
+
+
+""" Distance entre la première et la dernière quête """
+
+
+def amplitude_horaire(ctx: Contexte, b: Bénévole, quêtes: List[Quête]):
+    quêtes = [q for q in quêtes if (b, q) in ctx.intervalles]
+    if not quêtes:
+        return 0
+    # The end upper bound is more than 24h because that's how we handle quests
+    # that end after midnight.
+    début = ctx.model.new_int_var(0, 60 * 24, f"début_journée_{b}")
+    fin = ctx.model.new_int_var(0, 2 * 60 * 24, f"fin_journée_{b}")
+    ctx.model.add_min_equality(
+        début, map(lambda q: ctx.intervalles[(b, q)].start_expr(), quêtes)
+    ).with_name(f"amp_min_{b}")
+    ctx.model.add_max_equality(
+        fin, map(lambda q: ctx.intervalles[(b, q)].end_expr(), quêtes)
+    ).with_name(f"amp_max_{b}")
+    return fin - début
+
+
+def amplitudes_bénévole(ctx: Contexte, b: Bénévole):
+    return sum(
+        amplitude_horaire(ctx, b, quêtes) - (b.heures_théoriques * 60)
+        for quêtes in ctx.index.par_jour.values()
+    )
+
+
+def amplitudes(ctx: Contexte):
+    return sum(amplitudes_bénévole(ctx, b) for b in ctx.bénévoles)
+
+
+""" Formule finale """
+
+contraintes = [
+    ("variables", variables),
+    ("exclusions", exclusions),
+    ("remplissage", remplissage),
+    ("non_ubiquité", non_ubiquité),
+    ("assignations_fixées", assignations_fixées),
+    ("symétries", symétries),
+    ("un_max_de_monde", un_max_de_monde),
+    ("inimitiés", inimitiés),
+    ("pauses_repas", pauses_repas),
+]
+
+critères = [
+    ("équilibrage_quotidien", bornage_des_excès),
+    ("équilibrage_semaine", bornage_des_excès_sur_la_semaine),
+    ("amplitudes", amplitudes),
+    ("amitiés", bonus_amis),
+    ("appréciations", appréciations),
+]
+
+
+def construire(ctx: Contexte, profil=None, exclues: List[str] = []):
+    """Construit le modèle famille par famille, sauf celles nommées dans
+    [exclues]. Si un [profil] est donné, chaque famille y est mesurée (voir
+    `build_profile.py`)."""
+
+    def famille(nom):
+        return profil.famille(nom) if profil else nullcontext()
+
+    if ctx.éligibilité is None:
+        with famille("éligibilité"):
+            ctx.éligibilité = Éligibilité(ctx.bénévoles, ctx.index)
+
+    for nom, f in contraintes:
+        if nom in exclues:
+            continue
+        with famille(nom):
+            f(ctx)
+
+    if not ctx.enable_assumptions:
+        # Minimizing is not compatible with assumptions
+        for nom, f in critères:
+            if nom in exclues:
+                continue
+            with famille(nom):
+                ctx.objectif.append(ctx.poids[nom] * f(ctx))
+        with famille("objectif"):
+            ctx.model.minimize(sum(ctx.objectif))
@@ -0,0 +1,206 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import copy, gzip, json, math, multiprocessing, os, threading, time
+from ortools.sat.python import cp_model
+
+""" Portefeuille de solveurs
+
+Le modèle construit est écrit une fois dans un fichier, puis résolu par
+plusieurs processus indépendants qui diffèrent par leur graine aléatoire et
+quelques paramètres de recherche et se partagent les cœurs de la machine. Le
+meilleur objectif trouvé est partagé entre les processus: après un délai de
+grâce, ceux qui restent trop loin derrière abandonnent. On garde la meilleure
+solution et on note la configuration gagnante dans un historique, pour choisir
+un jour les paramètres par défaut en connaissance de cause.
+
+`résoudre_proto` est le point d'entrée des processus: il relit un modèle écrit
+par `écrire_modèle` et le résout avec des paramètres donnés sous forme de
+texte (ni les modèles ni les paramètres d'ortools ne se picklent). """
+
+# Les configurations successives du portefeuille reprennent ces variantes avec
+# des graines différentes
+variantes: List[Dict] = [
+    {},
+    {"linearization_level": 2},
+    {"linearization_level": 0},
+    {"symmetry_level": 0},
+]
+
+
+def écrire_modèle(model: cp_model.CpModel, fichier: str):
+    with gzip.open(fichier, "wt", encoding="utf-8") as f:
+        f.write(str(model.proto))
+
+
+def lire_modèle(fichier: str) -> cp_model.CpModel:
+    model = cp_model.CpModel()
+    with gzip.open(fichier, "rt", encoding="utf-8") as f:
+        model.proto.parse_text_format(f.read())
+    return model
+
+
+def paramètres_texte(paramètres, **modifications) -> str:
+    """Les [paramètres] du solveur modifiés, sous forme de texte."""
+    paramètres = copy.deepcopy(paramètres)
+    for nom, valeur in modifications.items():
+        setattr(paramètres, nom, valeur)
+    return str(paramètres)
+
+
+# Le meilleur objectif de tous les processus, partagé par `_partager`
+_meilleur_partagé = None
+
+
+def _partager(valeur):
+    global _meilleur_partagé
+    _meilleur_partagé = valeur
+
+
+class _Suivi(cp_model.CpSolverSolutionCallback):
+    def __init__(self):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.début = time.perf_counter()
+        self.meilleur: Optional[float] = None
+        # (temps, objectif) de chaque solution trouvée
+        self.progression: List[(float, float)] = []
+
+    def on_solution_callback(self) -> None:
+        objectif = self.objective_value
+        self.meilleur = objectif
+        self.progression.append((time.perf_counter() - self.début, objectif))
+        if _meilleur_partagé is not None:
+            with _meilleur_partagé.get_lock():
+                if objectif < _meilleur_partagé.value:
+                    _meilleur_partagé.value = objectif
+
+
+def résoudre_proto(
+    fichier: str,
+    paramètres: str,
+    délai_de_grâce: Optional[float] = None,
+    tolérance: float = 0.05,
+    journal: Optional[str] = None,
+) -> Dict:
+    """Résout le modèle écrit dans [fichier]. Si un meilleur objectif est
+    partagé, abandonne après [délai_de_grâce] secondes tant que le sien le
+    dépasse de plus de [tolérance] (relative)."""
+    model = lire_modèle(fichier)
+    solver = cp_model.CpSolver()
+    solver.parameters.parse_text_format(paramètres)
+    suivi = _Suivi()
+    fini = threading.Event()
+    arrêté = threading.Event()
+
+    def surveiller():
+        while not fini.wait(0.5):
+            if time.perf_counter() - suivi.début < délai_de_grâce:
+                continue
+            meilleur = _meilleur_partagé.value
+            if math.isinf(meilleur):
+                continue
+            if suivi.meilleur is None or suivi.meilleur - meilleur > tolérance * max(
+                abs(meilleur), 1
+            ):
+                arrêté.set()
+                solver.stop_search()
+                return
+
+    if délai_de_grâce is not None and _meilleur_partagé is not None:
+        threading.Thread(target=surveiller, daemon=True).start()
+    try:
+        if journal:
+            with open(journal, "w") as text_file:
+                solver.log_callback = lambda str: text_file.write(f"{str}\n")
+                status = solver.solve(model, suivi)
+        else:
+            status = solver.solve(model, suivi)
+    finally:
+        fini.set()
+
+    trouvée = status == cp_model.OPTIMAL or status == cp_model.FEASIBLE
+    return {
+        "status": status.name,
+        "objective": solver.objective_value if trouvée else None,
+        "best_bound": solver.best_objective_bound if trouvée else None,
+        "wall_time": solver.wall_time,
+        "stopped_early": arrêté.is_set(),
+        "progress": suivi.progression,
+        "solution": list(solver.response_proto.solution) if trouvée else None,
+    }
+
+
+def configurations(k: int) -> List[Dict]:
+    return [dict(variantes[i % len(variantes)], random_seed=i + 1) for i in range(k)]
+
+
+def résoudre_en_portefeuille(
+    model: cp_model.CpModel,
+    paramètres,
+    k: int,
+    dossier: str,
+    délai_de_grâce: float = 30.0,
+    tolérance: float = 0.05,
+    historique: Optional[str] = "runs/portefeuille.jsonl",
+) -> (Optional[Dict], List[Dict]):
+    """Résout [model] avec [k] configurations en parallèle. Renvoie le
+    meilleur résultat (None si aucun n'a de solution) et tous les résultats."""
+    fichier = os.path.join(dossier, "model.pb.txt.gz")
+    écrire_modèle(model, fichier)
+    cœurs = paramètres.num_workers or os.cpu_count() or 1
+    configs = configurations(k)
+    textes = [
+        paramètres_texte(paramètres, num_workers=max(1, cœurs // k), **c)
+        for c in configs
+    ]
+    journaux = [os.path.join(dossier, f"cp_sat_log_{i}.txt") for i in range(k)]
+
+    meilleur_partagé = multiprocessing.Value("d", math.inf)
+    with ProcessPoolExecutor(
+        max_workers=k,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_partager,
+        initargs=(meilleur_partagé,),
+    ) as pool:
+        futurs = [
+            pool.submit(résoudre_proto, fichier, t, délai_de_grâce, tolérance, j)
+            for t, j in zip(textes, journaux)
+        ]
+        résultats = [f.result() for f in futurs]
+    for c, r in zip(configs, résultats):
+        r["configuration"] = c
+
+    trouvés = [r for r in résultats if r["solution"] is not None]
+    meilleur = min(trouvés, key=lambda r: r["objective"], default=None)
+    if historique:
+        os.makedirs(os.path.dirname(historique) or ".", exist_ok=True)
+        with open(historique, "a") as f:
+            entrée = {
+                "date": datetime.now().isoformat(),
+                "variables": len(model.proto.variables),
+                "constraints": len(model.proto.constraints),
+                "winner": meilleur["configuration"] if meilleur else None,
+                "runs": [
+                    {
+                        clé: v
+                        for clé, v in r.items()
+                        if clé not in ["solution", "progress"]
+                    }
+                    for r in résultats
+                ],
+            }
+            f.write(json.dumps(entrée) + "\n")
+    return meilleur, résultats
+
+
+def rapport(meilleur: Optional[Dict], résultats: List[Dict]) -> str:
+    lignes = ["Portefeuille:"]
+    for r in résultats:
+        arrêt = ", abandon" if r["stopped_early"] else ""
+        lignes.append(
+            f"- {r['configuration']}: {r['status']}, objectif {r['objective']}, {r['wall_time']:.1f}s{arrêt}"
+        )
+    if meilleur:
+        lignes.append(f"Configuration gagnante: {meilleur['configuration']}")
+    return "\n".join(lignes)
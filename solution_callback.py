@@ -0,0 +1,240 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional
+import math, threading, time, traceback
+from collections import deque
+import numpy as np
+from ortools.sat.python import cp_model
+from data_model import Bénévole, Quête
+from planning_model import Contexte
+
+""" Suivi des solutions intermédiaires
+
+Le callback tourne sur le thread du solveur et le bloque: il récupère donc
+toutes les valeurs des assignations d'un coup depuis la réponse du solveur et
+calcule les statistiques avec numpy sur des tableaux préparés une fois pour
+toutes. Le rapport complet (fichiers de la solution) n'est produit qu'au
+rythme fixé par une `Cadence`, et toujours pour la dernière solution. Les
+fichiers sont écrits par un `Écrivain_de_solutions` sur son propre thread pour
+que les entrées/sorties ne ralentissent pas la recherche. """
+
+
+def smile_of_appréciation(app):
+    smile = "🙂"
+    if app >= 1:
+        smile = "🤗"
+    if app < 0:
+        smile = "😰"
+    if app < -1:
+        smile = "😭"
+    return smile
+
+
+class Vue_des_solutions:
+    """Les assignations de [ctx] à plat: la k-ième case des tableaux concerne
+    le k-ième couple (bénévole, quête) de `ctx.assignations`."""
+
+    def __init__(self, ctx: Contexte):
+        self.ctx = ctx
+        self.clés: List[(Bénévole, Quête)] = list(ctx.assignations.keys())
+        self.variables = np.array(
+            [v.index for v in ctx.assignations.values()], dtype=np.intp
+        )
+        rang_bénévole = {b: i for i, b in enumerate(ctx.bénévoles)}
+        self.jours = list(ctx.index.par_jour.keys())
+        rang_jour = {d: i for i, d in enumerate(self.jours)}
+        self.bénévole = np.array(
+            [rang_bénévole[b] for b, _ in self.clés], dtype=np.intp
+        )
+        self.jour = np.array([rang_jour[q.jour] for _, q in self.clés], dtype=np.intp)
+        self.durées = np.array([q.durée_minutes() for _, q in self.clés])
+        quête = np.array([ctx.index.rang[q] for _, q in self.clés], dtype=np.intp)
+        self.appréciations = ctx.appréciations.matrice[self.bénévole, quête]
+        self.temps_ajustés = ctx.temps_de_travail.visés
+
+    def valeurs(self, réponse) -> np.ndarray:
+        """Les valeurs des assignations dans la [réponse] du solveur."""
+        solution = np.fromiter(réponse.solution, dtype=np.int64)
+        return solution[self.variables] == 1
+
+    def assignations(self, valeurs: np.ndarray) -> Dict[(Bénévole, Quête), int]:
+        return dict(zip(self.clés, valeurs.astype(int).tolist()))
+
+    def participants(self, valeurs: np.ndarray) -> Dict[Quête, List[Bénévole]]:
+        result: Dict[Quête, List[Bénévole]] = {q: [] for q in self.ctx.quêtes}
+        for k in np.flatnonzero(valeurs):
+            b, q = self.clés[k]
+            result[q].append(b)
+        return result
+
+    def diff_temps(self, valeurs: np.ndarray) -> np.ndarray:
+        """Comme `planning_model.diff_temps`, pour tous les bénévoles: une
+        ligne par bénévole, une colonne par jour."""
+        nb_jours = len(self.jours)
+        temps = np.bincount(
+            self.bénévole * nb_jours + self.jour,
+            weights=self.durées * valeurs,
+            minlength=self.temps_ajustés.size,
+        ).reshape(self.temps_ajustés.shape)
+        return temps - self.temps_ajustés
+
+    def ligne_des_smiles(self, valeurs: np.ndarray) -> str:
+        apps, nombres = np.unique(self.appréciations[valeurs], return_counts=True)
+        smiles = {}
+        for app, n in zip(apps, nombres):
+            smile = smile_of_appréciation(app)
+            smiles[smile] = smiles.get(smile, 0) + int(n)
+        total_smiles = sum(smiles.values())
+        smile_line = ""
+        for smile in sorted(smiles.keys()):
+            n100 = (smiles[smile] * 100) / total_smiles
+            smile_line = f"{smile_line}[{smile}{n100:=04.1f}%]"
+        return smile_line
+
+    def ligne_des_écarts(self, valeurs: np.ndarray) -> str:
+        diffs = self.diff_temps(valeurs)
+        nombre_bénévoles = max(diffs.shape[0], 1)
+        écarts_line = "["
+        for j in range(diffs.shape[1]):
+            min_ = min(diffs[:, j].min(initial=0), 0)
+            max_ = max(diffs[:, j].max(initial=0), 0)
+            écart_type = math.sqrt(np.abs(diffs[:, j]).sum() / nombre_bénévoles)
+            écarts_line = f"{écarts_line} {écart_type:=.1f} [{min_:.0f};{max_:.0f}]"
+        return f"{écarts_line}]"
+
+
+class Cadence:
+    """Au plus un rapport complet toutes les [intervalle] secondes, sauf si
+    l'objectif s'est amélioré d'au moins [amélioration] (relative) depuis le
+    dernier rapport."""
+
+    def __init__(self, intervalle=10.0, amélioration=0.05):
+        self.intervalle = intervalle
+        self.amélioration = amélioration
+        self.dernier_instant: Optional[float] = None
+        self.dernier_objectif: Optional[float] = None
+
+    def doit_rapporter(self, objectif: float, instant: float) -> bool:
+        if self.dernier_instant is None:
+            return True
+        if instant - self.dernier_instant >= self.intervalle:
+            return True
+        gain = self.dernier_objectif - objectif
+        return gain >= self.amélioration * max(abs(self.dernier_objectif), 1)
+
+    def rapporté(self, objectif: float, instant: float):
+        self.dernier_instant = instant
+        self.dernier_objectif = objectif
+
+
+class Rapporteur_de_solutions(cp_model.CpSolverSolutionCallback):
+    """Appelle [rapporter(numéro, valeurs)] au rythme de la [cadence]. Après
+    la résolution, `finir()` rapporte la dernière solution si ce n'est pas déjà
+    fait. Chaque solution est aussi notée dans la [télémétrie] s'il y en a une
+    (voir telemetry.py)."""
+
+    def __init__(
+        self, vue: Vue_des_solutions, rapporter, cadence=None, télémétrie=None
+    ):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.vue = vue
+        self.rapporter = rapporter
+        self.cadence = cadence if cadence else Cadence()
+        self.télémétrie = télémétrie
+        self.solution_count = 0
+        self.rapports = 0
+        # Temps passé dans le callback, en secondes, pour chaque solution
+        self.latences: List[float] = []
+        self._dernière: Optional[(int, np.ndarray)] = None
+        self._dernière_rapportée = True
+
+    def on_solution_callback(self) -> None:
+        début = time.perf_counter()
+        self.solution_count += 1
+        valeurs = self.vue.valeurs(self.response_proto)
+        objectif = self.objective_value
+        self._dernière = (self.solution_count, valeurs)
+        self._dernière_rapportée = False
+        if self.télémétrie is not None:
+            self.télémétrie.solution(
+                self.wall_time, objectif, self.best_objective_bound
+            )
+        if self.cadence.doit_rapporter(objectif, début):
+            self._rapporter()
+            self.cadence.rapporté(objectif, début)
+        self.latences.append(time.perf_counter() - début)
+
+    def _rapporter(self):
+        numéro, valeurs = self._dernière
+        self.rapporter(numéro, valeurs)
+        self.rapports += 1
+        self._dernière_rapportée = True
+
+    def finir(self):
+        if self._dernière is not None and not self._dernière_rapportée:
+            self._rapporter()
+
+    def résumé(self) -> str:
+        if self.latences == []:
+            return "Callback: aucune solution"
+        latences = np.array(self.latences) * 1000
+        return f"Callback: {self.solution_count} solutions, {self.rapports} rapports, latence moyenne {latences.mean():.1f}ms, max {latences.max():.1f}ms"
+
+
+class Écrivain_de_solutions:
+    """Appelle [écrire(numéro, valeurs)] sur un thread dédié pour les solutions
+    déposées. Au plus [taille] solutions attendent d'être écrites: si
+    l'écriture prend du retard, les plus anciennes sont abandonnées au profit
+    des plus récentes. `fermer()` attend que tout ce qui reste soit écrit."""
+
+    def __init__(self, écrire, taille=1):
+        self.écrire = écrire
+        self.taille = taille
+        self.écrites = 0
+        self.abandonnées = 0
+        self._en_attente = deque()
+        self._condition = threading.Condition()
+        self._fermé = False
+        self._thread = threading.Thread(
+            target=self._boucle, name="écrivain_de_solutions", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.fermer()
+
+    def déposer(self, numéro: int, valeurs: np.ndarray):
+        # Le solveur ne doit pas pouvoir modifier ce qui attend d'être écrit
+        valeurs = valeurs.copy()
+        valeurs.flags.writeable = False
+        with self._condition:
+            while len(self._en_attente) >= self.taille:
+                self._en_attente.popleft()
+                self.abandonnées += 1
+            self._en_attente.append((numéro, valeurs))
+            self._condition.notify()
+
+    def _boucle(self):
+        while True:
+            with self._condition:
+                while not self._en_attente and not self._fermé:
+                    self._condition.wait()
+                if not self._en_attente:
+                    return
+                numéro, valeurs = self._en_attente.popleft()
+            try:
+                self.écrire(numéro, valeurs)
+                self.écrites += 1
+            except Exception:
+                traceback.print_exc()
+
+    def fermer(self):
+        with self._condition:
+            self._fermé = True
+            self._condition.notify()
+        self._thread.join()
+
+    def résumé(self) -> str:
+        return f"Écriture des solutions: {self.écrites} écrites, {self.abandonnées} abandonnées"
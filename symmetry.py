@@ -0,0 +1,142 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict
+from datetime import datetime
+import math
+from ortools.sat.python import cp_model
+from data_model import Bénévole
+from appreciation import préférences
+
+""" Symétries entre bénévoles interchangeables
+
+Deux bénévoles sans amis, sans ennemis et sans quête fixée dont le reste du
+profil est identique (heures théoriques, disponibilités, préférences,
+interdictions, spécialités, dates de présence et donc temps de travail visés)
+sont interchangeables: échanger leurs plannings ne change ni la faisabilité ni
+l'objectif, et le solveur perd son temps à explorer les k! permutations de
+chaque classe de k bénévoles.
+
+Remplacer une classe par un compteur par quête ne permettrait plus d'exprimer
+les contraintes propres à chaque bénévole (non-ubiquité, pauses, équilibrage).
+On impose plutôt que les plannings des membres d'une classe soient rangés dans
+l'ordre lexicographique décroissant, ce qui ne garde qu'une solution par
+permutation. Les indices d'une exécution précédente doivent être rangés de la
+même façon pour rester compatibles, voir `ranger`. """
+
+
+def id_de(x) -> str:
+    return x if isinstance(x, str) else x.id
+
+
+def liés(ctx) -> set[str]:
+    """Les ids des bénévoles qu'une relation ou une assignation fixée
+    distingue des autres."""
+    ids = set()
+    for b in ctx.bénévoles:
+        relations = list(b.binômes_préférés) + list(b.binômes_interdits)
+        if relations or b.quêtes_assignées:
+            ids.add(b.id)
+            ids.update(map(id_de, relations))
+    for q in ctx.quêtes:
+        ids.update(map(id_de, q.bénévoles))
+    return ids
+
+
+def profil(ctx, b: Bénévole) -> tuple:
+    """Tout ce que le modèle sait de [b]."""
+    rang = ctx.temps_de_travail.rang_bénévole[b]
+    return (
+        b.heures_théoriques,
+        tuple(sorted(b.indisponibilités)),
+        tuple((i.début, i.fin) for i in b.indispos_ponctuelles),
+        tuple(préférences(b)),
+        tuple(sorted(map(id_de, b.types_de_quête_interdits))),
+        tuple(sorted(map(id_de, b.spécialités))),
+        tuple(sorted(map(id_de, b.lieux_interdits))),
+        b.date_arrivée,
+        b.date_départ,
+        tuple(ctx.temps_de_travail.visés[rang]),
+    )
+
+
+def classes_interchangeables(ctx) -> List[List[Bénévole]]:
+    """Les classes d'au moins deux bénévoles interchangeables, dans l'ordre de
+    `ctx.bénévoles`."""
+    exclus = liés(ctx)
+    classes: Dict[tuple, List[Bénévole]] = {}
+    for b in ctx.bénévoles:
+        if b.id not in exclus:
+            classes.setdefault(profil(ctx, b), []).append(b)
+    return [c for c in classes.values() if len(c) > 1]
+
+
+def ordre_lexicographique(model: cp_model.CpModel, xs, ys, nom: str):
+    """Impose [xs] >= [ys] dans l'ordre lexicographique. Chaque `égaux` dit
+    que les éléments précédents sont égaux, et qu'il faut donc encore
+    comparer le suivant."""
+    égaux = None
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        contrainte = model.add_bool_or([x, ~y])
+        if égaux is not None:
+            contrainte.only_enforce_if(égaux)
+        if i == len(xs) - 1:
+            break
+        suivants = model.new_bool_var(f"lex_{nom}_{i}")
+        for clause in ([x, suivants], [~y, suivants]):
+            contrainte = model.add_bool_or(clause)
+            if égaux is not None:
+                contrainte.only_enforce_if(égaux)
+        égaux = suivants
+
+
+def quêtes_de_la_classe(ctx, c: List[Bénévole]):
+    return [q for q in ctx.quêtes if (c[0], q) in ctx.assignations]
+
+
+def symétries(ctx):
+    classes = classes_interchangeables(ctx)
+    proto = ctx.model.proto
+    variables, contraintes = len(proto.variables), len(proto.constraints)
+    for c in classes:
+        quêtes = quêtes_de_la_classe(ctx, c)
+        for b, b2 in zip(c, c[1:]):
+            ordre_lexicographique(
+                ctx.model,
+                [ctx.assignations[(b, q)] for q in quêtes],
+                [ctx.assignations[(b2, q)] for q in quêtes],
+                f"{b.id}_{b2.id}",
+            )
+    membres = sum(len(c) for c in classes)
+    permutations = sum(math.lgamma(len(c) + 1) for c in classes) / math.log(10)
+    ctx.rapports.append(
+        f"Symétries: {membres} bénévoles interchangeables en {len(classes)} classes, "
+        f"10^{permutations:.1f} permutations écartées pour "
+        f"{len(proto.variables) - variables} variables et "
+        f"{len(proto.constraints) - contraintes} contraintes de plus"
+    )
+
+
+def ranger(
+    ctx, assignations: Dict[(str, datetime), List[str]]
+) -> Dict[(str, datetime), List[str]]:
+    """Permute les bénévoles de chaque classe dans les [assignations] (ids
+    des bénévoles de chaque quête, par `Quête.clé`) pour respecter l'ordre
+    imposé par `symétries`."""
+    rangées = {clé: list(ids_b) for clé, ids_b in assignations.items()}
+    for c in classes_interchangeables(ctx):
+        quêtes = quêtes_de_la_classe(ctx, c)
+        plannings = sorted(
+            (tuple(b.id in rangées.get(q.clé(), []) for q in quêtes) for b in c),
+            reverse=True,
+        )
+        membres = {b.id for b in c}
+        for q in quêtes:
+            if q.clé() not in rangées:
+                continue
+            rangées[q.clé()] = [
+                id_b for id_b in rangées[q.clé()] if id_b not in membres
+            ]
+        for b, planning in zip(c, plannings):
+            for q, assigné in zip(quêtes, planning):
+                if assigné and b.id not in rangées[q.clé()]:
+                    rangées[q.clé()].append(b.id)
+    return rangées
@@ -0,0 +1,568 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional
+from datetime import date, time, datetime, timedelta
+import argparse, csv, json, os, random
+
+from data_model import (
+    Bénévole,
+    Spectacle,
+    Lieu,
+    Type_de_quête,
+    Quête,
+    Registre,
+    registre_courant,
+    temps_inter_quêtes,
+)
+from planning_model import (
+    début_service_midi,
+    fin_service_midi,
+    début_service_soir,
+    fin_service_soir,
+    durée_repas,
+)
+
+""" Jeux de données synthétiques
+
+Remplit directement le registre courant de data_model avec un festival
+aléatoire (mais reproductible, la graine est fixée) dont on choisit la taille et
+la difficulté, pour tester le passage à l'échelle de lbc24 sans nos données
+privées. Les mêmes données peuvent être écrites dans les formats lus par
+`import_json` (export Notion), `import_csv` et `import_gapi` (feuilles Google,
+comme les renvoie `import_gapi_req.get`) pour mesurer aussi les imports.
+Chaque format ne porte que les champs qu'il connaît.
+
+    python synthetic.py --bénévoles 120 --quêtes 400 --json data/synth.json
+"""
+
+# Les heures pour lesquelles les formulaires demandent les préférences
+heures_des_formulaires = [0] + list(range(9, 24))
+# Les quêtes découpables le sont par tranches de 2h à l'import
+durée_max_sécable = timedelta(hours=2)
+# import_json recopie chaque quête de l'export Notion, sauf l'affichage, sur les
+# trois jours suivants
+jours_recopiés = 3
+
+
+def générer(
+    bénévoles=60,
+    quêtes=150,
+    jours=5,
+    lieux=6,
+    types=8,
+    spectacles=4,
+    ratio_sécable=0.3,
+    part_spécialistes=0.15,
+    densité_disponibilité=0.85,
+    densité_amis=0.05,
+    densité_ennemis=0.01,
+    ratio_préassignées=0.05,
+    début=date(2025, 7, 1),
+    seed=0,
+    recopies=False,
+):
+    """Déclare un festival aléatoire dans data_model. Il reste à appeler
+    `strengthen()`. Avec [recopies], chaque quête est suivie de ses copies des
+    `jours_recopiés` jours suivants, de même id, comme import_json les crée:
+    seul ce festival peut être écrit pour import_json (voir `vers_notion`)."""
+    rng = random.Random(seed)
+
+    spectacles_: List[Spectacle] = [
+        Spectacle(f"s{i}", f"Spectacle {i}") for i in range(spectacles)
+    ]
+    lieux_: List[Lieu] = [Lieu(f"l{i}", f"Lieu {i}") for i in range(lieux)]
+    nb_spécialistes = min(round(part_spécialistes * types), types - 1)
+    types_: List[Type_de_quête] = [
+        Type_de_quête(
+            f"t{i}",
+            f"Type {i}",
+            rng.random() < ratio_sécable,
+            spécialiste_only=i < nb_spécialistes,
+        )
+        for i in range(types)
+    ]
+    ordinaires = [t for t in types_ if not t.spécialiste_only]
+    spéciaux = [t for t in types_ if t.spécialiste_only]
+
+    dernier_jour = début + timedelta(days=jours - 1)
+    bénévoles_: List[Bénévole] = []
+    for i in range(bénévoles):
+        indisponibilités = []
+        pref_horaires = {}
+        for h in heures_des_formulaires:
+            if rng.random() > densité_disponibilité:
+                indisponibilités.append(time(hour=h))
+            else:
+                pref_horaires[time(hour=h)] = rng.choices([-1, 0, 1], [1, 3, 2])[0]
+        date_arrivée = None
+        date_départ = None
+        if jours > 1 and rng.random() < 0.1:
+            date_arrivée = datetime.combine(début + timedelta(days=1), time(12))
+        if jours > 1 and rng.random() < 0.1:
+            date_départ = datetime.combine(dernier_jour, time(18))
+        b = Bénévole(
+            f"b{i}",
+            f"Bénévole {i}",
+            f"Prénom {i}",
+            f"Nom {i}",
+            rng.choice([4, 5, 6]),
+            indisponibilités,
+            [],
+            pref_horaires,
+            [],
+            [],
+            [t.id for t in ordinaires if rng.random() < 0.05],
+            [t.id for t in spéciaux if rng.random() < 0.3],
+            date_arrivée,
+            date_départ,
+        )
+        bénévoles_.append(b)
+    for i, b in enumerate(bénévoles_):
+        for autre in bénévoles_[i + 1 :]:
+            tirage = rng.random()
+            if tirage < densité_ennemis:
+                b.binômes_interdits.append(autre.id)
+            elif tirage < densité_ennemis + densité_amis:
+                b.binômes_préférés.append(autre.id)
+
+    # Un planning qui respecte les contraintes dures est construit en même
+    # temps que les quêtes, dont le nombre de places ne le dépasse jamais: le
+    # festival généré a toujours une solution.
+    planning: Dict[Bénévole, List[(Lieu, datetime, datetime)]] = {
+        b: [] for b in bénévoles_
+    }
+    série = 1 + jours_recopiés if recopies else 1
+    n = 0
+    s = 0
+    tentatives = 0
+    while n < quêtes and tentatives < 10 * quêtes:
+        tentatives += 1
+        jour = début + timedelta(days=rng.randrange(max(1, jours - série + 1)))
+        t = rng.choice(spéciaux) if spéciaux and rng.random() < 0.1 else None
+        t = t or rng.choice(ordinaires)
+        lieu = rng.choice(lieux_)
+        q_début = datetime.combine(jour, time()) + timedelta(
+            minutes=30 * rng.randrange(9 * 2, 23 * 2)
+        )
+        durée = timedelta(minutes=30 * rng.randint(2, 8))
+        if t.sécable:
+            durée = min(durée, durée_max_sécable)
+        horaires = [
+            (q_début + timedelta(days=i), q_début + durée + timedelta(days=i))
+            for i in range(série)
+        ]
+
+        candidats = [
+            b
+            for b in bénévoles_
+            if all(disponible(b, t, lieu, d, f, planning[b]) for d, f in horaires)
+        ]
+        rng.shuffle(candidats)
+        nombre_bénévoles = rng.randint(1, 4)
+        équipe: List[Bénévole] = []
+        for b in candidats:
+            if len(équipe) < nombre_bénévoles and not any(
+                ennemis(b, e) for e in équipe
+            ):
+                équipe.append(b)
+        if équipe == []:
+            continue
+        for b in équipe:
+            planning[b].extend((lieu, d, f) for d, f in horaires)
+
+        # Un bénévole entièrement assigné un jour n'est éligible à rien
+        # d'autre ce jour là, on lui en laisse donc toujours un peu.
+        fixés = [
+            b
+            for b in équipe[:1]
+            if rng.random() < ratio_préassignées
+            and all(
+                minutes_fixées(b, d.date()) + durée.total_seconds() / 60
+                < b.heures_théoriques * 60
+                for d, _ in horaires
+            )
+        ]
+        spectacle = rng.choice(spectacles_) if spectacles_ else None
+        for d, f in horaires:
+            q = Quête(
+                f"q{s}",
+                f"Quête {s}",
+                [t],
+                lieu,
+                spectacle,
+                len(équipe),
+                d,
+                f,
+                fixés,
+                [],
+            )
+            for b in fixés:
+                b.quêtes_assignées.append(q)
+            n += 1
+        s += 1
+
+
+def ennemis(b: Bénévole, autre: Bénévole) -> bool:
+    return autre.id in b.binômes_interdits or b.id in autre.binômes_interdits
+
+
+def minutes_fixées(b: Bénévole, jour: date) -> float:
+    return sum(q.durée_minutes() for q in b.quêtes_assignées if q.jour == jour)
+
+
+def disponible(
+    b: Bénévole,
+    t: Type_de_quête,
+    lieu: Lieu,
+    début: datetime,
+    fin: datetime,
+    occupations: List[(Lieu, datetime, datetime)],
+) -> bool:
+    """[b] peut-il faire cette quête en plus de ses [occupations]?"""
+    if t.spécialiste_only and t.id not in b.spécialités:
+        return False
+    if t.id in b.types_de_quête_interdits:
+        return False
+    if b.date_arrivée and début < b.date_arrivée:
+        return False
+    if b.date_départ and fin > b.date_départ:
+        return False
+    h = début.replace(minute=0)
+    while h < fin:
+        if time(hour=h.hour) in b.indisponibilités:
+            return False
+        h += timedelta(hours=1)
+    trajet = timedelta(minutes=temps_inter_quêtes)
+    for l, d, f in occupations:
+        marge = trajet if l != lieu else timedelta()
+        if d - marge < fin and début < f + marge:
+            return False
+    return garde_ses_repas(occupations + [(lieu, début, fin)], début.date())
+
+
+def garde_ses_repas(occupations: List[(Lieu, datetime, datetime)], jour: date) -> bool:
+    """Les [occupations] laissent-elles le temps de manger le [jour] venu? Voir
+    `planning_model.pauses_repas`."""
+    for service_début, service_fin in [
+        (début_service_midi, fin_service_midi),
+        (début_service_soir, fin_service_soir),
+    ]:
+        curseur = datetime.combine(jour, service_début)
+        fin_du_service = datetime.combine(jour, service_fin)
+        libre = False
+        for _, d, f in sorted(occupations, key=lambda o: o[1]):
+            if d.date() != jour or f <= curseur or d >= fin_du_service:
+                continue
+            libre = libre or d - curseur >= durée_repas
+            curseur = max(curseur, f)
+        libre = libre or fin_du_service - curseur >= durée_repas
+        if not libre:
+            return False
+    return True
+
+
+""" Écriture dans les formats des imports """
+
+
+def id_de(x) -> str:
+    return x if isinstance(x, str) else x.id
+
+
+def date_excel(d: Optional[datetime]):
+    if d is None:
+        return ""
+    return (d - datetime(1899, 12, 30)) / timedelta(days=1)
+
+
+def plages(heures: List[time]) -> str:
+    return ", ".join(f"{h.hour:0=2d}h - {(h.hour + 1) % 24:0=2d}h" for h in heures)
+
+
+def vers_gapi(registre: Registre) -> Dict[str, List[Dict]]:
+    """Les données comme les renvoie `import_gapi_req.get`."""
+    return {
+        "types_de_quêtes": [
+            {
+                "id": t.id,
+                "nom": t.nom,
+                "découpable": t.sécable,
+                "only_spe": t.spécialiste_only,
+            }
+            for t in registre.types.values()
+        ],
+        "lieux": [{"id": l.id, "nom": l.nom} for l in registre.lieux.values()],
+        "bénévoles": [
+            {
+                "id": b.id,
+                "pseudo": b.surnom,
+                "heures_théoriques": b.heures_théoriques,
+                "h_indispos": plages(b.indisponibilités),
+                "h_contraints": plages(
+                    [h for h, p in b.pref_horaires.items() if p < 0]
+                ),
+                "h_prefs": plages([h for h, p in b.pref_horaires.items() if p > 0]),
+                "amis": ",".join(map(id_de, b.binômes_préférés)),
+                "ennemis": ",".join(map(id_de, b.binômes_interdits)),
+                "quêtes_interdites": ",".join(map(id_de, b.types_de_quête_interdits)),
+                "spécialités": ",".join(map(id_de, b.spécialités)),
+                "arrivée": date_excel(b.date_arrivée),
+                "départ": date_excel(b.date_départ),
+            }
+            for b in registre.bénévoles.values()
+        ],
+        "quêtes": [
+            {
+                "id": q.id,
+                "nom": q.nom,
+                "types": ",".join(t.id for t in q.types),
+                "lieu": q.lieu.id,
+                "nombre_bénévoles": q.nombre_bénévoles,
+                "début": date_excel(q.début),
+                "fin": date_excel(q.fin),
+                "découpable": False,
+                "fixés": ",".join(map(id_de, q.bénévoles)),
+            }
+            for q in registre.quêtes
+        ],
+    }
+
+
+def écrire_gapi(fichier: str, registre: Optional[Registre] = None):
+    with open(fichier, "w") as f:
+        json.dump(vers_gapi(registre or registre_courant()), f, ensure_ascii=False)
+
+
+# Les options des préférences horaires dans Notion
+préférence_notion = {None: "E>t^", -1: "P;>X", 0: None, 1: "Sa=z"}
+
+
+def titre(texte: str):
+    return {"title": [{"plain_text": texte}]}
+
+
+def texte_riche(texte: str):
+    return {"rich_text": [{"plain_text": texte}]}
+
+
+def relation(ids: List[str]):
+    return {"relation": [{"id": id} for id in ids]}
+
+
+def clé_horaire_notion(h: int) -> str:
+    début = "9" if h == 9 else f"{h:0=2d}"
+    return f"{début}h - {(h + 1) % 24:0=2d}h"
+
+
+def vers_notion(registre: Registre) -> Dict:
+    """Les données comme l'export Notion lu par `import_json.from_file`. Une
+    page par id de quête, la première: import_json recrée les copies des jours
+    suivants, le [registre] doit donc venir de `générer(recopies=True)`."""
+    pages: Dict[str, Quête] = {}
+    for q in sorted(registre.quêtes, key=lambda q: q.début):
+        pages.setdefault(q.id, q)
+    recréées = sum(
+        1 if all("Affichage" in t.nom for t in q.types) else 1 + jours_recopiés
+        for q in pages.values()
+    )
+    if recréées != len(registre.quêtes):
+        raise ValueError(
+            f"import_json lirait {recréées} quêtes au lieu de "
+            f"{len(registre.quêtes)}, voir générer(recopies=True)"
+        )
+
+    def bénévole(b: Bénévole):
+        props = {
+            "Pseudo": titre(b.surnom),
+            "Prénom": texte_riche(b.prénom),
+            "Nom": texte_riche(b.nom),
+            "Team Sérénité": {"checkbox": False},
+            "heures théoriques par jour": {"number": b.heures_théoriques},
+            "Date départ": {
+                "date": (
+                    {"start": b.date_départ.isoformat()} if b.date_départ else None
+                )
+            },
+            "type de Quete interdit": relation(map(id_de, b.types_de_quête_interdits)),
+        }
+        for h in heures_des_formulaires:
+            pref = b.pref_horaires.get(time(hour=h))
+            option = préférence_notion[pref]
+            props[clé_horaire_notion(h)] = {
+                "select": {"id": option} if option else None
+            }
+        return {"id": b.id, "properties": props}
+
+    def quête(q: Quête):
+        return {
+            "id": q.id,
+            "properties": {
+                "Name": titre(q.nom),
+                "Needed": {"number": q.nombre_bénévoles},
+                "Place": relation([q.lieu.id] if q.lieu else []),
+                "Type de Quete": relation([t.id for t in q.types]),
+                "Horaire": {
+                    "date": {"start": q.début.isoformat(), "end": q.fin.isoformat()}
+                },
+                "Bénévoles vérouillés": relation(map(id_de, q.bénévoles)),
+                "Spectacle": relation([q.spectacle.id] if q.spectacle else []),
+            },
+        }
+
+    return {
+        "shows": {
+            "pages": [
+                {"id": s.id, "properties": {"Nom": titre(s.nom)}}
+                for s in registre.spectacles.values()
+            ]
+        },
+        "places": {
+            "pages": [
+                {"id": l.id, "properties": {"Name": titre(l.nom)}}
+                for l in registre.lieux.values()
+            ]
+        },
+        "questsTypes": {
+            "pages": [
+                {
+                    "id": t.id,
+                    "properties": {
+                        "Name": titre(t.nom),
+                        "Découpable ?": {"checkbox": t.sécable},
+                    },
+                }
+                for t in registre.types.values()
+            ]
+        },
+        "volunteers": {"pages": [bénévole(b) for b in registre.bénévoles.values()]},
+        "quests": {"pages": [quête(q) for q in pages.values()]},
+    }
+
+
+def écrire_json(fichier: str, registre: Optional[Registre] = None):
+    with open(fichier, "w") as f:
+        json.dump(vers_notion(registre or registre_courant()), f, ensure_ascii=False)
+
+
+# Les réponses du formulaire des préférences horaires
+préférence_csv = {
+    None: "indisponible",
+    -1: "Dispo sous la contrainte",
+    0: "Dispo",
+    1: "Dispo et horaire de prédilection",
+}
+
+
+def horaire_csv(début: datetime, fin: datetime) -> str:
+    format = "%d/%m/%Y %H:%M"
+    return f"{début.strftime(format)} (CEST) → {fin.strftime(format)} (CEST)"
+
+
+def écrire_csv(dossier: str, registre: Optional[Registre] = None):
+    """Écrit les quatre fichiers lus par `import_csv`, dans cet ordre: lieux,
+    types, bénévoles et quêtes."""
+    registre = registre or registre_courant()
+    os.makedirs(dossier, exist_ok=True)
+
+    def écrire(nom, colonnes, lignes):
+        with open(
+            os.path.join(dossier, nom), "w", newline="", encoding="utf-8-sig"
+        ) as f:
+            writer = csv.DictWriter(f, fieldnames=colonnes, quoting=csv.QUOTE_ALL)
+            writer.writeheader()
+            writer.writerows(lignes)
+
+    écrire("Lieux.csv", ["Name"], [{"Name": l.nom} for l in registre.lieux.values()])
+    écrire(
+        "Types.csv",
+        ["Name", "Découpable ? "],
+        [
+            {"Name": t.nom, "Découpable ? ": "oui" if t.sécable else "non"}
+            for t in registre.types.values()
+        ],
+    )
+    heures = [f"{h:0=2d}H{(h + 1) % 24:0=2d}H" for h in heures_des_formulaires]
+    écrire(
+        "Bénévoles.csv",
+        ["Name", "Prénom", "Full Name", "heures théoriques par jour"] + heures,
+        [
+            dict(
+                {
+                    "Name": b.surnom,
+                    "Prénom": b.prénom,
+                    "Full Name": f"{b.prénom} {b.nom}",
+                    "heures théoriques par jour": b.heures_théoriques,
+                },
+                **{
+                    colonne: préférence_csv[b.pref_horaires.get(time(hour=h))]
+                    for colonne, h in zip(heures, heures_des_formulaires)
+                },
+            )
+            for b in registre.bénévoles.values()
+        ],
+    )
+    écrire(
+        "Quetes.csv",
+        ["Name", "Place", "Type de Quete", "Horaire", "Needed"],
+        [
+            {
+                "Name": q.nom,
+                "Place": f"{q.lieu.nom} (https://www.notion.so/{q.lieu.id})",
+                "Type de Quete": ", ".join(
+                    f"{t.nom} (https://www.notion.so/{t.id})" for t in q.types
+                ),
+                "Horaire": horaire_csv(q.début, q.fin),
+                "Needed": q.nombre_bénévoles,
+            }
+            for q in registre.quêtes
+        ],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jeux de données synthétiques")
+    parser.add_argument("--bénévoles", type=int, default=60)
+    parser.add_argument("--quêtes", type=int, default=150)
+    parser.add_argument("--jours", type=int, default=5)
+    parser.add_argument("--lieux", type=int, default=6)
+    parser.add_argument("--types", type=int, default=8)
+    parser.add_argument("--ratio-sécable", type=float, default=0.3)
+    parser.add_argument("--part-spécialistes", type=float, default=0.15)
+    parser.add_argument("--densité-disponibilité", type=float, default=0.85)
+    parser.add_argument("--densité-amis", type=float, default=0.05)
+    parser.add_argument("--densité-ennemis", type=float, default=0.01)
+    parser.add_argument("--ratio-préassignées", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="fichier pour import_json")
+    parser.add_argument("--csv", help="dossier pour import_csv")
+    parser.add_argument("--gapi", help="fichier des feuilles Google")
+    args = parser.parse_args()
+
+    générer(
+        bénévoles=args.bénévoles,
+        quêtes=args.quêtes,
+        jours=args.jours,
+        lieux=args.lieux,
+        types=args.types,
+        ratio_sécable=args.ratio_sécable,
+        part_spécialistes=args.part_spécialistes,
+        densité_disponibilité=args.densité_disponibilité,
+        densité_amis=args.densité_amis,
+        densité_ennemis=args.densité_ennemis,
+        ratio_préassignées=args.ratio_préassignées,
+        seed=args.seed,
+        # Les mêmes quêtes dans tous les formats demandés
+        recopies=args.json is not None,
+    )
+    if args.json:
+        écrire_json(args.json)
+    if args.csv:
+        écrire_csv(args.csv)
+    if args.gapi:
+        écrire_gapi(args.gapi)
+    print(
+        f"{len(registre_courant().bénévoles)} bénévoles, "
+        f"{len(registre_courant().quêtes)} quêtes sur {args.jours} jours"
+    )
+
+
+if __name__ == "__main__":
+    main()
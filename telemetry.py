@@ -0,0 +1,280 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional
+import json, re, threading, time
+
+""" Télémétrie de la résolution
+
+Une `Télémétrie` écrit une ligne JSON par évènement: chaque solution (depuis
+`solution_callback.Rapporteur_de_solutions`), chaque amélioration de la borne
+lue dans le journal de CP-SAT, et périodiquement l'état courant. Chaque ligne
+donne le temps, l'objectif, la meilleure borne, l'écart relatif entre les deux
+et le nombre de solutions.
+
+`analyser_journal` relit le journal complet de CP-SAT: la réduction du modèle
+par le presolve, les règles appliquées, et les tableaux de fin de résolution
+(améliorations des voisinages LNS, solutions et bornes trouvées par chaque
+sous-solveur...). Le `résumé` s'en sert pour dire si plus de temps, plus de
+cœurs ou un autre modèle aideraient. """
+
+
+def écart(objectif: Optional[float], borne: Optional[float]) -> Optional[float]:
+    if objectif is None or borne is None:
+        return None
+    return abs(objectif - borne) / max(abs(objectif), 1)
+
+
+# "#3       4.97s best:81935 next:[64121,81934] rnd_cst_lns (d=5.00e-01 ...)"
+# ou "#Bound   2.24s best:86237 next:[51836,86236] bool_core (...)"
+progression = re.compile(
+    r"^#(\d+|Bound|Done|Model)\s+([\d.]+)s\s+best:(\S+)\s+next:\[(-?[\d.e+]+),?(-?[\d.e+]*)\]\s*([^\s(]*)"
+)
+
+
+class Télémétrie:
+    """Écrit les évènements de la résolution dans [fichier] (JSON lines),
+    et l'état courant toutes les [période] secondes."""
+
+    def __init__(self, fichier: str, période: float = 5.0):
+        self.fichier = open(fichier, "w")
+        self.période = période
+        self.début = time.perf_counter()
+        self.objectif: Optional[float] = None
+        self.borne: Optional[float] = None
+        self.solutions = 0
+        self.première_solution: Optional[float] = None
+        self.dernière_amélioration: Optional[float] = None
+        self.lignes_du_journal: List[str] = []
+        self._verrou = threading.Lock()
+        self._fini = threading.Event()
+        self._thread = threading.Thread(
+            target=self._boucle, name="télémétrie", daemon=True
+        )
+
+    def __enter__(self):
+        self.début = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.fermer()
+
+    def écrire(self, évènement: str, temps: float):
+        ligne = {
+            "event": évènement,
+            "time": round(temps, 3),
+            "objective": self.objectif,
+            "best_bound": self.borne,
+            "gap": écart(self.objectif, self.borne),
+            "solutions": self.solutions,
+        }
+        self.fichier.write(json.dumps(ligne) + "\n")
+
+    def solution(self, temps: float, objectif: float, borne: float):
+        """Appelé par le callback du solveur à chaque solution."""
+        with self._verrou:
+            self.solutions += 1
+            if self.première_solution is None:
+                self.première_solution = temps
+            if self.objectif is None or objectif != self.objectif:
+                self.dernière_amélioration = temps
+            self.objectif = objectif
+            self.borne = borne
+            self.écrire("solution", temps)
+
+    def ligne_du_journal(self, ligne: str):
+        """À appeler pour chaque ligne du journal de CP-SAT (voir
+        `log_callback`)."""
+        # Un même message peut faire plusieurs lignes (les tableaux de fin)
+        for ligne in ligne.split("\n"):
+            self.lignes_du_journal.append(ligne)
+            m = progression.match(ligne)
+            if m is None or m.group(1) != "Bound":
+                continue
+            # La borne inférieure d'une minimisation est le début de "next"
+            borne = float(m.group(4))
+            with self._verrou:
+                if borne != self.borne:
+                    self.borne = borne
+                    self.écrire("bound", float(m.group(2)))
+
+    def _boucle(self):
+        while not self._fini.wait(self.période):
+            with self._verrou:
+                self.écrire("tick", time.perf_counter() - self.début)
+                self.fichier.flush()
+
+    def fermer(self):
+        self._fini.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        with self._verrou:
+            self.écrire("end", time.perf_counter() - self.début)
+        self.fichier.close()
+
+    def résumé(self, statistiques: Optional[Dict] = None) -> str:
+        """Le bilan de la résolution, à partir des [statistiques] de
+        `analyser_journal` si elles sont données."""
+        statistiques = statistiques or analyser_journal(self.lignes_du_journal)
+        réponse = statistiques.get("response", {})
+        durée = réponse.get("walltime", time.perf_counter() - self.début)
+        lignes = ["Télémétrie:"]
+        if self.première_solution is None:
+            lignes.append(f"- aucune solution en {durée:.1f}s")
+        else:
+            lignes.append(
+                f"- {self.solutions} solutions, la première à "
+                f"{self.première_solution:.1f}s, la dernière amélioration à "
+                f"{self.dernière_amélioration:.1f}s sur {durée:.1f}s"
+            )
+            g = écart(self.objectif, self.borne)
+            if g is not None:
+                lignes.append(
+                    f"- objectif {self.objectif:g}, borne {self.borne:g}, écart {g:.1%}"
+                )
+        presolve = statistiques.get("presolve", {})
+        if "variables" in presolve and "presolved_variables" in presolve:
+            lignes.append(
+                f"- presolve: {presolve['variables']} -> "
+                f"{presolve['presolved_variables']} variables, "
+                f"{presolve['constraints']} -> {presolve['presolved_constraints']} "
+                f"contraintes"
+            )
+        améliorations = statistiques.get("improvements", {})
+        if améliorations:
+            meilleurs = sorted(améliorations.items(), key=lambda kv: -kv[1])
+            lignes.append(
+                "- améliorations par sous-solveur: "
+                + ", ".join(f"{nom} {n}" for nom, n in meilleurs)
+            )
+        lignes += [f"- {conseil}" for conseil in conseils(self, durée, statistiques)]
+        return "\n".join(lignes)
+
+
+def conseils(télémétrie: Télémétrie, durée: float, statistiques: Dict) -> List[str]:
+    conseils = []
+    réponse = statistiques.get("response", {})
+    if réponse.get("status") == "OPTIMAL":
+        return ["solution optimale, rien à gagner"]
+    if télémétrie.première_solution is None:
+        return [
+            "pas de solution: voir l'analyse de capacité (feasibility.py) et le "
+            "diagnostic (diagnosis.py) avant de donner plus de temps"
+        ]
+    g = écart(télémétrie.objectif, télémétrie.borne)
+    if télémétrie.dernière_amélioration > 0.8 * durée:
+        conseils.append(
+            "l'objectif s'améliorait encore à la fin: plus de temps aiderait"
+        )
+    elif télémétrie.dernière_amélioration < 0.5 * durée:
+        conseils.append(
+            "l'objectif stagne depuis la moitié du temps: plus de temps n'aidera "
+            "guère, d'autres paramètres (tuning.py) ou un autre modèle peut-être"
+        )
+    if g is not None and g > 0.2:
+        conseils.append(
+            "l'écart reste grand: la borne est faible, la relaxation du modèle "
+            "gagnerait à être renforcée"
+        )
+    lns = statistiques.get("tables", {}).get("LNS stats", {})
+    appels = 0
+    for valeurs in lns.values():
+        _, _, total = str(valeurs.get("Improv/Calls", "0/0")).partition("/")
+        appels += int(total or 0)
+    if lns and appels < 10 * len(lns):
+        conseils.append(
+            "les voisinages LNS ont été peu appelés: plus de cœurs (num_workers) "
+            "leur laisseraient plus de place"
+        )
+    return conseils
+
+
+""" Analyse du journal de CP-SAT """
+
+
+def écrire_statistiques(statistiques: Dict, fichier: str):
+    with open(fichier, "w") as f:
+        json.dump(statistiques, f, indent=2, ensure_ascii=False)
+
+
+def nombre(texte: str):
+    """Les nombres du journal, avec ' pour séparer les milliers."""
+    texte = texte.replace("'", "")
+    for conversion in (int, float):
+        try:
+            return conversion(texte)
+        except ValueError:
+            pass
+    return texte
+
+
+modèle = re.compile(r"^#Variables: ([\d']+)")
+contraintes = re.compile(r"^#k\w+: ([\d']+)")
+règle = re.compile(r"^\s+- rule '(.*)' was applied ([\d']+) times?\.")
+ligne_de_tableau = re.compile(r"^\s+'([^']+)':\s+(.*)$")
+
+
+def analyser_journal(lignes: List[str]) -> Dict:
+    """Les statistiques d'un journal de CP-SAT (`log_search_progress`)."""
+    presolve: Dict = {}
+    règles: Dict[str, int] = {}
+    améliorations: Dict[str, int] = {}
+    tableaux: Dict[str, Dict[str, Dict]] = {}
+    réponse: Dict = {}
+    modèles = []  # (variables, contraintes) du modèle initial puis réduit
+    tableau: Optional[(str, List[str])] = None
+    dans_la_réponse = False
+    for ligne in lignes:
+        if ligne.startswith("CpSolverResponse summary"):
+            dans_la_réponse = True
+            continue
+        if dans_la_réponse:
+            clé, _, valeur = ligne.partition(":")
+            if valeur:
+                réponse[clé.strip()] = nombre(valeur.strip())
+            continue
+        m = modèle.match(ligne)
+        if m:
+            modèles.append([nombre(m.group(1)), 0])
+            continue
+        m = contraintes.match(ligne)
+        if m and modèles:
+            modèles[-1][1] += nombre(m.group(1))
+            continue
+        m = règle.match(ligne)
+        if m:
+            règles[m.group(1)] = nombre(m.group(2))
+            continue
+        m = progression.match(ligne)
+        if m:
+            if m.group(1).isdigit() and m.group(6):
+                améliorations[m.group(6)] = améliorations.get(m.group(6), 0) + 1
+            continue
+        m = ligne_de_tableau.match(ligne)
+        if m and tableau is not None:
+            titre, colonnes = tableau
+            valeurs = m.group(2).split()
+            if len(valeurs) == len(colonnes):
+                tableaux[titre][m.group(1)] = dict(zip(colonnes, map(nombre, valeurs)))
+            else:
+                tableaux[titre][m.group(1)] = m.group(2)
+            continue
+        if ligne and not ligne[0].isspace() and "  " in ligne:
+            # Un titre de tableau suivi des noms de ses colonnes
+            titre, *colonnes = re.split(r"\s{2,}", ligne.strip())
+            # "Solutions (12)" donne le nombre de solutions
+            titre = re.sub(r" \(\d+\)$", "", titre)
+            tableau = (titre, colonnes)
+            tableaux[titre] = {}
+        elif ligne.strip() == "":
+            tableau = None
+    if modèles:
+        presolve["variables"], presolve["constraints"] = modèles[0]
+    if len(modèles) > 1:
+        presolve["presolved_variables"], presolve["presolved_constraints"] = modèles[1]
+    presolve["rules"] = règles
+    return {
+        "presolve": presolve,
+        "improvements": améliorations,
+        "tables": {titre: t for titre, t in tableaux.items() if t},
+        "response": réponse,
+    }
@@ -0,0 +1,185 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional
+from itertools import product
+import argparse, csv, json, os, statistics
+from ortools.sat.python import cp_model
+from portfolio import résoudre_proto, paramètres_texte
+
+""" Banc d'essai des paramètres du solveur
+
+Résout des modèles déjà construits (les `model.pb.txt.gz` écrits dans les
+dossiers de runs/ ou dans le cache des modèles) avec chaque combinaison d'une
+grille de paramètres, pour plusieurs graines et un temps limite fixe. Pour
+chaque essai on relève le temps jusqu'à la première solution, le temps jusqu'à
+une solution à moins de X% de la meilleure connue pour ce modèle et l'écart
+final, le tout dans un tableau CSV et JSON.
+
+Une dimension de la grille dont les valeurs sont des dictionnaires fait varier
+plusieurs paramètres ensemble, comme "presolve" ci-dessous: chaque variante du
+presolve est comparée aux autres sans multiplier la grille par le nombre de
+paramètres qu'elle touche.
+
+    python tuning.py runs/*/model.pb.txt.gz --temps 30 --graines 3
+"""
+
+grille_par_défaut: Dict[str, List] = {
+    "num_workers": [8],
+    "linearization_level": [0, 1, 2],
+    "symmetry_level": [0, 2],
+    "interleave_search": [False, True],
+    "presolve": [
+        {},  # les valeurs par défaut
+        {"cp_model_presolve": False},
+        {"cp_model_probing_level": 0},
+        {"max_presolve_iterations": 1},
+    ],
+}
+
+
+def combinaisons(grille: Dict[str, List]) -> List[Dict]:
+    noms = list(grille.keys())
+    configurations = []
+    for valeurs in product(*grille.values()):
+        configuration = {}
+        for nom, valeur in zip(noms, valeurs):
+            if isinstance(valeur, dict):
+                configuration.update(valeur)
+            else:
+                configuration[nom] = valeur
+        configurations.append(configuration)
+    return configurations
+
+
+def essayer(fichier: str, configuration: Dict, graine: int, temps: float) -> Dict:
+    paramètres = cp_model.CpSolver().parameters
+    texte = paramètres_texte(
+        paramètres, max_time_in_seconds=temps, random_seed=graine, **configuration
+    )
+    résultat = résoudre_proto(fichier, texte)
+    return {
+        "model": fichier,
+        "configuration": configuration,
+        "seed": graine,
+        "status": résultat["status"],
+        "objective": résultat["objective"],
+        "best_bound": résultat["best_bound"],
+        "wall_time": résultat["wall_time"],
+        "progress": résultat["progress"],
+    }
+
+
+def relatif(valeur: float, référence: float) -> float:
+    return valeur / max(abs(référence), 1)
+
+
+def mesurer(essais: List[Dict], à_moins_de: float):
+    """Complète les [essais] avec les mesures relatives à la meilleure solution
+    connue de leur modèle."""
+    meilleurs: Dict[str, float] = {}
+    for e in essais:
+        if e["objective"] is not None:
+            meilleur = meilleurs.get(e["model"], e["objective"])
+            meilleurs[e["model"]] = min(meilleur, e["objective"])
+    for e in essais:
+        meilleur = meilleurs.get(e["model"])
+        progression = e["progress"]
+        e["time_to_first_solution"] = progression[0][0] if progression else None
+        e["time_to_within"] = next(
+            (
+                t
+                for t, objectif in progression
+                if relatif(objectif - meilleur, meilleur) <= à_moins_de
+            ),
+            None,
+        )
+        e["gap"] = None
+        e["gap_to_best"] = None
+        if e["objective"] is not None:
+            e["gap"] = relatif(e["objective"] - e["best_bound"], e["objective"])
+            e["gap_to_best"] = relatif(e["objective"] - meilleur, meilleur)
+
+
+colonnes = [
+    "model",
+    "configuration",
+    "seed",
+    "status",
+    "objective",
+    "best_bound",
+    "wall_time",
+    "time_to_first_solution",
+    "time_to_within",
+    "gap",
+    "gap_to_best",
+]
+
+
+def écrire(essais: List[Dict], sortie: str):
+    with open(f"{sortie}.json", "w") as f:
+        json.dump(essais, f, indent=2)
+    with open(f"{sortie}.csv", "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=colonnes, extrasaction="ignore")
+        writer.writeheader()
+        for e in essais:
+            writer.writerow(dict(e, configuration=json.dumps(e["configuration"])))
+
+
+def résumé(essais: List[Dict]) -> str:
+    """Les configurations, de la meilleure à la pire en écart moyen à la
+    meilleure solution connue."""
+    par_configuration: Dict[str, List[Dict]] = {}
+    for e in essais:
+        clé = json.dumps(e["configuration"], sort_keys=True)
+        par_configuration.setdefault(clé, []).append(e)
+
+    def moyenne(es, mesure) -> Optional[float]:
+        valeurs = [e[mesure] for e in es if e[mesure] is not None]
+        return statistics.mean(valeurs) if valeurs else None
+
+    lignes = []
+    for clé, es in par_configuration.items():
+        écart = moyenne(es, "gap_to_best")
+        première = moyenne(es, "time_to_first_solution")
+        lignes.append(
+            (
+                écart if écart is not None else float("inf"),
+                f"{clé}: écart {écart}, première solution {première}s",
+            )
+        )
+    return "\n".join(l for _, l in sorted(lignes))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Banc d'essai des paramètres du solveur"
+    )
+    parser.add_argument("modèles", nargs="+", help="fichiers model.pb.txt.gz")
+    parser.add_argument("--grille", help="grille de paramètres au format JSON")
+    parser.add_argument("--temps", type=float, default=30.0)
+    parser.add_argument("--graines", type=int, default=3)
+    parser.add_argument("--à-moins-de", type=float, default=0.01)
+    parser.add_argument("--sortie", default="runs/tuning")
+    args = parser.parse_args()
+
+    grille = grille_par_défaut
+    if args.grille:
+        with open(args.grille) as f:
+            grille = json.load(f)
+
+    essais = []
+    configurations = combinaisons(grille)
+    total = len(args.modèles) * len(configurations) * args.graines
+    for fichier in args.modèles:
+        for configuration in configurations:
+            for graine in range(1, args.graines + 1):
+                print(f"[{len(essais) + 1}/{total}] {fichier} {configuration} {graine}")
+                essais.append(essayer(fichier, configuration, graine, args.temps))
+
+    mesurer(essais, args.à_moins_de)
+    os.makedirs(os.path.dirname(args.sortie) or ".", exist_ok=True)
+    écrire(essais, args.sortie)
+    print(résumé(essais))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional
+from datetime import datetime
+import glob, json, os
+from data_model import Quête
+from planning_model import Contexte
+from symmetry import ranger
+
+""" Démarrage à chaud
+
+Reprend les assignations d'un `results.json` précédent (voir
+`export_json_web.py`) comme indices pour le solveur. Comme pour le serveur
+(`Context.apply_hints`), les bénévoles d'une quête sont indiqués comme
+assignés, et si la quête était complète, tous les autres comme non assignés.
+
+Les bénévoles sont retrouvés par leur id, les quêtes par leur id et leur début
+(`Quête.clé`): import_json donne le même id aux copies d'une quête sur
+plusieurs jours. Les assignations qui ne correspondent plus à rien dans le
+modèle sont ignorées et signalées. Les
+plannings des bénévoles interchangeables sont d'abord permutés dans l'ordre
+qu'impose le modèle, voir symmetry.py. """
+
+
+def dernier_résultat(dossier="runs", sauf: Optional[str] = None) -> Optional[str]:
+    """Le `results.json` le plus récent des exécutions précédentes."""
+    résultats = [
+        f
+        for f in glob.glob(os.path.join(dossier, "*", "results.json"))
+        if sauf is None or os.path.dirname(f) != sauf
+    ]
+    if résultats == []:
+        return None
+    return max(résultats, key=os.path.getmtime)
+
+
+def charger_assignations(fichier: str) -> Dict[(str, datetime), List[str]]:
+    """Les ids des bénévoles de chaque quête, par `Quête.clé`."""
+    with open(fichier) as f:
+        résultat = json.load(f)
+    return {
+        (q["id"], datetime.fromisoformat(q["start"])): q["volunteers"]
+        for q in résultat["quests"]
+    }
+
+
+class Indices:
+    """Les indices ajoutés au modèle et les assignations précédentes
+    abandonnées, par raison."""
+
+    def __init__(self):
+        self.assignés = 0
+        self.non_assignés = 0
+        self.quêtes_inconnues: List[(str, datetime)] = []
+        self.bénévoles_inconnus: List[str] = []
+        self.inéligibles: List[(str, str)] = []
+
+    def rapport(self) -> str:
+        lignes = [
+            f"Démarrage à chaud: {self.assignés} assignations et {self.non_assignés} non-assignations indiquées",
+            f"- quêtes disparues: {len(self.quêtes_inconnues)}",
+            f"- bénévoles disparus: {len(self.bénévoles_inconnus)}",
+            f"- assignations devenues impossibles: {len(self.inéligibles)}",
+        ]
+        for id_q, début in self.quêtes_inconnues:
+            lignes.append(f"  - quête {id_q} ({début.isoformat()})")
+        for id_b in self.bénévoles_inconnus:
+            lignes.append(f"  - bénévole {id_b}")
+        for b, q in self.inéligibles:
+            lignes.append(f"  - {b} ne peut plus faire {q}")
+        return "\n".join(lignes)
+
+
+def ajouter_indices(
+    ctx: Contexte, précédentes: Dict[(str, datetime), List[str]]
+) -> Indices:
+    """Indique les [précédentes] assignations (voir `charger_assignations`).
+    Si plusieurs quêtes ont encore la même clé, chacune reçoit les indices."""
+    indices = Indices()
+    précédentes = ranger(ctx, précédentes)
+    quêtes: Dict[(str, datetime), List[Quête]] = {}
+    for q in ctx.quêtes:
+        quêtes.setdefault(q.clé(), []).append(q)
+    bénévoles = {b.id: b for b in ctx.bénévoles}
+    inconnus = set()
+    for clé, ids_b in précédentes.items():
+        if clé not in quêtes:
+            indices.quêtes_inconnues.append(clé)
+            continue
+        for q in quêtes[clé]:
+            assignés = set()
+            for id_b in ids_b:
+                b = bénévoles.get(id_b)
+                if b is None:
+                    inconnus.add(id_b)
+                elif (b, q) not in ctx.assignations:
+                    indices.inéligibles.append((b, q))
+                else:
+                    assignés.add(b)
+                    ctx.model.add_hint(ctx.assignations[(b, q)], 1)
+                    indices.assignés += 1
+            if len(assignés) == q.nombre_bénévoles:
+                for b in ctx.bénévoles:
+                    if b not in assignés and (b, q) in ctx.assignations:
+                        ctx.model.add_hint(ctx.assignations[(b, q)], 0)
+                        indices.non_assignés += 1
+    indices.bénévoles_inconnus = sorted(inconnus)
+    return indices
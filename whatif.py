@@ -0,0 +1,401 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict, Optional, Callable
+from datetime import date, time, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse, json, threading
+from ortools.sat.python import cp_model
+from data_model import Bénévole, Quête, Registre, Index_des_quêtes, utiliser
+from planning_model import Contexte, construire
+from eligibility import Éligibilité
+from decomposition import familles_couplant_les_jours
+from warm_start import ajouter_indices, charger_assignations
+
+""" Service de simulation
+
+Garde en mémoire les données d'un festival et le dernier planning, et répond à
+des questions du genre « et si Loua partait jeudi midi ? » sans tout réimporter
+ni repartir de zéro. Chaque requête applique une liste de modifications aux
+données puis ne résout à nouveau que les jours qu'elles touchent, à partir du
+planning courant (voir `warm_start.ajouter_indices`) et sans les familles qui
+lient les jours entre eux, comme decomposition.py. Seules les quêtes de ces
+jours peuvent changer. Une exécution complète de lbc24 rééquilibre ensuite la
+semaine.
+
+L'index et la matrice d'éligibilité de chaque jour (voir eligibility.py) sont
+gardés en mémoire: une modification ne recalcule que les lignes des bénévoles
+qu'elle touche, pour les jours touchés. Le modèle CP-SAT, lui, est reconstruit
+à chaque requête pour les seuls jours à résoudre: ses contraintes dépendent des
+modifications et il ne se modifie pas simplement.
+
+    python whatif.py --json data/db.json --plan runs/<date>/results.json
+
+    curl localhost:8765/patch -d '{"patches": [{"type": "départ",
+      "bénévole": "...", "date": "2025-07-03T12:00"}], "essai": true}'
+
+Les modifications:
+- {"type": "départ" ou "arrivée", "bénévole": id, "date": iso ou null}
+- {"type": "indisponibilité", "bénévole": id, "heure": h}, chaque jour
+- {"type": "effectif", "quête": id, "nombre": n}
+- {"type": "verrou", "quête": id, "bénévole": id}
+Une quête peut être précisée par "début": iso quand plusieurs ont le même id
+(les copies d'une quête sur plusieurs jours de import_json).
+
+Avec "essai", les données et le planning sont remis en l'état après la
+réponse. Une modification qui rend le planning impossible est aussi annulée. """
+
+
+class Modification_invalide(ValueError):
+    pass
+
+
+class Planificateur:
+    def __init__(self, registre: Registre, paramètres):
+        self.registre = registre
+        # Les paramètres du solveur après une modification
+        self.paramètres = paramètres
+        self.plan: Dict[Quête, List[Bénévole]] = {}
+        self.verrou = threading.Lock()
+        # Calculés à la demande puis tenus à jour par `modifier`
+        self.index_par_jour: Dict[date, Index_des_quêtes] = {}
+        self.éligibilités: Dict[date, Éligibilité] = {}
+
+    """ Modifications """
+
+    def bénévole(self, id: str) -> Bénévole:
+        b = self.registre.bénévoles.get(id)
+        if b is None:
+            raise Modification_invalide(f"bénévole inconnu: {id}")
+        return b
+
+    def quête(self, id: str, début: Optional[str] = None) -> Quête:
+        """La quête [id]. Un import peut créer plusieurs quêtes de même id
+        (import_json les recopie sur plusieurs jours), [début] les départage
+        alors: `quêtes_par_id` ne garde que la dernière."""
+        quêtes = [q for q in self.registre.quêtes if q.id == id]
+        if début is not None:
+            d = self.instant(début)
+            quêtes = [q for q in quêtes if q.début == d]
+        if quêtes == []:
+            raise Modification_invalide(f"quête inconnue: {id} {début or ''}".strip())
+        if len(quêtes) > 1:
+            débuts = ", ".join(q.début.isoformat() for q in quêtes)
+            raise Modification_invalide(
+                f'quête ambiguë: {id}, préciser "début" parmi {débuts}'
+            )
+        return quêtes[0]
+
+    def instant(self, texte: Optional[str]) -> Optional[datetime]:
+        if texte is None:
+            return None
+        d = datetime.fromisoformat(texte)
+        origine = self.registre.index.origine
+        if d.tzinfo is None and origine is not None:
+            d = d.replace(tzinfo=origine.tzinfo)
+        return d
+
+    def jours_entre(self, a: Optional[datetime], b: Optional[datetime], après: bool):
+        """Les jours des quêtes dont l'éligibilité change quand une date de
+        présence passe de [a] à [b]."""
+        bornes = [d for d in (a, b) if d is not None]
+        if a == b or bornes == []:
+            return set()
+        if après:
+            borne = min(bornes)
+            return {q.jour for q in self.registre.quêtes if q.fin > borne}
+        borne = max(bornes)
+        return {q.jour for q in self.registre.quêtes if q.début < borne}
+
+    def modifier(self, patch: Dict) -> (Callable[[], None], set[date], set[Bénévole]):
+        """Applique [patch] aux données. Renvoie de quoi l'annuler, les jours
+        touchés et les bénévoles dont l'éligibilité a pu changer ces jours là."""
+        genre = patch.get("type")
+        if genre == "départ":
+            b = self.bénévole(patch["bénévole"])
+            avant, après = b.date_départ, self.instant(patch["date"])
+            b.date_départ = après
+            return (
+                lambda: setattr(b, "date_départ", avant),
+                self.jours_entre(avant, après, après=True),
+                {b},
+            )
+        if genre == "arrivée":
+            b = self.bénévole(patch["bénévole"])
+            avant, après = b.date_arrivée, self.instant(patch["date"])
+            b.date_arrivée = après
+            return (
+                lambda: setattr(b, "date_arrivée", avant),
+                self.jours_entre(avant, après, après=False),
+                {b},
+            )
+        if genre == "indisponibilité":
+            b = self.bénévole(patch["bénévole"])
+            heure = time(hour=int(patch["heure"]))
+            if heure in b.indisponibilités:
+                return (lambda: None), set(), set()
+            b.indisponibilités.append(heure)
+            return (
+                lambda: b.indisponibilités.remove(heure),
+                set(self.registre.index.par_jour.keys()),
+                {b},
+            )
+        if genre == "effectif":
+            q = self.quête(patch["quête"], patch.get("début"))
+            avant = q.nombre_bénévoles
+            q.nombre_bénévoles = int(patch["nombre"])
+            return (lambda: setattr(q, "nombre_bénévoles", avant)), {q.jour}, set()
+        if genre == "verrou":
+            q = self.quête(patch["quête"], patch.get("début"))
+            b = self.bénévole(patch["bénévole"])
+            if b in q.bénévoles:
+                return (lambda: None), set(), set()
+            # import_json donne la même liste aux copies d'une quête
+            avant = q.bénévoles
+            q.bénévoles = avant + [b]
+            b.quêtes_assignées.append(q)
+
+            def annuler():
+                q.bénévoles = avant
+                b.quêtes_assignées.remove(q)
+
+            return annuler, {q.jour}, {b}
+        raise Modification_invalide(f"modification inconnue: {genre}")
+
+    def recalculer(self, jours: set[date], bénévoles: set[Bénévole]):
+        """Met à jour les éligibilités gardées des [jours] pour les
+        [bénévoles] modifiés."""
+        if not bénévoles:
+            return
+        ordre = [b for b in self.registre.bénévoles.values() if b in bénévoles]
+        for d in jours:
+            if d in self.éligibilités:
+                self.éligibilités[d].recalculer(ordre)
+
+    def éligibilité(self, index: Index_des_quêtes) -> Éligibilité:
+        """L'éligibilité aux quêtes de l'[index], assemblée à partir de celles
+        des jours, calculées au premier besoin."""
+        parties = []
+        for d in index.par_jour.keys():
+            if d not in self.éligibilités:
+                self.éligibilités[d] = Éligibilité(
+                    self.registre.bénévoles.values(), self.index_du_jour(d)
+                )
+            parties.append(self.éligibilités[d])
+        if len(parties) == 1:
+            return parties[0]
+        return Éligibilité.réunion(parties, index)
+
+    def index_du_jour(self, d: date) -> Index_des_quêtes:
+        if d not in self.index_par_jour:
+            self.index_par_jour[d] = Index_des_quêtes(self.registre.index.par_jour[d])
+        return self.index_par_jour[d]
+
+    """ Résolution """
+
+    def résoudre(
+        self, jours: Optional[set[date]] = None, temps: Optional[float] = None
+    ) -> (Dict, Optional[Dict[Quête, List[Bénévole]]]):
+        """Résout les quêtes des [jours] (toutes si None) à partir du planning
+        courant. Renvoie le résultat et, s'il y a une solution, le nouveau
+        planning de ces quêtes."""
+        index = self.registre.index
+        début = datetime.now()
+        if jours is None:
+            sous_index, exclues = index, []
+        else:
+            jours_à_résoudre = sorted(d for d in jours if d in index.par_jour)
+            if len(jours_à_résoudre) == 1:
+                sous_index = self.index_du_jour(jours_à_résoudre[0])
+            else:
+                sous_index = Index_des_quêtes(
+                    [q for d in jours_à_résoudre for q in index.par_jour[d]]
+                )
+            exclues = familles_couplant_les_jours
+        ctx = Contexte(
+            self.registre.bénévoles.values(),
+            sous_index,
+            éligibilité=self.éligibilité(sous_index),
+        )
+        construire(ctx, exclues=exclues)
+        précédentes = {q.clé(): [b.id for b in bs] for q, bs in self.plan.items()}
+        ajouter_indices(ctx, précédentes)
+        construction = (datetime.now() - début).total_seconds()
+
+        solver = cp_model.CpSolver()
+        solver.parameters.copy_from(self.paramètres)
+        if temps is not None:
+            solver.parameters.max_time_in_seconds = temps
+        status = solver.solve(ctx.model)
+        trouvée = status == cp_model.OPTIMAL or status == cp_model.FEASIBLE
+        plan = None
+        if trouvée:
+            plan = {
+                q: [
+                    b
+                    for b in ctx.bénévoles
+                    if (b, q) in ctx.assignations
+                    and solver.boolean_value(ctx.assignations[(b, q)])
+                ]
+                for q in ctx.quêtes
+            }
+        return {
+            "status": status.name,
+            "objective": solver.objective_value if trouvée else None,
+            "build_time": construction,
+            "wall_time": solver.wall_time,
+            "days": sorted(d.isoformat() for d in jours) if jours else None,
+        }, plan
+
+    def démarrer(
+        self, précédentes: Optional[Dict[(str, datetime), List[str]]], temps: float
+    ):
+        """Le premier planning, résolu en entier pendant au plus [temps]
+        secondes en partant des [précédentes] assignations s'il y en a."""
+        with self.verrou:
+            if précédentes:
+                for q in self.registre.quêtes:
+                    self.plan[q] = [
+                        self.registre.bénévoles[id]
+                        for id in précédentes.get(q.clé(), [])
+                        if id in self.registre.bénévoles
+                    ]
+            résultat, plan = self.résoudre(temps=temps)
+            if plan is not None:
+                self.plan = plan
+            return résultat
+
+    def simuler(self, patches: List[Dict], essai: bool = False) -> Dict:
+        with self.verrou:
+            annulations = []
+            jours = set()
+            bénévoles = set()
+            try:
+                for patch in patches:
+                    annuler, touchés, modifiés = self.modifier(patch)
+                    annulations.append(annuler)
+                    jours |= touchés
+                    bénévoles |= modifiés
+            except (Modification_invalide, KeyError, TypeError, ValueError):
+                for annuler in reversed(annulations):
+                    annuler()
+                raise
+            self.recalculer(jours, bénévoles)
+
+            if jours:
+                résultat, plan = self.résoudre(jours)
+            else:
+                résultat, plan = {"status": "UNCHANGED", "days": []}, {}
+            résultat["changes"] = [] if plan is not None else None
+            for q, bs in (plan or {}).items():
+                avant = set(self.plan.get(q, []))
+                après = set(bs)
+                if avant != après:
+                    résultat["changes"].append(
+                        {
+                            "quest": q.id,
+                            "start": q.début.isoformat(),
+                            "added": sorted(b.id for b in après - avant),
+                            "removed": sorted(b.id for b in avant - après),
+                        }
+                    )
+
+            if plan is None or essai:
+                for annuler in reversed(annulations):
+                    annuler()
+                self.recalculer(jours, bénévoles)
+            else:
+                self.plan.update(plan)
+            résultat["applied"] = plan is not None and not essai
+            return résultat
+
+    def planning(self) -> List[Dict]:
+        # Une entrée par quête: plusieurs peuvent avoir le même id
+        with self.verrou:
+            return [
+                {
+                    "quest": q.id,
+                    "start": q.début.isoformat(),
+                    "volunteers": [b.id for b in bs],
+                }
+                for q, bs in self.plan.items()
+            ]
+
+
+""" Serveur HTTP """
+
+
+def serveur(planificateur: Planificateur, port: int) -> ThreadingHTTPServer:
+    class Requêtes(BaseHTTPRequestHandler):
+        def répondre(self, code: int, contenu):
+            corps = json.dumps(contenu, ensure_ascii=False).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corps)))
+            self.end_headers()
+            self.wfile.write(corps)
+
+        def do_GET(self):
+            if self.path == "/plan":
+                self.répondre(200, planificateur.planning())
+            else:
+                self.répondre(404, {"error": "inconnu"})
+
+        def do_POST(self):
+            if self.path != "/patch":
+                self.répondre(404, {"error": "inconnu"})
+                return
+            longueur = int(self.headers.get("Content-Length", 0))
+            try:
+                requête = json.loads(self.rfile.read(longueur))
+                résultat = planificateur.simuler(
+                    requête["patches"], bool(requête.get("essai", False))
+                )
+            except (Modification_invalide, KeyError, TypeError, ValueError) as e:
+                self.répondre(400, {"error": str(e)})
+                return
+            self.répondre(200, résultat)
+
+    return ThreadingHTTPServer(("127.0.0.1", port), Requêtes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service de simulation")
+    parser.add_argument("--json", help="export Notion, voir import_json")
+    parser.add_argument("--gapi", action="store_true", help="feuilles Google")
+    parser.add_argument(
+        "--hors-ligne",
+        action="store_true",
+        help="avec --gapi, le dernier instantané des feuilles",
+    )
+    parser.add_argument("--plan", help="results.json d'une exécution précédente")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--temps", type=float, default=10.0)
+    parser.add_argument("--temps-initial", type=float, default=60.0)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    registre = Registre()
+    with utiliser(registre):
+        if args.json:
+            from import_json import from_stream
+
+            from_stream(args.json)
+        if args.gapi:
+            import import_gapi
+
+            import_gapi.main(args.hors_ligne)
+    registre.strengthen()
+
+    paramètres = cp_model.CpSolver().parameters
+    paramètres.num_workers = args.workers
+    paramètres.max_time_in_seconds = args.temps
+    planificateur = Planificateur(registre, paramètres)
+    précédentes = charger_assignations(args.plan) if args.plan else None
+    print(planificateur.démarrer(précédentes, args.temps_initial))
+
+    httpd = serveur(planificateur, args.port)
+    print(f"Prêt sur http://127.0.0.1:{args.port}")
+    httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+from __future__ import annotations  # allows class type usage in class decl
+from typing import List, Dict
+from datetime import date, time, datetime, timedelta
+
+import numpy as np
+
+from data_model import Bénévole, Index_des_quêtes
+from eligibility import heure_début_journée
+
+""" Temps de travail visés
+
+Le travail requis chaque jour (la somme des durées des quêtes multipliées par
+leur nombre de bénévoles) est réparti entre les bénévoles au prorata de leur
+temps de travail théorique. Tout est calculé d'un coup, sous la forme d'une
+matrice avec une ligne par bénévole et une colonne par jour.
+
+Les jours d'arrivée et de départ, le temps théorique est réduit au prorata des
+heures de présence dans la journée de festival (de 5h à 5h). Les temps visés
+sont arrondis à la minute en conservant le total de chaque jour: la somme des
+temps visés d'un jour est exactement le travail requis ce jour là. """
+
+
+def fenêtre_du_jour(jour: date, tz=None) -> (datetime, datetime):
+    début = datetime.combine(jour, time(hour=heure_début_journée), tz)
+    return début, début + timedelta(days=1)
+
+
+def présence(b: Bénévole, jour: date) -> float:
+    """La fraction de la journée [jour] pendant laquelle [b] est là. Une date
+    d'arrivée ou de départ sans heure (à minuit) compte pour toute la journée."""
+    tz = (b.date_arrivée or b.date_départ or datetime.min).tzinfo
+    début, fin = fenêtre_du_jour(jour, tz)
+    if b.date_arrivée:
+        arrivée = b.date_arrivée
+        if arrivée.time() == time():
+            arrivée, _ = fenêtre_du_jour(arrivée.date(), arrivée.tzinfo)
+        début = max(début, arrivée)
+    if b.date_départ:
+        départ = b.date_départ
+        if départ.time() == time():
+            _, départ = fenêtre_du_jour(départ.date(), départ.tzinfo)
+        fin = min(fin, départ)
+    return max((fin - début) / timedelta(days=1), 0.0)
+
+
+def arrondi_conservatif(valeurs: np.ndarray) -> np.ndarray:
+    """Arrondit chaque colonne de [valeurs] à l'entier en conservant l'arrondi
+    de son total, par la méthode du plus fort reste."""
+    planchers = np.floor(valeurs)
+    totaux = np.round(valeurs.sum(axis=0))
+    manquants = (totaux - planchers.sum(axis=0)).astype(int)
+    # Rang de chaque case dans sa colonne, par reste décroissant
+    ordre = np.argsort(-(valeurs - planchers), axis=0, kind="stable")
+    rangs = np.empty_like(ordre)
+    np.put_along_axis(rangs, ordre, np.arange(valeurs.shape[0])[:, None], axis=0)
+    return (planchers + (rangs < manquants[None, :])).astype(int)
+
+
+class Temps_de_travail:
+    """Temps de travail théoriques, requis et visés, en minutes, des
+    [bénévoles] pour chaque jour de l'[index]."""
+
+    def __init__(self, bénévoles: List[Bénévole], index: Index_des_quêtes):
+        self.bénévoles: List[Bénévole] = list(bénévoles)
+        self.jours: List[date] = list(index.par_jour.keys())
+        self.rang_bénévole: Dict[Bénévole, int] = {
+            b: i for i, b in enumerate(self.bénévoles)
+        }
+        self.rang_jour: Dict[date, int] = {d: j for j, d in enumerate(self.jours)}
+
+        heures = np.array([b.heures_théoriques for b in self.bénévoles], dtype=float)
+        présences = np.array(
+            [[présence(b, d) for d in self.jours] for b in self.bénévoles]
+        ).reshape(len(self.bénévoles), len(self.jours))
+        self.théoriques: np.ndarray = heures[:, None] * 60 * présences
+        self.requis: np.ndarray = np.array(
+            [
+                sum(q.durée_minutes() * q.nombre_bénévoles for q in index.par_jour[d])
+                for d in self.jours
+            ],
+            dtype=float,
+        )
+        totaux = self.théoriques.sum(axis=0)
+        fractions = np.divide(
+            self.théoriques,
+            totaux[None, :],
+            out=np.zeros_like(self.théoriques),
+            where=totaux[None, :] > 0,
+        )
+        self.visés: np.ndarray = arrondi_conservatif(fractions * self.requis[None, :])
+
+    def théorique(self, b: Bénévole, jour: date) -> float:
+        return self.théoriques[self.rang_bénévole[b], self.rang_jour[jour]]
+
+    def théorique_total(self, jour: date) -> float:
+        return self.théoriques[:, self.rang_jour[jour]].sum()
+
+    def visé(self, b: Bénévole, jour: date) -> int:
+        return int(self.visés[self.rang_bénévole[b], self.rang_jour[jour]])
+
+    def visés_par_bénévole(self) -> Dict[Bénévole, Dict[date, int]]:
+        return {
+            b: dict(zip(self.jours, self.visés[i].tolist()))
+            for i, b in enumerate(self.bénévoles)
+        }